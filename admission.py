@@ -0,0 +1,112 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from .diagnostics import registry
+
+import logging
+log = logging.getLogger(__name__)
+
+QUEUE_DEPTH = registry.gauge('crawler_admission_queue_depth', 'Requests waiting for an admission slot', ['scope'])
+IN_FLIGHT = registry.gauge('crawler_admission_in_flight', 'Admitted requests in progress', ['scope'])
+WAIT_SECONDS = registry.histogram('crawler_admission_wait_seconds', 'Time spent waiting for an admission slot', ['scope'])
+REJECTED = registry.counter('crawler_admission_rejected_total', 'Requests rejected by admission control', ['scope', 'reason'])
+
+class AdmissionRejected(Exception):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """
+    Bounded admission for expensive requests.
+
+    A request needs a slot of its key (e.g. search tool) and a global slot. When no slot is free it waits
+    in a bounded queue for at most queue_timeout seconds, when the queue is full it is rejected right away.
+    """
+    def __init__(self, scope: str, max_concurrency: int, key_limits: dict[str, int], max_queue: int, queue_timeout: float):
+        self.__scope = scope
+        self.__max_concurrency = max_concurrency
+        self.__global_slots = asyncio.Semaphore(max_concurrency)
+        self.__key_slots = {key: asyncio.Semaphore(limit) for key, limit in key_limits.items()}
+        self.__max_queue = max_queue
+        self.__queue_timeout = queue_timeout
+        self.__waiting = 0
+        self.__in_flight = 0
+        # exponential moving average of the admitted request duration, used to suggest Retry-After
+        self.__avg_service_time = 1.0
+
+    @property
+    def waiting(self) -> int:
+        return self.__waiting
+
+    @property
+    def in_flight(self) -> int:
+        return self.__in_flight
+
+    def __retry_after(self) -> int:
+        return max(1, math.ceil(self.__avg_service_time * (self.__waiting + 1) / self.__max_concurrency))
+
+    def __has_free_slot(self, key_slots: asyncio.Semaphore | None) -> bool:
+        return not self.__global_slots.locked() and (key_slots is None or not key_slots.locked())
+
+    async def __acquire(self, key_slots: asyncio.Semaphore | None):
+        if key_slots is None:
+            await self.__global_slots.acquire()
+            return
+        # take the key slot first so a request waiting for a busy tool does not hold a global slot
+        await key_slots.acquire()
+        try:
+            await self.__global_slots.acquire()
+        except BaseException:
+            key_slots.release()
+            raise
+
+    def check(self, key: str):
+        """
+        Fail fast when a request of key would be rejected because the wait queue is full
+
+        Raises:
+            AdmissionRejected: the wait queue is full
+        """
+        if not self.__has_free_slot(self.__key_slots.get(key)) and self.__waiting >= self.__max_queue:
+            REJECTED.inc(scope=self.__scope, reason='queue_full')
+            raise AdmissionRejected(f"Too many pending {self.__scope} requests", self.__retry_after())
+
+    @asynccontextmanager
+    async def admit(self, key: str) -> AsyncIterator[None]:
+        """
+        Raises:
+            AdmissionRejected: the wait queue is full or no slot was free within queue_timeout
+        """
+        self.check(key)
+        key_slots = self.__key_slots.get(key)
+
+        wait_start = time.perf_counter()
+        self.__waiting += 1
+        QUEUE_DEPTH.set(self.__waiting, scope=self.__scope)
+        try:
+            async with asyncio.timeout(self.__queue_timeout):
+                await self.__acquire(key_slots)
+        except TimeoutError:
+            REJECTED.inc(scope=self.__scope, reason='timeout')
+            raise AdmissionRejected(f"No {self.__scope} slot available within {self.__queue_timeout}s", self.__retry_after())
+        finally:
+            self.__waiting -= 1
+            QUEUE_DEPTH.set(self.__waiting, scope=self.__scope)
+            WAIT_SECONDS.observe(time.perf_counter() - wait_start, scope=self.__scope)
+
+        service_start = time.perf_counter()
+        self.__in_flight += 1
+        IN_FLIGHT.set(self.__in_flight, scope=self.__scope)
+        try:
+            yield
+        finally:
+            self.__in_flight -= 1
+            IN_FLIGHT.set(self.__in_flight, scope=self.__scope)
+            self.__global_slots.release()
+            if key_slots is not None:
+                key_slots.release()
+            self.__avg_service_time = 0.8 * self.__avg_service_time + 0.2 * (time.perf_counter() - service_start)
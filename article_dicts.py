@@ -0,0 +1,44 @@
+"""
+Train the zstd dictionary of an article site on its stored bodies, used with ARTICLE_CONTENT_COMPRESSION=zstd.
+
+Usage:
+    python -m crawler.article_dicts --site glassnode --samples 500
+
+New bodies of the site are compressed with the new dictionary, older ones keep the dictionary they were written with.
+Retrain when the site's markup changes noticeably, the compression ratio of bench/article_compression shows it.
+"""
+import argparse
+import asyncio
+from datetime import datetime, timezone
+
+from .const import ArticleSite
+from .dao import TradebotDatabaseManagerAsync
+from .dao.ArticleContentCodec import ArticleContentCodec, DEFAULT_DICT_SIZE
+from .run import run
+import logging
+logger = logging.getLogger(__name__)
+
+async def train_article_dict(site: ArticleSite, samples: int, dict_size: int):
+    tdbm = TradebotDatabaseManagerAsync(max_size=1)
+    await tdbm.open()
+    try:
+        articles = await tdbm.get_articles(site, datetime.fromtimestamp(0, timezone.utc), samples)
+        contents = [article.content for article in articles if article.content]
+        if len(contents) < 10:
+            logger.warning(f"only {len(contents)} {site.value} articles stored, not enough to train a dictionary")
+            return
+        dict_content = await asyncio.to_thread(ArticleContentCodec.train_dict, contents, dict_size)
+        dict_id = await tdbm.save_article_dict(site, dict_content)
+        logger.info(f"trained zstd dictionary {dict_id} of {len(dict_content)} bytes on {len(contents)} {site.value} articles")
+    finally:
+        await tdbm.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the zstd dictionary of an article site")
+    parser.add_argument('--site', type=ArticleSite, required=True)
+    parser.add_argument('--samples', type=int, default=500, help="newest articles to train on")
+    parser.add_argument('--size', type=int, default=DEFAULT_DICT_SIZE, help="dictionary size in bytes")
+    args = parser.parse_args()
+    def train():
+        asyncio.run(train_article_dict(args.site, args.samples, args.size))
+    run(train)
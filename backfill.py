@@ -0,0 +1,248 @@
+"""
+Backfill the flash news or articles of a site over a past date range.
+
+Usage:
+    python -m crawler.backfill --kind flash_news --site wallstreetcn --start 2025-01-01 --end 2025-07-01 --workers 4
+
+The range is split in shards of --shard-hours, aligned to multiples of the shard size since the epoch so that runs
+over overlapping ranges share their shards. --workers shards are crawled at a time, requests to a host are spaced by
+BACKFILL_HOST_REQUESTS_PER_SECOND / BACKFILL_HOST_RATE_LIMITS, the rows of a shard are bulk inserted (COPY from
+TRADEBOT_DB_COPY_THRESHOLD rows on) and rows that already exist are skipped.
+Every inserted shard is recorded in the --checkpoint file, a run that is interrupted or has failed shards continues
+with the shards that are not recorded when started again with the same arguments.
+Only sites that can page back in time can be backfilled (wallstreetcn flash news, glassnode articles). Listings
+paged from the newest article only (glassnode) are walked once for the shards left and the shards fetch the detail
+pages of their articles.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from .config import LOG_DIR, BACKFILL_HOST_REQUESTS_PER_SECOND, BACKFILL_HOST_RATE_LIMITS, FLASH_NEWS_DEDUP_ENABLED, \
+    FLASH_NEWS_DEDUP_THRESHOLD, FLASH_NEWS_DEDUP_WINDOW_MINUTES, FLASH_NEWS_DEDUP_SHINGLE_SIZE
+from .const import FlashNewsSite, ArticleSite
+from .dao import TradebotDatabaseManagerAsync
+from .dao.TradebotDatabaseManagerAsync import flash_news_batch, article_batch
+from .po import ArticlePo
+from .source.ArticleFetcherFacade import ArticleFetcherFacade
+from .source.article_fetcher import ArticleListing
+from .source.FlashNewsFetcherFacade import FlashNewsFetcherFacade
+from .source.HostRateLimiter import HostRateLimiter
+from .source.HttpSessionFactory import add_session_middleware, remove_session_middleware
+from .source.NearDuplicateIndex import NearDuplicateIndex
+from .run import run
+import logging
+logger = logging.getLogger(__name__)
+
+def shard_of(time: datetime, shard: timedelta) -> datetime:
+    """
+    Start of the shard the time falls in, a multiple of shard since the epoch
+    """
+    epoch = datetime.fromtimestamp(0, timezone.utc)
+    return epoch + (time - epoch) // shard * shard
+
+def shard_ranges(start: datetime, end: datetime, shard: timedelta) -> list[tuple[datetime, datetime]]:
+    """
+    [shard_start, shard_end) ranges covering [start, end), on multiples of shard since the epoch
+    """
+    shard_start = shard_of(start, shard)
+    ranges: list[tuple[datetime, datetime]] = []
+    while shard_start < end:
+        ranges.append((shard_start, shard_start + shard))
+        shard_start += shard
+    return ranges
+
+class BackfillCheckpoint:
+    """
+    Shards of a backfill that are inserted, in a json file rewritten atomically after every shard
+    """
+    def __init__(self, path: str, kind: str, site: str, shard_hours: float):
+        self.__path = path
+        self.__key = {'kind': kind, 'site': site, 'shardHours': shard_hours}
+        # shard start isoformat -> {'fetched': n, 'inserted': n}
+        self.__done: dict[str, dict[str, int]] = {}
+
+    def load(self):
+        if not os.path.exists(self.__path):
+            return
+        with open(self.__path) as f:
+            data = json.load(f)
+        key = {name: data.get(name) for name in self.__key}
+        if key != self.__key:
+            raise ValueError(f"checkpoint {self.__path} is of another backfill: {key}, expected: {self.__key}")
+        self.__done = data['done']
+
+    def is_done(self, shard_start: datetime) -> bool:
+        return shard_start.isoformat() in self.__done
+
+    def mark_done(self, shard_start: datetime, fetched: int, inserted: int):
+        self.__done[shard_start.isoformat()] = {'fetched': fetched, 'inserted': inserted}
+        tmp_path = f"{self.__path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({**self.__key, 'done': self.__done}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.__path)
+
+class Backfill:
+    def __init__(self, kind: str, site: str, workers: int, retries: int, checkpoint: BackfillCheckpoint):
+        self.__kind = kind
+        self.__site = FlashNewsSite(site) if kind == 'flash_news' else ArticleSite(site)
+        self.__workers = workers
+        self.__retries = retries
+        self.__checkpoint = checkpoint
+        self.__flash_news_fetcher = FlashNewsFetcherFacade()
+        self.__article_fetcher = ArticleFetcherFacade()
+        self.__tbdm = TradebotDatabaseManagerAsync(max_size=workers)
+        self.__fetched = 0
+        self.__inserted = 0
+        self.__failed: list[datetime] = []
+        # listed articles by shard start, when the listing is walked once for the whole range
+        self.__listings: Optional[dict[datetime, list[ArticleListing]]] = None
+
+    def supported(self) -> bool:
+        if self.__kind == 'flash_news':
+            return self.__flash_news_fetcher.supports_range(self.__site) # type: ignore
+        return self.__article_fetcher.supports_range(self.__site) # type: ignore
+
+    async def __crawl_shard(self, shard_start: datetime, shard_end: datetime) -> tuple[int, int]:
+        if self.__kind == 'flash_news':
+            flash_news_list = await self.__flash_news_fetcher.fetch_range(self.__site, shard_start, shard_end) # type: ignore
+            if FLASH_NEWS_DEDUP_ENABLED:
+                # clusters within the shard, the live crawl's index only spans its recent window
+                NearDuplicateIndex(FLASH_NEWS_DEDUP_THRESHOLD, timedelta(minutes=FLASH_NEWS_DEDUP_WINDOW_MINUTES),
+                                   FLASH_NEWS_DEDUP_SHINGLE_SIZE).assign(flash_news_list)
+            return len(flash_news_list), await self.__tbdm.insert_many_flash_news(flash_news_batch(flash_news_list))
+        if self.__listings is None:
+            articles = await self.__article_fetcher.fetch_range(self.__site, shard_start, shard_end) # type: ignore
+        else:
+            articles = await self.__fetch_details(self.__listings.get(shard_start, []))
+        return len(articles), await self.__tbdm.insert_many_articles(article_batch(articles))
+
+    async def __fetch_details(self, listings: list[ArticleListing]) -> list[ArticlePo]:
+        # like fetch_range, articles whose detail page fails are logged and left out
+        articles: list[ArticlePo] = []
+        results = await self.__article_fetcher.fetch_details(self.__site, listings) # type: ignore
+        for listing, result in zip(listings, results):
+            if isinstance(result, Exception):
+                logger.error(f"backfill article {listing['url']} ERROR: {result}")
+            elif result is not None:
+                articles.append(result)
+        return articles
+
+    async def __walk_listing(self, shards: list[tuple[datetime, datetime]], shard: timedelta) -> bool:
+        """
+        List the articles of the shards in one walk of the listing and split them by shard
+
+        Returns:
+            whether the listing was walked
+        """
+        start, end = shards[0][0], shards[-1][1]
+        for attempt in range(self.__retries + 1):
+            try:
+                listings = await self.__article_fetcher.fetch_listing_range(self.__site, start, end) # type: ignore
+                break
+            except Exception as e:
+                logger.error(f"backfill {self.__kind}/{self.__site.value} listing attempt {attempt + 1} ERROR: {e}", exc_info=True)
+                if attempt < self.__retries:
+                    await asyncio.sleep(2 ** attempt)
+        else:
+            return False
+        self.__listings = {}
+        for listing in listings:
+            if listing['publish_time'] is not None:
+                self.__listings.setdefault(shard_of(listing['publish_time'], shard), []).append(listing)
+        logger.info(f"backfill {self.__kind}/{self.__site.value} listed {len(listings)} articles "
+                    f"from {start.isoformat()} to {end.isoformat()}")
+        return True
+
+    async def __work(self, shards: asyncio.Queue[tuple[datetime, datetime]]):
+        while not shards.empty():
+            shard_start, shard_end = shards.get_nowait()
+            for attempt in range(self.__retries + 1):
+                try:
+                    fetched, inserted = await self.__crawl_shard(shard_start, shard_end)
+                    self.__checkpoint.mark_done(shard_start, fetched, inserted)
+                    self.__fetched += fetched
+                    self.__inserted += inserted
+                    logger.info(f"backfill {self.__kind}/{self.__site.value} shard {shard_start.isoformat()} done, "
+                                f"fetched: {fetched}, inserted: {inserted}, shards left: {shards.qsize()}")
+                    break
+                except Exception as e:
+                    logger.error(f"backfill {self.__kind}/{self.__site.value} shard {shard_start.isoformat()} "
+                                 f"attempt {attempt + 1} ERROR: {e}", exc_info=True)
+                    if attempt < self.__retries:
+                        await asyncio.sleep(2 ** attempt)
+            else:
+                self.__failed.append(shard_start)
+
+    async def run(self, start: datetime, end: datetime, shard: timedelta) -> bool:
+        """
+        Returns:
+            whether every shard of the range is done
+        """
+        self.__checkpoint.load()
+        ranges = shard_ranges(start, end, shard)
+        pending = [shard_range for shard_range in ranges if not self.__checkpoint.is_done(shard_range[0])]
+        logger.info(f"backfill {self.__kind}/{self.__site.value} from {start.isoformat()} to {end.isoformat()}, "
+                    f"shards: {len(ranges)}, done before: {len(ranges) - len(pending)}, workers: {self.__workers}")
+        began = time.perf_counter()
+        if pending and self.__kind == 'article' and self.__article_fetcher.supports_listing_range(self.__site): # type: ignore
+            if not await self.__walk_listing(pending, shard):
+                # every shard left needs the listing, the next run walks it again
+                self.__failed.extend(shard_start for shard_start, _ in pending)
+                pending = []
+        shards: asyncio.Queue[tuple[datetime, datetime]] = asyncio.Queue()
+        for shard_range in pending:
+            shards.put_nowait(shard_range)
+        await self.__tbdm.open()
+        try:
+            await asyncio.gather(*[self.__work(shards) for _ in range(self.__workers)])
+        finally:
+            await self.__tbdm.close()
+        logger.info(f"backfill {self.__kind}/{self.__site.value} END in {time.perf_counter() - began:.0f}s, "
+                    f"fetched: {self.__fetched}, inserted: {self.__inserted}, "
+                    f"failed shards: {[shard_start.isoformat() for shard_start in sorted(self.__failed)]}")
+        return not self.__failed
+
+def parse_time(value: str) -> datetime:
+    """
+    ISO date or datetime, UTC when no offset is given
+    """
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+async def backfill(kind: str, site: str, start: datetime, end: datetime, shard_hours: float, workers: int,
+                   retries: int, checkpoint_path: Optional[str]) -> bool:
+    checkpoint_path = checkpoint_path or os.path.join(LOG_DIR, f"backfill.{kind}.{site}.json")
+    job = Backfill(kind, site, workers, retries, BackfillCheckpoint(checkpoint_path, kind, site, shard_hours))
+    if not job.supported():
+        raise ValueError(f"{kind} of {site} can not be backfilled, the site only lists its latest {kind}")
+    rate_limiter = HostRateLimiter(BACKFILL_HOST_REQUESTS_PER_SECOND, BACKFILL_HOST_RATE_LIMITS)
+    add_session_middleware(rate_limiter.middleware)
+    try:
+        return await job.run(start, end, timedelta(hours=shard_hours))
+    finally:
+        remove_session_middleware(rate_limiter.middleware)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the flash news or articles of a site over a past date range")
+    parser.add_argument('--kind', choices=['flash_news', 'article'], required=True)
+    parser.add_argument('--site', required=True, help="flash news or article site enum value")
+    parser.add_argument('--start', type=parse_time, required=True, help="ISO date or datetime, UTC when no offset")
+    parser.add_argument('--end', type=parse_time, default=datetime.now(timezone.utc), help="exclusive, default now")
+    parser.add_argument('--shard-hours', type=float, default=24, help="hours of publish time crawled by one shard")
+    parser.add_argument('--workers', type=int, default=4, help="shards crawled at a time")
+    parser.add_argument('--retries', type=int, default=2, help="retries of a failed shard before it is left for the next run")
+    parser.add_argument('--checkpoint', help="checkpoint file, default {LOG_DIR}/backfill.{kind}.{site}.json")
+    args = parser.parse_args()
+    succeeded: list[bool] = []
+    def backfill_range():
+        succeeded.append(asyncio.run(backfill(args.kind, args.site, args.start, args.end, args.shard_hours, args.workers,
+                                              args.retries, args.checkpoint)))
+    run(backfill_range)
+    # run logs an exception that escaped and leaves no result, exit 1 then or when a shard failed
+    sys.exit(0 if succeeded and succeeded[0] else 1)
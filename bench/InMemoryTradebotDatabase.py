@@ -0,0 +1,60 @@
+from datetime import datetime
+from typing import List, Optional
+
+from ..const import ArticleSite, FlashNewsSite
+from ..po.ArticlePo import ArticlePo
+from ..po.FlashNewsPo import FlashNewsPo
+
+class InMemoryTradebotDatabase:
+    """
+    Stand-in for TradebotDatabaseManagerAsync in the crawl benchmarks, keeps the rows in dicts keyed like the
+    (site, title_md5, publish_time) unique constraints.
+    With track_watermark False the last publish times are always None, so that every cycle fetches and parses
+    all pages instead of only the ones newer than the previous cycle.
+    """
+    def __init__(self, track_watermark: bool = False):
+        self.__track_watermark = track_watermark
+        self.flash_news: dict[tuple[str, str, datetime], FlashNewsPo] = {}
+        self.articles: dict[tuple[str, str, datetime], ArticlePo] = {}
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def test_connection(self) -> bool:
+        return True
+
+    async def insert_many_flash_news(self, flash_news_list: List[FlashNewsPo]) -> int:
+        inserted = 0
+        for news in flash_news_list:
+            key = (news.site.value, news.title_md5, news.publish_time)
+            if key not in self.flash_news:
+                self.flash_news[key] = news
+                inserted += 1
+        return inserted
+
+    async def insert_many_articles(self, articles_list: List[ArticlePo]) -> int:
+        inserted = 0
+        for article in articles_list:
+            key = (article.site.value, article.title_md5, article.publish_time)
+            if key not in self.articles:
+                self.articles[key] = article
+                inserted += 1
+        return inserted
+
+    async def get_flash_news(self, after: datetime, created_after: Optional[datetime] = None) -> List[FlashNewsPo]:
+        return sorted((news for news in self.flash_news.values()
+                       if news.publish_time > after and (created_after is None or news.create_time > created_after)),
+                      key=lambda news: news.publish_time)
+
+    async def get_flash_news_last_publish_time(self, site: FlashNewsSite) -> Optional[datetime]:
+        if not self.__track_watermark:
+            return None
+        return max((key[2] for key in self.flash_news if key[0] == site.value), default=None)
+
+    async def get_article_last_publish_time(self, site: ArticleSite) -> Optional[datetime]:
+        if not self.__track_watermark:
+            return None
+        return max((key[2] for key in self.articles if key[0] == site.value), default=None)
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import random
+import time
+
+from aiohttp import web
+
+
+class StubLlmServer:
+    """
+    Local OpenAI compatible chat completion endpoint (POST /chat/completions) with configurable latency.
+    Serves both the Perplexity sdk and ChatOpenAI when their base url points here.
+    Streaming requests get stream_chunks chunks, the first after first_chunk_latency, spread over latency in total.
+    """
+    def __init__(
+        self,
+        latency: float = 1.0,
+        jitter: float = 0.0,
+        payload_size: int = 2000,
+        stream_chunks: int = 20,
+        first_chunk_latency: float = 0.2,
+        host: str = '127.0.0.1',
+        port: int = 0
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.payload_size = payload_size
+        self.stream_chunks = stream_chunks
+        self.first_chunk_latency = first_chunk_latency
+        self.__host = host
+        self.__port = port
+        self.__runner: web.AppRunner | None = None
+        self.requests = 0
+        self.max_in_flight = 0
+        self.__in_flight = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.__host}:{self.__port}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/chat/completions', self.__chat_completions)
+        self.__runner = web.AppRunner(app, access_log=None)
+        await self.__runner.setup()
+        site = web.TCPSite(self.__runner, self.__host, self.__port)
+        await site.start()
+        if self.__port == 0:
+            self.__port = site._server.sockets[0].getsockname()[1] # type: ignore
+
+    async def stop(self):
+        if self.__runner is not None:
+            await self.__runner.cleanup()
+            self.__runner = None
+
+    async def delay(self):
+        await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def content(self) -> str:
+        return ('stub search result ' * (self.payload_size // 19 + 1))[:self.payload_size]
+
+    async def __chat_completions(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        self.__in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.__in_flight)
+        try:
+            body = await request.json()
+            if body.get('stream'):
+                return await self.__stream_chat_completions(request, body)
+            await self.delay()
+            return web.json_response({
+                'id': f"stub-{self.requests}",
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body.get('model') or 'stub',
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': self.content()},
+                    'finish_reason': 'stop',
+                }],
+                'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2},
+            })
+        finally:
+            self.__in_flight -= 1
+
+    async def __stream_chat_completions(self, request: web.Request, body: dict) -> web.StreamResponse:
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        content = self.content()
+        chunk_size = max(1, len(content) // self.stream_chunks)
+        pieces = [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)]
+        interval = max(0.0, self.latency - self.first_chunk_latency) / max(1, len(pieces) - 1)
+        await asyncio.sleep(self.first_chunk_latency)
+        for i, piece in enumerate(pieces):
+            if i > 0:
+                await asyncio.sleep(interval)
+            chunk = {
+                'id': f"stub-{self.requests}",
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': body.get('model') or 'stub',
+                'choices': [{
+                    'index': 0,
+                    'delta': {'role': 'assistant', 'content': piece},
+                    'message': {'role': 'assistant', 'content': piece},
+                    'finish_reason': 'stop' if i == len(pieces) - 1 else None,
+                }],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
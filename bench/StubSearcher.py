@@ -0,0 +1,44 @@
+import asyncio
+import random
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from ..const import SearchTool
+from ..source.searcher import Searcher
+from ..source.types import SearchResultDict, SearchStreamChunk
+
+class StubSearcher(Searcher):
+    """
+    Searcher answering after latency +- jitter seconds with payload_size characters, without any upstream call.
+    Keeps the per tool concurrency cap of the real clients.
+    """
+    def __init__(
+        self,
+        tool: SearchTool,
+        latency: float = 1.0,
+        jitter: float = 0.0,
+        payload_size: int = 2000,
+        max_concurrency: int = 8,
+        stream_chunks: int = 20
+    ):
+        super().__init__(tool, max_concurrency)
+        self.latency = latency
+        self.jitter = jitter
+        self.stream_chunks = stream_chunks
+        self.__payload = ('stub search answer ' * (payload_size // 19 + 1))[:payload_size]
+
+    def delay(self) -> float:
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    async def search(self, query: str, from_time: Optional[datetime], to_time: Optional[datetime]) -> list[SearchResultDict]:
+        async with self._concurrency_limiter:
+            await asyncio.sleep(self.delay())
+        return [SearchResultDict(content=self.__payload, url=None)]
+
+    async def stream(self, query: str, from_time: Optional[datetime], to_time: Optional[datetime]) -> AsyncIterator[SearchStreamChunk]:
+        async with self._concurrency_limiter:
+            chunk_size = -(-len(self.__payload) // self.stream_chunks)
+            pause = self.delay() / self.stream_chunks
+            for i in range(0, len(self.__payload), chunk_size):
+                await asyncio.sleep(pause)
+                yield SearchStreamChunk(content=self.__payload[i:i + chunk_size], item=False)
@@ -0,0 +1,206 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import web
+
+CHAINCATCHER_TZ = timezone(timedelta(hours=8))
+
+def url_rewrites(base_url: str) -> dict[str, str]:
+    """
+    Origin to stub url mapping for set_url_rewrites / HTTP_URL_REWRITES, base_url of a running StubSiteServer
+    """
+    return {
+        'https://www.chaincatcher.com': f"{base_url}/chaincatcher",
+        'https://finnhub.io': f"{base_url}/finnhub",
+        'https://api-one-wscn.awtmt.com': f"{base_url}/wallstreetcn",
+        'https://insights.glassnode.com': f"{base_url}/glassnode",
+    }
+
+class StubSiteServer:
+    """
+    Local stand-in for the crawled sites with configurable latency, serving pages shaped like the ones the fetchers
+    parse, under one path prefix per site:
+        /chaincatcher    https://www.chaincatcher.com      flash news listing and detail, article listing and pages
+        /finnhub         https://finnhub.io                news api
+        /wallstreetcn    https://api-one-wscn.awtmt.com    lives api
+        /glassnode       https://insights.glassnode.com    newsletter listing and articles
+    Listings have items entries published within the last hours (glassnode: days) so that they pass the fetchers'
+    watermark filters on every cycle. HTML pages are padded with page_kb of boilerplate markup, like real pages.
+    GET /__stats returns the number of requests served.
+    """
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        items: int = 20,
+        page_kb: int = 100,
+        host: str = '127.0.0.1',
+        port: int = 0
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.items = items
+        self.page_kb = page_kb
+        self.__host = host
+        self.__port = port
+        self.__runner: web.AppRunner | None = None
+        self.requests = 0
+        self.__filler = self.__make_filler(page_kb * 1024)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.__host}:{self.__port}"
+
+    async def start(self):
+        app = web.Application(middlewares=[self.__count_and_delay])
+        app.router.add_get('/__stats', self.__stats)
+        app.router.add_get('/chaincatcher/en/news', self.__chaincatcher_flash_news_listing)
+        app.router.add_get('/chaincatcher/en/flash/{id}', self.__chaincatcher_flash_news_detail)
+        app.router.add_get('/chaincatcher/en/article', self.__chaincatcher_article_listing)
+        app.router.add_get('/chaincatcher/en/article/{id}', self.__chaincatcher_article)
+        app.router.add_get('/finnhub/api/v1/news', self.__finnhub_news)
+        app.router.add_get('/wallstreetcn/apiv1/content/lives', self.__wallstreetcn_lives)
+        app.router.add_get('/glassnode/tag/newsletter/', self.__glassnode_listing)
+        app.router.add_get('/glassnode/{slug}/', self.__glassnode_article)
+        self.__runner = web.AppRunner(app, access_log=None)
+        await self.__runner.setup()
+        site = web.TCPSite(self.__runner, self.__host, self.__port)
+        await site.start()
+        if self.__port == 0:
+            self.__port = site._server.sockets[0].getsockname()[1] # type: ignore
+
+    async def stop(self):
+        if self.__runner is not None:
+            await self.__runner.cleanup()
+            self.__runner = None
+
+    @web.middleware
+    async def __count_and_delay(self, request: web.Request, handler) -> web.StreamResponse:
+        if request.path == '/__stats':
+            return await handler(request)
+        self.requests += 1
+        await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        return await handler(request)
+
+    async def __stats(self, request: web.Request) -> web.Response:
+        return web.json_response({'requests': self.requests})
+
+    @staticmethod
+    def __make_filler(size: int) -> str:
+        block = (
+            '<div class="nav-item" style="display:flex" data-track="menu">'
+            '<a href="/en/topics/defi" class="link" rel="nofollow">DeFi</a>'
+            '<span class="badge" style="color:#999">new</span></div>\n'
+        )
+        return block * max(0, size // len(block))
+
+    def __html(self, body: str) -> web.Response:
+        page = (
+            '<!DOCTYPE html><html><head><meta charset="utf-8"><title>stub</title>'
+            '<script>window.__NUXT__={}</script></head>'
+            f'<body><header>{self.__filler[:len(self.__filler) // 2]}</header>'
+            f'<main>{body}</main>'
+            f'<footer>{self.__filler[len(self.__filler) // 2:]}</footer></body></html>'
+        )
+        return web.Response(text=page, content_type='text/html')
+
+    @staticmethod
+    def __paragraphs(count: int, seed: int) -> str:
+        return ''.join(
+            f'<p style="text-align:justify" class="para"><span style="font-size:16px" lang="en">Paragraph {i} of item {seed}: '
+            f'market structure, on-chain flows and liquidity conditions <a href="/en/tag/{i}" rel="tag">tag {i}</a>.</span></p>'
+            for i in range(count)
+        )
+
+    def __published(self, i: int, step: timedelta) -> datetime:
+        # second precision like the sites, newest first
+        return (datetime.now(timezone.utc) - step * (i + 1)).replace(microsecond=0)
+
+    async def __chaincatcher_flash_news_listing(self, request: web.Request) -> web.Response:
+        items = []
+        for i in range(self.items):
+            published = self.__published(i, timedelta(minutes=3)).astimezone(CHAINCATCHER_TZ).strftime('%Y-%m-%d %H:%M:%S')
+            items.append(
+                '<div class="v-timeline-item"><div class="timeline_left">'
+                f'<span class="time" timeattr="{published}">{published[11:16]}</span></div>'
+                f'<div class="timeline_title"><span class="text">Stub flash news {i}</span></div>'
+                f'<a class="timeline_content" href="/en/flash/{i}">Summary of flash news {i}</a></div>'
+            )
+        return self.__html(f'<div class="v-timeline">{"".join(items)}</div>')
+
+    async def __chaincatcher_flash_news_detail(self, request: web.Request) -> web.Response:
+        item_id = int(request.match_info['id'])
+        return self.__html(f'<div class="news_detail"><h1>Stub flash news {item_id}</h1>'
+                           f'<div class="rich_text_content">{self.__paragraphs(3, item_id)}</div></div>')
+
+    async def __chaincatcher_article_listing(self, request: web.Request) -> web.Response:
+        items = ''.join(
+            f'<div class="article_area"><a href="/en/article/{i}"><div class="article_title">Stub article {i}</div></a></div>'
+            for i in range(self.items)
+        )
+        return self.__html(f'<div class="article_wraper">{items}</div>')
+
+    async def __chaincatcher_article(self, request: web.Request) -> web.Response:
+        item_id = int(request.match_info['id'])
+        published = self.__published(item_id, timedelta(hours=2)).astimezone(CHAINCATCHER_TZ).strftime('%Y-%m-%d %H:%M:%S')
+        return self.__html(
+            f'<h1>Stub article {item_id}</h1><div class="details_wraper">'
+            f'<div class="author"><span class="name">stub</span><span class="time">{published}</span></div>'
+            f'<div class="abstract">Abstract of article {item_id}</div>'
+            f'<div class="rich_text_content">{self.__paragraphs(30, item_id)}</div>'
+            '<div class="associated_labels"><div class="labels_content"><a>Bitcoin</a><a>ETF</a></div></div></div>'
+        )
+
+    async def __finnhub_news(self, request: web.Request) -> web.Response:
+        return web.json_response([
+            {
+                'category': request.query.get('category', 'crypto'),
+                'datetime': int(self.__published(i, timedelta(minutes=5)).timestamp()),
+                'headline': f'Stub finnhub news {i}',
+                'id': i,
+                'image': '',
+                'related': '',
+                'source': 'CoinDesk',
+                'summary': f'Summary of finnhub news {i} ' * 5,
+                'url': f'https://example.com/finnhub/{i}',
+            }
+            for i in range(self.items)
+        ])
+
+    async def __wallstreetcn_lives(self, request: web.Request) -> web.Response:
+        limit = int(request.query.get('limit', self.items))
+        return web.json_response({'code': 20000, 'message': 'OK', 'data': {'items': [
+            {
+                'id': i,
+                'title': f'Stub wallstreetcn news {i}',
+                'content_text': f'Content of wallstreetcn news {i} ' * 5,
+                'channels': ['global-channel', 'us-stock-channel'],
+                'display_time': int(self.__published(i, timedelta(minutes=2)).timestamp()),
+                'uri': f'https://wallstreetcn.com/livenews/{i}',
+            }
+            for i in range(min(limit, self.items))
+        ]}})
+
+    async def __glassnode_listing(self, request: web.Request) -> web.Response:
+        items = []
+        for i in range(self.items):
+            # daily newsletters, kept within the article fetch window
+            published = (datetime.now(timezone.utc) - timedelta(days=i % 14)).strftime('%Y-%m-%d')
+            items.append(
+                '<article class="post-card"><a class="post-card-content-link" href="/stub-newsletter-{0}/">'
+                '<h2 class="post-card-title">Stub newsletter {0}</h2></a>'
+                '<time class="post-card-meta-date" datetime="{1}">{1}</time></article>'.format(i, published)
+            )
+        return self.__html(''.join(items))
+
+    async def __glassnode_article(self, request: web.Request) -> web.Response:
+        slug = request.match_info['slug']
+        return self.__html(
+            f'<div id="site-main"><article class="article"><h1>{slug}</h1>'
+            '<div class="article-byline">stub author</div>'
+            '<script>console.log("x")</script><noscript>enable js</noscript>'
+            '<figure><img src="/chart.png" width="800"></figure>'
+            f'{self.__paragraphs(30, len(slug))}<hr>'
+            '<section class="subscribe">Subscribe to the newsletter</section></article></div>'
+        )
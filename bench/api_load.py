@@ -0,0 +1,233 @@
+"""
+Load test of the API server with stub searchers: throughput / latency curve of /search and /health, and event loop lag.
+
+Usage:
+    python -m crawler.bench.api_load --concurrency 8 32 128 --duration 10 --latency 1
+    python -m crawler.bench.api_load --rps 10 50 100 200 --crawl off on
+
+Server runs in its own process, as in production, with StubSearcher clients of the given latency and payload size,
+an in-memory database and the admission limits of the SEARCH_ADMISSION_* / *_MAX_CONCURRENCY settings.
+Every step drives /search at a fixed concurrency (closed loop) or arrival rate (open loop, --rps) with unique
+queries, so that the search cache does not answer them, while /health is probed at --health-rps.
+With --crawl on the server process also runs crawl cycles back to back against a StubSiteServer, like the
+single process deployment does.
+
+Reported per step: search requests sent, answered (200), rejected by admission control (429), failed,
+achieved req/s, search p50 / p90 / p99, /health p99 and event loop lag p99 / max of the server process.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import time
+from multiprocessing.connection import Connection
+from typing import Optional
+
+import aiohttp
+
+from ..config import PERPLEXITY_MAX_CONCURRENCY, OPENROUTER_MAX_CONCURRENCY
+from ..const import SearchTool, ProcessRole, FlashNewsSite, ArticleSite
+from ..main import Main
+from ..server import Server
+from ..source.HttpSessionFactory import set_url_rewrites
+from ..source.SearcherFacade import SearcherFacade
+from .crawl_cycle import run_stub_process
+from .InMemoryTradebotDatabase import InMemoryTradebotDatabase
+from .StubSearcher import StubSearcher
+from .StubSiteServer import url_rewrites
+
+LAG_PROBE_INTERVAL = 0.01
+
+def quantile(values: list[float], q: float) -> float:
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+async def probe_loop_lag(lags: list[float]):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(LAG_PROBE_INTERVAL)
+        lags.append(max(0.0, time.perf_counter() - start - LAG_PROBE_INTERVAL))
+
+async def crawl_forever(crawl_base_url: str):
+    set_url_rewrites(url_rewrites(crawl_base_url))
+    crawler = Main(ProcessRole.SCHEDULER, tdbm=InMemoryTradebotDatabase(), # type: ignore
+                   flash_news_sites=[FlashNewsSite.CHAINCATCHER, FlashNewsSite.WALLSTREETCN],
+                   article_sites=[ArticleSite.CHAINCATCHER, ArticleSite.GLASSNODE])
+    while True:
+        await crawler.crawl_flash_news()
+        await crawler.crawl_articles()
+
+async def serve_api(options: dict, conn: Connection):
+    searchers = {
+        SearchTool.PERPLEXITY: StubSearcher(SearchTool.PERPLEXITY, options['latency'], options['jitter'],
+                                            options['payload_size'], PERPLEXITY_MAX_CONCURRENCY),
+        SearchTool.OPENROUTER: StubSearcher(SearchTool.OPENROUTER, options['latency'], options['jitter'],
+                                            options['payload_size'], OPENROUTER_MAX_CONCURRENCY),
+    }
+    server = Server(SearcherFacade(searchers), InMemoryTradebotDatabase()) # type: ignore
+    server_task = asyncio.create_task(server.start())
+    lags: list[float] = []
+    lag_task = asyncio.create_task(probe_loop_lag(lags))
+    crawl_task: Optional[asyncio.Task] = None
+    while True:
+        command, *arguments = await asyncio.to_thread(conn.recv)
+        if command == 'step':
+            crawl_base_url = arguments[0]
+            if crawl_task is not None:
+                crawl_task.cancel()
+                crawl_task = None
+            if crawl_base_url:
+                crawl_task = asyncio.create_task(crawl_forever(crawl_base_url))
+            lags.clear()
+            conn.send('ok')
+        elif command == 'lag':
+            conn.send((quantile(lags, 0.99), max(lags, default=float('nan'))))
+        else:
+            break
+    for task in (crawl_task, lag_task):
+        if task is not None:
+            task.cancel()
+    await server.stop()
+    await server_task
+
+def run_api_process(options: dict, conn: Connection):
+    asyncio.run(serve_api(options, conn))
+
+class StepResult:
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.health_latencies: list[float] = []
+        self.sent = 0
+        self.ok = 0
+        self.rejected = 0
+        self.failed = 0
+
+async def send_search(session: aiohttp.ClientSession, url: str, tool: SearchTool, result: StepResult):
+    result.sent += 1
+    start = time.perf_counter()
+    try:
+        async with session.post(url, json={'tool': tool.value, 'query': f"load test {result.sent} {time.time()}"}) as response:
+            await response.read()
+            if response.status == 200:
+                result.ok += 1
+                result.latencies.append(time.perf_counter() - start)
+            elif response.status == 429:
+                result.rejected += 1
+            else:
+                result.failed += 1
+    except aiohttp.ClientError:
+        result.failed += 1
+
+async def probe_health(session: aiohttp.ClientSession, url: str, rps: float, deadline: float, result: StepResult):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            async with session.get(url) as response:
+                await response.read()
+            result.health_latencies.append(time.perf_counter() - start)
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(max(0.0, 1 / rps - (time.perf_counter() - start)))
+
+async def run_step(session: aiohttp.ClientSession, base_url: str, args: argparse.Namespace,
+                   concurrency: Optional[int], rps: Optional[float]) -> tuple[StepResult, float]:
+    result = StepResult()
+    search_url = f"{base_url}/search"
+    deadline = time.perf_counter() + args.duration
+    health_task = asyncio.create_task(probe_health(session, f"{base_url}/health", args.health_rps, deadline, result))
+    start = time.perf_counter()
+    if concurrency is not None:
+        async def worker():
+            while time.perf_counter() < deadline:
+                await send_search(session, search_url, args.tool, result)
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+    else:
+        assert rps is not None
+        in_flight: set[asyncio.Task] = set()
+        next_send = start
+        while next_send < deadline:
+            task = asyncio.create_task(send_search(session, search_url, args.tool, result))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            next_send += 1 / rps
+            await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+        await asyncio.gather(*in_flight)
+    elapsed = time.perf_counter() - start
+    await health_task
+    return result, elapsed
+
+async def wait_until_up(session: aiohttp.ClientSession, base_url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with session.get(f"{base_url}/health") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            if time.monotonic() > deadline:
+                raise
+        await asyncio.sleep(0.2)
+
+async def main(args: argparse.Namespace):
+    # the spawned server process reads its port from the environment
+    os.environ['UVICORN_PORT'] = str(args.port)
+    base_url = f"http://127.0.0.1:{args.port}"
+    context = multiprocessing.get_context('spawn')
+    options = {'latency': args.latency, 'jitter': args.jitter, 'payload_size': args.payload_size}
+    conn, child_conn = context.Pipe()
+    api_process = context.Process(target=run_api_process, args=(options, child_conn), daemon=True)
+    api_process.start()
+    stub_process = None
+    stop_stub = context.Event()
+    crawl_base_url = ''
+    if 'on' in args.crawl:
+        ready = context.Queue()
+        stub_process = context.Process(target=run_stub_process, args=({'latency': 0.05, 'jitter': 0.02}, ready, stop_stub), daemon=True)
+        stub_process.start()
+        crawl_base_url = await asyncio.to_thread(ready.get, True, 30)
+    levels = [('concurrency', level) for level in args.concurrency] + [('rps', level) for level in args.rps]
+    try:
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=300)) as session:
+            await wait_until_up(session, base_url)
+            print(f"{'crawl':<6}{'mode':<13}{'level':>7}{'sent':>7}{'ok':>7}{'429':>6}{'failed':>7}{'req/s':>8}"
+                  f"{'p50 s':>8}{'p90 s':>8}{'p99 s':>8}{'health p99 ms':>15}{'lag p99 ms':>12}{'lag max ms':>12}")
+            for crawl in args.crawl:
+                for mode, level in levels:
+                    await asyncio.to_thread(conn.send, ('step', crawl_base_url if crawl == 'on' else ''))
+                    await asyncio.to_thread(conn.recv)
+                    result, elapsed = await run_step(session, base_url, args,
+                                                     level if mode == 'concurrency' else None,
+                                                     level if mode == 'rps' else None)
+                    await asyncio.to_thread(conn.send, ('lag',))
+                    lag_p99, lag_max = await asyncio.to_thread(conn.recv)
+                    print(f"{crawl:<6}{mode:<13}{level:>7g}{result.sent:>7}{result.ok:>7}{result.rejected:>6}{result.failed:>7}"
+                          f"{result.ok / elapsed:>8.1f}{quantile(result.latencies, 0.5):>8.2f}{quantile(result.latencies, 0.9):>8.2f}"
+                          f"{quantile(result.latencies, 0.99):>8.2f}{quantile(result.health_latencies, 0.99) * 1000:>15.1f}"
+                          f"{lag_p99 * 1000:>12.1f}{lag_max * 1000:>12.1f}")
+    finally:
+        conn.send(('stop',))
+        api_process.join(30)
+        if stub_process is not None:
+            stop_stub.set()
+            stub_process.join(10)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the API server with stub searchers")
+    parser.add_argument('--concurrency', type=int, nargs='*', default=[], help="closed loop steps, concurrent clients")
+    parser.add_argument('--rps', type=float, nargs='*', default=[], help="open loop steps, search requests per second")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per step")
+    parser.add_argument('--crawl', choices=('off', 'on'), nargs='+', default=['off', 'on'],
+                        help="run each step without and / or with concurrent crawl cycles")
+    parser.add_argument('--tool', type=SearchTool, default=SearchTool.PERPLEXITY)
+    parser.add_argument('--latency', type=float, default=1.0, help="stub searcher latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.2)
+    parser.add_argument('--payload-size', type=int, default=2000, help="stub search answer size in characters")
+    parser.add_argument('--health-rps', type=float, default=10.0, help="/health probes per second during each step")
+    parser.add_argument('--port', type=int, default=19238)
+    args = parser.parse_args()
+    if not args.concurrency and not args.rps:
+        args.concurrency = [1, 4, 16, 64]
+    asyncio.run(main(args))
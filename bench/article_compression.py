@@ -0,0 +1,127 @@
+"""
+Compression ratio and encode / decode throughput of the stored article bodies, plain zstd against a dictionary
+trained per site (ARTICLE_CONTENT_COMPRESSION=zstd).
+
+Usage:
+    python -m crawler.bench.article_compression --replay /var/log/app/crawler.cassette.jsonl.gz
+    python -m crawler.bench.article_compression --db postgres --limit 2000
+    python -m crawler.bench.article_compression --levels 3 9 19
+
+Articles come from a cassette recorded with HTTP_CASSETTE_MODE=record, crawled through the real article fetchers,
+from the TRADEBOT_DB_* database with --db postgres, or else from a StubSiteServer (synthetic bodies, the ratios are
+only indicative). Per site the articles are split in two halves by publish time, the dictionary is trained on the
+older one and every figure is measured on the newer one, like a dictionary trained once and used for new articles.
+
+Reported per site and level: articles, text size, compressed size, ratio, encode and decode MB/s of text.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from ..const import ArticleSite, ProcessRole
+from ..dao import TradebotDatabaseManagerAsync
+from ..dao.ArticleContentCodec import ArticleContentCodec, DEFAULT_DICT_SIZE
+from ..main import Main
+from ..po.ArticlePo import ArticlePo
+from ..source.HttpCassette import CassetteReplayServer
+from ..source.HttpSessionFactory import set_url_rewrites
+from .crawl_cycle import run_stub_process
+from .InMemoryTradebotDatabase import InMemoryTradebotDatabase
+from .StubSiteServer import url_rewrites
+
+SITES = [ArticleSite.CHAINCATCHER, ArticleSite.GLASSNODE]
+
+async def crawl_articles(args: argparse.Namespace) -> list[ArticlePo]:
+    context = multiprocessing.get_context('spawn')
+    stop = context.Event()
+    stub_process = None
+    replay_server = None
+    try:
+        if args.replay:
+            replay_server = CassetteReplayServer(args.replay, 'fast')
+            await asyncio.to_thread(replay_server.start)
+        else:
+            ready = context.Queue()
+            stub_process = context.Process(target=run_stub_process, args=({'latency': 0.0, 'items': args.items}, ready, stop), daemon=True)
+            stub_process.start()
+            set_url_rewrites(url_rewrites(await asyncio.to_thread(ready.get, True, 30)))
+        db = InMemoryTradebotDatabase()
+        crawler = Main(ProcessRole.SCHEDULER, tdbm=db, flash_news_sites=[], article_sites=SITES) # type: ignore
+        await crawler.crawl_articles()
+        return list(db.articles.values())
+    finally:
+        set_url_rewrites({})
+        if replay_server is not None:
+            await asyncio.to_thread(replay_server.stop)
+        if stub_process is not None:
+            stop.set()
+            stub_process.join(10)
+
+async def load_articles(args: argparse.Namespace) -> list[ArticlePo]:
+    tdbm = TradebotDatabaseManagerAsync(max_size=1)
+    await tdbm.open()
+    try:
+        articles = []
+        for site in SITES:
+            articles += await tdbm.get_articles(site, datetime.fromtimestamp(0, timezone.utc), args.limit)
+        return articles
+    finally:
+        await tdbm.close()
+
+def measure(codec: ArticleContentCodec, site: str, contents: list[str], repeat: int) -> tuple[int, float, float]:
+    """
+    Returns:
+        compressed bytes, encode seconds and decode seconds of one pass over the contents
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        blobs = [codec.encode(site, content) for content in contents]
+    encode_seconds = (time.perf_counter() - start) / repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for blob in blobs:
+            codec.decode(blob)
+    decode_seconds = (time.perf_counter() - start) / repeat
+    return sum(len(blob) for blob in blobs), encode_seconds, decode_seconds
+
+def main(args: argparse.Namespace):
+    articles = asyncio.run(load_articles(args) if args.db == 'postgres' else crawl_articles(args))
+    by_site: dict[ArticleSite, list[ArticlePo]] = defaultdict(list)
+    for article in articles:
+        if article.content:
+            by_site[article.site].append(article)
+    print(f"{'site':<14}{'level':>6}{'dict':>6}{'articles':>10}{'text KB':>10}{'zstd KB':>10}{'ratio':>8}"
+          f"{'enc MB/s':>10}{'dec MB/s':>10}")
+    for site, site_articles in by_site.items():
+        site_articles.sort(key=lambda article: article.publish_time)
+        half = len(site_articles) // 2
+        train = [article.content for article in site_articles[:half]]
+        test = [article.content for article in site_articles[half:]]
+        if len(train) < 10:
+            print(f"{site.value:<14} only {len(site_articles)} articles, at least 20 are needed")
+            continue
+        dict_content = ArticleContentCodec.train_dict(train, args.dict_size)
+        text_bytes = sum(len(content.encode('utf-8')) for content in test)
+        for level in args.levels:
+            for with_dict in (False, True):
+                codec = ArticleContentCodec(level)
+                if with_dict:
+                    codec.add_dict(site.value, dict_content)
+                compressed, encode_seconds, decode_seconds = measure(codec, site.value, test, args.repeat)
+                print(f"{site.value:<14}{level:>6}{'yes' if with_dict else 'no':>6}{len(test):>10}{text_bytes / 1024:>10.1f}"
+                      f"{compressed / 1024:>10.1f}{text_bytes / compressed:>8.2f}"
+                      f"{text_bytes / encode_seconds / 2**20:>10.1f}{text_bytes / decode_seconds / 2**20:>10.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark zstd compression of article bodies")
+    parser.add_argument('--replay', help="cassette to crawl the articles from instead of the stub")
+    parser.add_argument('--db', choices=('crawl', 'postgres'), default='crawl', help="read stored articles with postgres")
+    parser.add_argument('--limit', type=int, default=1000, help="stored articles per site with --db postgres")
+    parser.add_argument('--items', type=int, default=60, help="stub articles per site")
+    parser.add_argument('--levels', type=int, nargs='+', default=[3, 9, 19])
+    parser.add_argument('--dict-size', type=int, default=DEFAULT_DICT_SIZE)
+    parser.add_argument('--repeat', type=int, default=5, help="timed passes over the articles")
+    main(parser.parse_args())
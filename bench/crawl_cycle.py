@@ -0,0 +1,187 @@
+"""
+Offline end-to-end crawl benchmark, Main.crawl_flash_news / Main.crawl_articles against a local stub of the sites.
+
+Usage:
+    python -m crawler.bench.crawl_cycle --cycles 5 --latency 0.05 --jitter 0.02 --items 20
+    python -m crawler.bench.crawl_cycle --save-baseline bench_baseline.json
+    python -m crawler.bench.crawl_cycle --baseline bench_baseline.json --threshold 0.2
+    python -m crawler.bench.crawl_cycle --replay /var/log/app/crawler.cassette.jsonl.gz --timing fast
+
+The real fetchers, parsing and insert path run with their requests rewritten to a StubSiteServer, which runs in
+its own process so that the reported CPU time is the crawler's only. Rows go to an in-memory database by default
+(every cycle does the full work), or with --db postgres to the TRADEBOT_DB_* database, where cycles after the
+first only fetch the pages newer than the stored rows, like in production.
+FinnHub is only crawled when FINNHUB_API_KEY is set, any value works against the stub.
+With --replay the requests are answered from a cassette recorded with HTTP_CASSETTE_MODE=record instead of the stub,
+to profile or compare fetcher changes on the exact pages of a production cycle.
+
+Reported per job: cycle seconds (p50 / max), requests per second, CPU seconds per cycle and peak RSS.
+With --baseline the run fails (exit status 1) when a figure regressed by more than --threshold against it.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import statistics
+import sys
+import time
+
+import aiohttp
+
+from ..config import FINNHUB_API_KEY
+from ..const import ArticleSite, FlashNewsSite, ProcessRole
+from ..dao import TradebotDatabaseManagerAsync
+from ..diagnostics.MemoryTracker import peak_rss_bytes
+from ..main import Main
+from ..source.HttpCassette import CassetteReplayServer
+from ..source.HttpSessionFactory import set_url_rewrites, add_session_middleware, remove_session_middleware
+from .InMemoryTradebotDatabase import InMemoryTradebotDatabase
+from .StubSiteServer import StubSiteServer, url_rewrites
+
+JOBS = ('flash_news', 'articles')
+# figure -> True when higher is better
+FIGURES = {
+    'cycleSecondsP50': False,
+    'requestsPerSecond': True,
+    'cpuSecondsPerCycle': False,
+    'peakRssBytes': False,
+}
+
+async def serve_stub(options: dict, ready: multiprocessing.Queue, stop):
+    stub = StubSiteServer(**options)
+    await stub.start()
+    ready.put(stub.base_url)
+    await asyncio.to_thread(stop.wait)
+    await stub.stop()
+
+def run_stub_process(options: dict, ready: multiprocessing.Queue, stop):
+    asyncio.run(serve_stub(options, ready, stop))
+
+class RequestCounter:
+    def __init__(self):
+        self.requests = 0
+
+    async def middleware(self, request: aiohttp.ClientRequest, handler: aiohttp.ClientHandlerType) -> aiohttp.ClientResponse:
+        self.requests += 1
+        return await handler(request)
+
+async def run_job(main: Main, job: str, cycles: int, counter: RequestCounter) -> dict:
+    crawl = main.crawl_flash_news if job == 'flash_news' else main.crawl_articles
+    # warm up imports, connection pools and caches
+    await crawl()
+    durations = []
+    requests_before = counter.requests
+    cpu_start = time.process_time()
+    for _ in range(cycles):
+        start = time.perf_counter()
+        await crawl()
+        durations.append(time.perf_counter() - start)
+    cpu = time.process_time() - cpu_start
+    requests = counter.requests - requests_before
+    return {
+        'cycleSecondsP50': statistics.median(durations),
+        'cycleSecondsMax': max(durations),
+        'requestsPerCycle': requests / cycles,
+        'requestsPerSecond': requests / sum(durations),
+        'cpuSecondsPerCycle': cpu / cycles,
+        'peakRssBytes': peak_rss_bytes(),
+    }
+
+def find_regressions(results: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    for job, figures in results.items():
+        for figure, higher_is_better in FIGURES.items():
+            reference = baseline.get(job, {}).get(figure)
+            if not reference:
+                continue
+            change = (figures[figure] - reference) / reference
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append(f"{job} {figure}: {figures[figure]:.4g} vs baseline {reference:.4g} ({change:+.1%})")
+    return regressions
+
+async def main(args: argparse.Namespace) -> int:
+    if args.replay:
+        options = {'replay': args.replay, 'timing': args.timing}
+    else:
+        options = {'latency': args.latency, 'jitter': args.jitter, 'items': args.items, 'page_kb': args.page_kb}
+    context = multiprocessing.get_context('spawn')
+    stop = context.Event()
+    stub_process = None
+    replay_server = None
+    counter = RequestCounter()
+    db = None
+    try:
+        if args.replay:
+            replay_server = CassetteReplayServer(args.replay, args.timing)
+            await asyncio.to_thread(replay_server.start)
+        else:
+            ready = context.Queue()
+            stub_process = context.Process(target=run_stub_process, args=(options, ready, stop), daemon=True)
+            stub_process.start()
+            base_url = await asyncio.to_thread(ready.get, True, 30)
+            set_url_rewrites(url_rewrites(base_url))
+        add_session_middleware(counter.middleware)
+        flash_news_sites = [FlashNewsSite.CHAINCATCHER, FlashNewsSite.WALLSTREETCN]
+        if FINNHUB_API_KEY:
+            flash_news_sites.append(FlashNewsSite.FINNHUB)
+        else:
+            print("FINNHUB_API_KEY not set, finnhub is not crawled")
+        db = TradebotDatabaseManagerAsync() if args.db == 'postgres' else InMemoryTradebotDatabase()
+        await db.open()
+        crawler = Main(ProcessRole.SCHEDULER, tdbm=db, flash_news_sites=flash_news_sites, # type: ignore
+                       article_sites=[ArticleSite.CHAINCATCHER, ArticleSite.GLASSNODE])
+        results = {}
+        for job in args.jobs:
+            results[job] = await run_job(crawler, job, args.cycles, counter)
+    finally:
+        remove_session_middleware(counter.middleware)
+        set_url_rewrites({})
+        if db is not None:
+            await db.close()
+        if replay_server is not None:
+            await asyncio.to_thread(replay_server.stop)
+            if replay_server.misses:
+                print(f"warning: {replay_server.misses} requests were not in the cassette")
+        if stub_process is not None:
+            stop.set()
+            stub_process.join(10)
+
+    print(f"{'job':<12}{'cycles':>8}{'p50 s':>10}{'max s':>10}{'req/cycle':>11}{'req/s':>10}{'cpu s/cycle':>13}{'peak rss MiB':>14}")
+    for job, figures in results.items():
+        print(f"{job:<12}{args.cycles:>8}{figures['cycleSecondsP50']:>10.3f}{figures['cycleSecondsMax']:>10.3f}"
+              f"{figures['requestsPerCycle']:>11.1f}{figures['requestsPerSecond']:>10.1f}"
+              f"{figures['cpuSecondsPerCycle']:>13.3f}{figures['peakRssBytes'] / 2**20:>14.1f}")
+
+    report = {'options': {**options, 'cycles': args.cycles, 'db': args.db}, **results}
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('options') != report['options']:
+            print(f"warning: baseline was recorded with other options: {baseline.get('options')}")
+        regressions = find_regressions(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"no regression beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark crawl cycles end to end against a local stub of the sites")
+    parser.add_argument('--cycles', type=int, default=5, help="measured cycles per job, after one warm-up cycle")
+    parser.add_argument('--jobs', choices=JOBS, nargs='+', default=list(JOBS))
+    parser.add_argument('--latency', type=float, default=0.05, help="stub response latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--items', type=int, default=20, help="entries per listing")
+    parser.add_argument('--page-kb', type=int, default=100, help="boilerplate markup per html page")
+    parser.add_argument('--replay', help="cassette to answer the requests from instead of the stub")
+    parser.add_argument('--timing', choices=('recorded', 'fast'), default='recorded', help="replay timing")
+    parser.add_argument('--db', choices=('memory', 'postgres'), default='memory')
+    parser.add_argument('--baseline', help="baseline json to compare against")
+    parser.add_argument('--save-baseline', help="write the results as baseline json")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed relative regression")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,134 @@
+"""
+Compare the asyncpg and psycopg backends against a local postgres.
+
+Usage:
+    python -m crawler.bench.db_backends --rows 20000 --batch-size 200 --queries 500
+
+Connection settings come from the TRADEBOT_DB_* environment variables.
+The benchmark works on its own scratch table which is dropped at the end.
+"""
+import argparse
+import asyncio
+import hashlib
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from ..config import TRADEBOT_DB_USER, TRADEBOT_DB_PASSWORD, TRADEBOT_DB_HOST, TRADEBOT_DB_PORT, TRADEBOT_DB_NAME
+from ..const import DbBackend, FlashNewsSite, FlashNewsSource
+from ..dao.PgClient import PgClient
+from ..dao.TradebotDatabaseManagerAsync import FLASH_NEWS_COLUMNS, pg_client_class
+
+BENCH_TABLE = 't_flash_news_bench'
+
+CREATE_TABLE = f"""
+    CREATE TABLE IF NOT EXISTS {BENCH_TABLE} (
+        id BIGSERIAL PRIMARY KEY,
+        source VARCHAR(32) NOT NULL,
+        site VARCHAR(32) NOT NULL,
+        title TEXT NOT NULL,
+        title_md5 VARCHAR(32) NOT NULL,
+        description TEXT,
+        url TEXT,
+        create_time TIMESTAMPTZ NOT NULL,
+        publish_time TIMESTAMPTZ NOT NULL,
+        UNIQUE (site, title_md5, publish_time)
+    )
+"""
+CREATE_INDEX = f"CREATE INDEX IF NOT EXISTS idx_{BENCH_TABLE}_site_publish_time ON {BENCH_TABLE} (site, publish_time)"
+
+INSERT_QUERY = f"""
+    INSERT INTO {BENCH_TABLE} ({', '.join(FLASH_NEWS_COLUMNS)})
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+    ON CONFLICT (site, title_md5, publish_time) DO NOTHING
+"""
+WATERMARK_QUERY = f"""
+    SELECT MAX(publish_time) AS max_publish_time
+    FROM {BENCH_TABLE}
+    WHERE site = $1
+"""
+
+SITES = [FlashNewsSite.CHAINCATCHER, FlashNewsSite.FINNHUB, FlashNewsSite.WALLSTREETCN]
+
+def make_rows(count: int, offset: int) -> list[tuple]:
+    now = datetime.now(timezone.utc)
+    rows = []
+    for i in range(offset, offset + count):
+        site = SITES[i % len(SITES)]
+        title = f"bench flash news {i} " + "x" * 60
+        rows.append((
+            FlashNewsSource.OTHERS.value, site.value, title, hashlib.md5(title.encode('utf-8')).hexdigest(),
+            "description " * 40, f"https://example.com/news/{i}", now, now - timedelta(seconds=i)
+        ))
+    return rows
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def bench_inserts(client: PgClient, rows: int, batch_size: int, use_copy: bool, offset: int) -> float:
+    start = time.perf_counter()
+    for batch_offset in range(0, rows, batch_size):
+        batch = make_rows(min(batch_size, rows - batch_offset), offset + batch_offset)
+        if use_copy:
+            await client.copy_records(BENCH_TABLE, FLASH_NEWS_COLUMNS, batch,
+                                      on_conflict='ON CONFLICT (site, title_md5, publish_time) DO NOTHING')
+        else:
+            await client.executemany(INSERT_QUERY, batch)
+    return rows / (time.perf_counter() - start)
+
+async def bench_watermark(client: PgClient, queries: int, concurrency: int) -> list[float]:
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    async def query_once(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await client.fetch(WATERMARK_QUERY, lambda record: record['max_publish_time'], SITES[i % len(SITES)].value)
+            latencies.append(time.perf_counter() - start)
+    await asyncio.gather(*[query_once(i) for i in range(queries)])
+    return latencies
+
+async def bench_backend(backend: DbBackend, args: argparse.Namespace) -> dict[str, float]:
+    client = pg_client_class(backend)(
+        user=TRADEBOT_DB_USER,
+        password=TRADEBOT_DB_PASSWORD,
+        host=TRADEBOT_DB_HOST,
+        port=TRADEBOT_DB_PORT,
+        db_name=TRADEBOT_DB_NAME,
+        max_size=args.pool_size
+    )
+    await client.open()
+    try:
+        await client.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        await client.execute(CREATE_TABLE)
+        await client.execute(CREATE_INDEX)
+        executemany_rps = await bench_inserts(client, args.rows, args.batch_size, use_copy=False, offset=0)
+        copy_rps = await bench_inserts(client, args.rows, args.batch_size, use_copy=True, offset=args.rows)
+        await client.execute(f"ANALYZE {BENCH_TABLE}")
+        latencies = await bench_watermark(client, args.queries, args.concurrency)
+        return {
+            'executemany_rows_per_sec': executemany_rps,
+            'copy_rows_per_sec': copy_rps,
+            'watermark_p50_ms': statistics.median(latencies) * 1000,
+            'watermark_p99_ms': percentile(latencies, 0.99) * 1000,
+        }
+    finally:
+        await client.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        await client.close()
+
+async def main(args: argparse.Namespace):
+    results = {backend: await bench_backend(backend, args) for backend in args.backends}
+    metrics = list(next(iter(results.values())).keys())
+    print(f"{'metric':<28}" + ''.join(f"{backend.value:>14}" for backend in results))
+    for metric in metrics:
+        print(f"{metric:<28}" + ''.join(f"{results[backend][metric]:>14.1f}" for backend in results))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark postgres backends on insert throughput and watermark query latency")
+    parser.add_argument('--rows', type=int, default=20000, help="rows inserted per insert mode")
+    parser.add_argument('--batch-size', type=int, default=200, help="rows per insert call")
+    parser.add_argument('--queries', type=int, default=500, help="number of watermark queries")
+    parser.add_argument('--concurrency', type=int, default=8, help="concurrent watermark queries")
+    parser.add_argument('--pool-size', type=int, default=10)
+    parser.add_argument('--backends', type=DbBackend, nargs='+', default=list(DbBackend))
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,74 @@
+"""
+Concurrent search throughput against a local stub LLM server.
+
+Usage:
+    python -m crawler.bench.searcher_load --requests 200 --concurrency 100 --latency 2
+
+Every search goes through the real PerplexitySearcher / OpenrouterSearcher clients with their base url
+pointed at the stub. While the burst runs, a probe measures how long asyncio.to_thread work has to wait
+for the default executor, which is what blocking searcher calls used to starve.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from ..const import SearchTool
+from ..source.searcher import Searcher, PerplexitySearcher, OpenrouterSearcher
+from .StubLlmServer import StubLlmServer
+
+async def probe_executor(stop: asyncio.Event, interval: float) -> list[float]:
+    latencies: list[float] = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.to_thread(lambda: None)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+    return latencies
+
+async def run_burst(searcher: Searcher, requests: int, concurrency: int) -> list[float]:
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    async def search_once(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await searcher.search(f"load test query {i}", None, None)
+            latencies.append(time.perf_counter() - start)
+    await asyncio.gather(*[search_once(i) for i in range(requests)])
+    return latencies
+
+async def main(args: argparse.Namespace):
+    stub = StubLlmServer(latency=args.latency, jitter=args.jitter, payload_size=args.payload_size)
+    await stub.start()
+    try:
+        searchers: dict[SearchTool, Searcher] = {
+            SearchTool.PERPLEXITY: PerplexitySearcher(base_url=stub.base_url, api_key='stub', max_concurrency=args.max_concurrency),
+            SearchTool.OPENROUTER: OpenrouterSearcher(base_url=stub.base_url, api_key='stub', max_concurrency=args.max_concurrency),
+        }
+        print(f"{'tool':<12}{'requests':>10}{'seconds':>10}{'req/s':>10}{'p50 s':>10}{'p99 s':>10}{'upstream':>10}{'probe p99 ms':>14}")
+        for tool in args.tools:
+            stub.max_in_flight = 0
+            stop_probe = asyncio.Event()
+            probe_task = asyncio.create_task(probe_executor(stop_probe, 0.05))
+            start = time.perf_counter()
+            latencies = await run_burst(searchers[tool], args.requests, args.concurrency)
+            elapsed = time.perf_counter() - start
+            stop_probe.set()
+            probe = sorted(await probe_task)
+            latencies.sort()
+            print(f"{tool.value:<12}{args.requests:>10}{elapsed:>10.2f}{args.requests / elapsed:>10.1f}"
+                  f"{statistics.median(latencies):>10.2f}{latencies[int(0.99 * (len(latencies) - 1))]:>10.2f}"
+                  f"{stub.max_in_flight:>10}{probe[int(0.99 * (len(probe) - 1))] * 1000:>14.2f}")
+    finally:
+        await stub.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the searcher clients against a local stub server")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=100, help="concurrent callers")
+    parser.add_argument('--max-concurrency', type=int, default=32, help="per searcher cap on upstream requests")
+    parser.add_argument('--latency', type=float, default=2.0, help="stub completion latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.2)
+    parser.add_argument('--payload-size', type=int, default=2000, help="stub completion size in characters")
+    parser.add_argument('--tools', type=SearchTool, nargs='+', default=[SearchTool.PERPLEXITY, SearchTool.OPENROUTER])
+    asyncio.run(main(parser.parse_args()))
@@ -1,11 +1,14 @@
 import os
 import logging
 from pathlib import Path
+import socket
 import sys
 from enum import Enum
 
 LOG_DIR = '/var/log/app'
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+# log file name prefix, each process of the split deployment gets its own
+LOG_NAME = os.getenv('LOG_NAME', 'crawler')
 
 from .logger import configure_logger
 logger_listener = configure_logger()
@@ -28,10 +31,14 @@ TRADEBOT_DB_PASSWORD = os.getenv('TRADEBOT_DB_PASSWORD') or get_docker_secret('c
 TRADEBOT_DB_HOST = os.getenv('TRADEBOT_DB_HOST', 'tradebotdb')
 TRADEBOT_DB_PORT = int(os.getenv('TRADEBOT_DB_PORT', '5432'))
 TRADEBOT_DB_NAME = os.getenv('TRADEBOT_DB_NAME', 'tradebot_db')
+TRADEBOT_DB_POOL_MAX_SIZE = int(os.getenv('TRADEBOT_DB_POOL_MAX_SIZE', '10'))
+# bulk inserts with at least this many rows go through binary COPY instead of executemany, 0 to disable
+TRADEBOT_DB_COPY_THRESHOLD = int(os.getenv('TRADEBOT_DB_COPY_THRESHOLD', '500'))
 
 FINNHUB_API_KEY = os.getenv('FINNHUB_API_KEY') or get_docker_secret("finnhub_api_key")
 
 PERPLEXITY_SEARCHER_MODEL = os.getenv('PERPLEXITY_SEARCHER_MODEL', 'sonar-pro')
+PERPLEXITY_BASE_URL = os.getenv('PERPLEXITY_BASE_URL') or None # None for the sdk default
 PERPLEXITY_API_KEY = get_docker_secret('perplexity_api_key')
 if PERPLEXITY_API_KEY:
     os.environ['PERPLEXITY_API_KEY'] = PERPLEXITY_API_KEY # Perplexity sdk use this envrionment variable
@@ -64,8 +71,24 @@ OPENROUTER_SEARCHER_SYSTEM_PROMPT = load_system_prompt('static/prompt/openrouter
 OPENROUTER_BASE_URL = os.getenv('OPENROUTER_BASE_URL', 'https://openrouter.ai/api/v1')
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY') or get_docker_secret("openrouter_api_key")
 
+# Connection pool shared by all searcher clients, and the max concurrent requests per search tool
+# (of the whole API, split between the API workers of the split deployment)
+SEARCH_HTTP_MAX_CONNECTIONS = int(os.getenv('SEARCH_HTTP_MAX_CONNECTIONS', '32'))
+SEARCH_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('SEARCH_HTTP_MAX_KEEPALIVE_CONNECTIONS', '16'))
+PERPLEXITY_MAX_CONCURRENCY = int(os.getenv('PERPLEXITY_MAX_CONCURRENCY', '8'))
+OPENROUTER_MAX_CONCURRENCY = int(os.getenv('OPENROUTER_MAX_CONCURRENCY', '8'))
+
+# Search result cache, SEARCH_CACHE_MAX_ENTRIES=0 disables it; each API worker of the split deployment has its own
+# cache and joins concurrent identical searches of its own requests only
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', '1000'))
+SEARCH_CACHE_MAX_BYTES = int(os.getenv('SEARCH_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+SEARCH_CACHE_MIN_TTL_SECONDS = float(os.getenv('SEARCH_CACHE_MIN_TTL_SECONDS', '600'))
+SEARCH_CACHE_MAX_TTL_SECONDS = float(os.getenv('SEARCH_CACHE_MAX_TTL_SECONDS', '86400'))
+# ttl = age of the searched time window * ratio, clamped to [min, max]
+SEARCH_CACHE_TTL_AGE_RATIO = float(os.getenv('SEARCH_CACHE_TTL_AGE_RATIO', '0.1'))
+
 # Activated sites configuration
-from .const import ArticleSite, FlashNewsSite
+from .const import ArticleSite, FlashNewsSite, DbBackend, SearchTool, DeploymentMode, ContentFormat
 
 def _parse_enum_list[T: Enum](env_var: str, enum_class: type[T]) -> list[T]:
     """Parse comma-separated environment variable into list of enum values (case insensitive)."""
@@ -84,11 +107,151 @@ def _parse_enum_list[T: Enum](env_var: str, enum_class: type[T]) -> list[T]:
 
 ACTIVATED_ARTICLE_SITES: list[ArticleSite] = _parse_enum_list('ACTIVATED_ARTICLE_SITES', ArticleSite)
 ACTIVATED_FLASH_NEWS_SITES: list[FlashNewsSite] = _parse_enum_list('ACTIVATED_FLASH_NEWS_SITES', FlashNewsSite)
+# format of the stored article content, html (minified) or markdown
+ARTICLE_CONTENT_FORMAT = ContentFormat(os.getenv('ARTICLE_CONTENT_FORMAT', ContentFormat.HTML.value).lower())
+# none: content stored as text, zstd: compressed into t_article.content_zstd (static/sql/article_content_zstd.sql),
+# with the newest dictionary trained for the site (python -m crawler.article_dicts); articles stored compressed stay
+# readable when new ones are stored as text again
+ARTICLE_CONTENT_COMPRESSION = os.getenv('ARTICLE_CONTENT_COMPRESSION', 'none').lower()
+ARTICLE_CONTENT_ZSTD_LEVEL = int(os.getenv('ARTICLE_CONTENT_ZSTD_LEVEL', '3'))
+# near duplicate flash news across sites, stored as t_flash_news.cluster_md5 (static/sql/flash_news_cluster.sql):
+# titles whose shingles have a Jaccard similarity of at least THRESHOLD and published within WINDOW_MINUTES of each other.
+# With CRAWL_COORDINATION_ENABLED a replica sees the news other replicas stored from its next crawl cycle on: news
+# crawled by two replicas in the same cycle are not clustered together, later ones join the clusters of both
+FLASH_NEWS_DEDUP_ENABLED = os.getenv('FLASH_NEWS_DEDUP_ENABLED', 'false').lower() == 'true'
+FLASH_NEWS_DEDUP_THRESHOLD = float(os.getenv('FLASH_NEWS_DEDUP_THRESHOLD', '0.4'))
+FLASH_NEWS_DEDUP_WINDOW_MINUTES = float(os.getenv('FLASH_NEWS_DEDUP_WINDOW_MINUTES', '360'))
+FLASH_NEWS_DEDUP_SHINGLE_SIZE = int(os.getenv('FLASH_NEWS_DEDUP_SHINGLE_SIZE', '2'))
+# re-fetch stored articles when they are ARTICLE_REVISIT_FIRST_HOURS old, then at twice the age each time up to
+# ARTICLE_REVISIT_MAX_DAYS, and store edited contents; needs t_article.content_fingerprint (static/sql/article_revisit.sql)
+ARTICLE_REVISIT_ENABLED = os.getenv('ARTICLE_REVISIT_ENABLED', 'false').lower() == 'true'
+ARTICLE_REVISIT_FIRST_HOURS = float(os.getenv('ARTICLE_REVISIT_FIRST_HOURS', '1'))
+ARTICLE_REVISIT_MAX_DAYS = float(os.getenv('ARTICLE_REVISIT_MAX_DAYS', '7'))
+# the article listing stage queues detail pages in t_article_detail_task (static/sql/article_detail_task.sql) instead of
+# fetching them inline, detail workers claim them: ARTICLE_DETAIL_LOCAL_WORKERS in the crawler process and any number of
+# python -m crawler.detail_worker processes; a failed page is retried after ARTICLE_DETAIL_RETRY_BASE_SECONDS, doubled
+# on every attempt, up to ARTICLE_DETAIL_MAX_ATTEMPTS attempts
+ARTICLE_DETAIL_QUEUE_ENABLED = os.getenv('ARTICLE_DETAIL_QUEUE_ENABLED', 'false').lower() == 'true'
+ARTICLE_DETAIL_LOCAL_WORKERS = int(os.getenv('ARTICLE_DETAIL_LOCAL_WORKERS', '1'))
+ARTICLE_DETAIL_CLAIM_SIZE = int(os.getenv('ARTICLE_DETAIL_CLAIM_SIZE', '5'))
+# a claimed task whose worker died is claimed again after this, keep above the time a claim takes to fetch
+ARTICLE_DETAIL_LEASE_SECONDS = float(os.getenv('ARTICLE_DETAIL_LEASE_SECONDS', '300'))
+ARTICLE_DETAIL_MAX_ATTEMPTS = int(os.getenv('ARTICLE_DETAIL_MAX_ATTEMPTS', '5'))
+ARTICLE_DETAIL_RETRY_BASE_SECONDS = float(os.getenv('ARTICLE_DETAIL_RETRY_BASE_SECONDS', '60'))
+# idle workers poll the queue at this interval
+ARTICLE_DETAIL_POLL_SECONDS = float(os.getenv('ARTICLE_DETAIL_POLL_SECONDS', '5'))
+# done tasks keep their urls from being queued again for this long
+ARTICLE_DETAIL_TASK_RETENTION_DAYS = float(os.getenv('ARTICLE_DETAIL_TASK_RETENTION_DAYS', '30'))
+# python -m crawler.backfill requests per second to one host, host=rate pairs separated by commas override it per host,
+# e.g. insights.glassnode.com=0.5
+BACKFILL_HOST_REQUESTS_PER_SECOND = float(os.getenv('BACKFILL_HOST_REQUESTS_PER_SECOND', '1'))
+BACKFILL_HOST_RATE_LIMITS = {
+    host: float(rate) for host, rate in (item.split('=', 1) for item in os.getenv('BACKFILL_HOST_RATE_LIMITS', '').split(',') if '=' in item)
+}
+
+# Database backend, asyncpg (default) or psycopg (requires psycopg[binary] and psycopg-pool)
+TRADEBOT_DB_BACKEND = DbBackend(os.getenv('TRADEBOT_DB_BACKEND', DbBackend.ASYNCPG.value).lower())
+
+# Hedged search (tool 'hedged'): start the primary tool, start the secondary tool if no answer after the hedge delay.
+# The hedge delay is the SEARCH_HEDGE_DELAY_QUANTILE of recent primary latencies once SEARCH_HEDGE_MIN_SAMPLES are
+# recorded, clamped to [min, max]. Before that, or with quantile 0, SEARCH_HEDGE_DELAY_SECONDS is used.
+# Each API worker of the split deployment records the latencies of its own requests.
+SEARCH_HEDGE_PRIMARY_TOOL = SearchTool(os.getenv('SEARCH_HEDGE_PRIMARY_TOOL', SearchTool.PERPLEXITY.value).lower())
+SEARCH_HEDGE_SECONDARY_TOOL = SearchTool(os.getenv('SEARCH_HEDGE_SECONDARY_TOOL', SearchTool.OPENROUTER.value).lower())
+SEARCH_HEDGE_DELAY_SECONDS = float(os.getenv('SEARCH_HEDGE_DELAY_SECONDS', '8'))
+SEARCH_HEDGE_DELAY_QUANTILE = float(os.getenv('SEARCH_HEDGE_DELAY_QUANTILE', '0.9'))
+SEARCH_HEDGE_MIN_DELAY_SECONDS = float(os.getenv('SEARCH_HEDGE_MIN_DELAY_SECONDS', '1'))
+SEARCH_HEDGE_MAX_DELAY_SECONDS = float(os.getenv('SEARCH_HEDGE_MAX_DELAY_SECONDS', '30'))
+SEARCH_HEDGE_MIN_SAMPLES = int(os.getenv('SEARCH_HEDGE_MIN_SAMPLES', '20'))
+SEARCH_LATENCY_WINDOW = int(os.getenv('SEARCH_LATENCY_WINDOW', '200'))
 
 # Server configuration
 UVICORN_PORT = int(os.getenv('UVICORN_PORT', 9238))
 UVICORN_LOG_LEVEL = os.getenv('UVICORN_LOG_LEVEL', 'info')
 
+# single: crawler and API server share one process and event loop
+# split: a supervisor runs the crawler and API_WORKERS API server processes sharing UVICORN_PORT
+CRAWLER_DEPLOYMENT_MODE = DeploymentMode(os.getenv('CRAWLER_DEPLOYMENT_MODE', DeploymentMode.SINGLE.value).lower())
+API_WORKERS = int(os.getenv('API_WORKERS', '2'))
+# index of an API worker process of the split deployment, set by the supervisor, None in other processes
+API_WORKER_INDEX = int(os.environ['API_WORKER_INDEX']) if 'API_WORKER_INDEX' in os.environ else None
+# /metrics of API worker i of the split deployment on API_METRICS_PORT + i, 0 to disable; UVICORN_PORT reaches any
+# of the workers, so in split deployment it serves no /metrics, and /admin/* is only served by the crawler process
+API_METRICS_PORT = int(os.getenv('API_METRICS_PORT', '9240'))
+# the API only uses the database for health checks, each API worker gets a small pool of its own
+API_DB_POOL_MAX_SIZE = int(os.getenv('API_DB_POOL_MAX_SIZE', '2'))
+# seconds the supervisor waits for processes to exit after SIGTERM before killing them, keep below stop.sh timeout
+SUPERVISOR_STOP_TIMEOUT_SECONDS = float(os.getenv('SUPERVISOR_STOP_TIMEOUT_SECONDS', '25'))
+SUPERVISOR_RESTART_DELAY_SECONDS = float(os.getenv('SUPERVISOR_RESTART_DELAY_SECONDS', '5'))
+# /metrics of the crawler process in split deployment, 0 to disable
+SCHEDULER_METRICS_PORT = int(os.getenv('SCHEDULER_METRICS_PORT', '9239'))
+# crawler replicas sharing the database split the activated sites between them through leases (static/sql/crawl_lease.sql),
+# the sites of a replica that stopped renewing are taken over after CRAWL_LEASE_TTL_SECONDS; replicas need the same activated sites
+CRAWL_COORDINATION_ENABLED = os.getenv('CRAWL_COORDINATION_ENABLED', 'false').lower() == 'true'
+CRAWLER_REPLICA_ID = os.getenv('CRAWLER_REPLICA_ID', socket.gethostname())
+CRAWL_LEASE_TTL_SECONDS = float(os.getenv('CRAWL_LEASE_TTL_SECONDS', '45'))
+CRAWL_LEASE_RENEW_SECONDS = float(os.getenv('CRAWL_LEASE_RENEW_SECONDS', '15'))
+# auto: uvloop when installed, otherwise asyncio
+EVENT_LOOP = os.getenv('EVENT_LOOP', 'auto').lower()
+# event loop lag monitor heartbeat interval (0 disables) and the blocked time that triggers a stack capture
+LOOP_LAG_MONITOR_INTERVAL_SECONDS = float(os.getenv('LOOP_LAG_MONITOR_INTERVAL_SECONDS', '0.1'))
+LOOP_LAG_THRESHOLD_SECONDS = float(os.getenv('LOOP_LAG_THRESHOLD_SECONDS', '0.25'))
+# /admin/* endpoints (runtime profiling) on the API and scheduler metrics servers, keep off unless the port is private
+ADMIN_ENDPOINTS_ENABLED = os.getenv('ADMIN_ENDPOINTS_ENABLED', 'false').lower() == 'true'
+# SIGUSR2 arms profiling of the next PROFILE_SIGNAL_COUNT runs of PROFILE_SIGNAL_KIND (crawl or search)
+# matching PROFILE_SIGNAL_TARGET (site like flash_news/chaincatcher, search tool, or * for any)
+PROFILE_SIGNAL_KIND = os.getenv('PROFILE_SIGNAL_KIND', 'crawl').lower()
+PROFILE_SIGNAL_TARGET = os.getenv('PROFILE_SIGNAL_TARGET', '*')
+PROFILE_SIGNAL_COUNT = int(os.getenv('PROFILE_SIGNAL_COUNT', '1'))
+# sample: collapsed stacks of the profiled task only, cprofile: pstats of the whole loop thread
+PROFILE_MODE = os.getenv('PROFILE_MODE', 'sample').lower()
+PROFILE_SAMPLE_INTERVAL_SECONDS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_SECONDS', '0.005'))
+# tracemalloc from startup and log memory growth every interval (0: only on demand through /admin/memory)
+MEMORY_SNAPSHOT_INTERVAL_SECONDS = float(os.getenv('MEMORY_SNAPSHOT_INTERVAL_SECONDS', '0'))
+# stack frames stored per allocation, more frames cost more memory
+MEMORY_TRACEMALLOC_FRAMES = int(os.getenv('MEMORY_TRACEMALLOC_FRAMES', '1'))
+MEMORY_REPORT_TOP = int(os.getenv('MEMORY_REPORT_TOP', '10'))
+# crawl cycle stage spans, none / jsonl ({LOG_DIR}/{LOG_NAME}.spans.jsonl) / otlp (OTLP/HTTP json to SPAN_OTLP_ENDPOINT)
+SPAN_EXPORTER = os.getenv('SPAN_EXPORTER', 'none').lower()
+SPAN_OTLP_ENDPOINT = os.getenv('SPAN_OTLP_ENDPOINT', 'http://otel-collector:4318')
+
+# crawler requests to an origin sent to another base url instead, origin=base_url pairs separated by commas,
+# e.g. https://www.chaincatcher.com=http://stub:8900/chaincatcher (offline benchmarks)
+HTTP_URL_REWRITES = dict(
+    tuple(item.split('=', 1)) for item in os.getenv('HTTP_URL_REWRITES', '').split(',') if '=' in item
+)
+# record: every crawler request and response is written to the cassette, replay: requests are answered from it
+HTTP_CASSETTE_MODE = os.getenv('HTTP_CASSETTE_MODE', 'off').lower()
+HTTP_CASSETTE_PATH = os.getenv('HTTP_CASSETTE_PATH', os.path.join(LOG_DIR, f"{LOG_NAME}.cassette.jsonl.gz"))
+# replay timing, recorded: responses take as long as when recorded, fast: no waiting
+HTTP_CASSETTE_TIMING = os.getenv('HTTP_CASSETTE_TIMING', 'recorded').lower()
+
+# /health and /ready are answered from a database check refreshed at this interval
+HEALTH_CHECK_INTERVAL_SECONDS = float(os.getenv('HEALTH_CHECK_INTERVAL_SECONDS', '10'))
+# /ready fails when a site has not been crawled successfully, or has stored nothing newer, for longer than these (by kind)
+READY_MAX_CYCLE_LAG_SECONDS = {
+    'flash_news': float(os.getenv('READY_MAX_FLASH_NEWS_CYCLE_LAG_SECONDS', '300')),
+    'article': float(os.getenv('READY_MAX_ARTICLE_CYCLE_LAG_SECONDS', '10800')),
+}
+READY_MAX_PUBLISH_LAG_SECONDS = {
+    'flash_news': float(os.getenv('READY_MAX_FLASH_NEWS_PUBLISH_LAG_SECONDS', '21600')),
+    'article': float(os.getenv('READY_MAX_ARTICLE_PUBLISH_LAG_SECONDS', '1209600')),
+}
+
+# /search admission control, per tool limits are PERPLEXITY_MAX_CONCURRENCY / OPENROUTER_MAX_CONCURRENCY, hedged
+# searches are limited to the lower limit of their primary and secondary tools;
+# the limits are of the whole API, each of the API_WORKERS processes of the split deployment gets its share (api_worker_share)
+SEARCH_ADMISSION_MAX_CONCURRENCY = int(os.getenv('SEARCH_ADMISSION_MAX_CONCURRENCY', '12'))
+SEARCH_ADMISSION_MAX_QUEUE = int(os.getenv('SEARCH_ADMISSION_MAX_QUEUE', '32'))
+SEARCH_ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv('SEARCH_ADMISSION_QUEUE_TIMEOUT_SECONDS', '30'))
+SEARCH_BATCH_MAX_ITEMS = int(os.getenv('SEARCH_BATCH_MAX_ITEMS', '20'))
+
+def api_worker_share(limit: int) -> int:
+    """
+    Share of an API wide limit for this process, the API workers of the split deployment split it evenly, at least 1 each
+    """
+    return limit if API_WORKER_INDEX is None else max(1, limit // API_WORKERS)
+
 # for debug
 # class DummyListener:
 #     def stop(self):
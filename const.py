@@ -15,6 +15,24 @@ class SearchTool(str, Enum):
     BRAVE = 'brave'
     OPENROUTER = 'openrouter'
     PERPLEXITY = 'perplexity'
+    HEDGED = 'hedged'
+
+class DbBackend(str, Enum):
+    ASYNCPG = 'asyncpg'
+    PSYCOPG = 'psycopg'
+
+class ContentFormat(str, Enum):
+    HTML = 'html' # minified html
+    MARKDOWN = 'markdown'
+
+class DeploymentMode(str, Enum):
+    SINGLE = 'single'
+    SPLIT = 'split'
+
+class ProcessRole(str, Enum):
+    ALL = 'all'
+    SCHEDULER = 'scheduler'
+    API = 'api'
 
 class FlashNewsSource(str, Enum):
     INVESTING = 'investing'
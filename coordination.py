@@ -0,0 +1,139 @@
+import asyncio
+import math
+import time
+from contextlib import contextmanager
+from enum import Enum
+from typing import Iterator, Optional, Sequence
+
+from .dao import TradebotDatabaseManagerAsync
+from .diagnostics import registry
+from .hashing import hash64
+from .health import CrawlStatus
+
+import logging
+logger = logging.getLogger(__name__)
+
+LIVE_REPLICAS = registry.gauge('crawler_live_replicas', 'Crawler replicas with a recent heartbeat, as seen by this replica')
+OWNED_SITES = registry.gauge('crawler_owned_sites', 'Activated sites leased to this replica', ['kind'])
+LEASE_CHANGES = registry.counter('crawler_lease_changes_total', 'Site leases taken, handed over or lost by this replica', ['kind', 'site', 'change'])
+
+def assign_sites(keys: Sequence[tuple[str, str]], replicas: Sequence[str]) -> dict[tuple[str, str], str]:
+    """
+    Replica of every (kind, site) key by rendezvous hashing with bounded load: a key goes to the replica ranking it
+    highest that has fewer than ceil(keys / replicas) keys yet. Every replica computes the same assignment from the
+    same keys and replicas, a replica joining or leaving moves few keys.
+    """
+    if not replicas:
+        return {}
+    capacity = math.ceil(len(keys) / len(replicas))
+    loads = dict.fromkeys(replicas, 0)
+    assignment: dict[tuple[str, str], str] = {}
+    for key in sorted(keys):
+        ranked = sorted(replicas, key=lambda replica: hash64(f"{replica}/{key[0]}/{key[1]}".encode('utf-8')), reverse=True)
+        replica = next(replica for replica in ranked if loads[replica] < capacity)
+        loads[replica] += 1
+        assignment[key] = replica
+    return assignment
+
+class CrawlCoordinator:
+    """
+    Splits the activated sites between the crawler replicas sharing the database.
+
+    On every renewal (every CRAWL_LEASE_RENEW_SECONDS) a replica records its heartbeat, assigns the sites over the live replicas (assign_sites),
+    hands over the leases of sites assigned to another replica once it is not crawling them, and takes or renews the
+    leases of its own. A site is only crawled by the replica holding its lease, so a site is never crawled twice
+    while the assignment of replicas disagrees for a moment. When a replica dies its heartbeat and leases expire
+    after ttl and the others take its sites over with their next renewal.
+    """
+    def __init__(self, tdbm: TradebotDatabaseManagerAsync, replica_id: str, keys: Sequence[tuple[str, str]],
+                 ttl: float, crawl_status: Optional[CrawlStatus] = None):
+        """
+        Args:
+            keys: (kind, site) of the activated sites
+            ttl: seconds a heartbeat and a lease last, several renewal intervals
+            crawl_status: readiness of the process, only covers the sites leased to it
+        """
+        self.__tdbm = tdbm
+        self.__replica_id = replica_id
+        self.__keys = list(keys)
+        self.__ttl = ttl
+        self.__crawl_status = crawl_status
+        self.__leased: set[tuple[str, str]] = set()
+        # monotonic time the leases last until, counted from before the renewal request was sent
+        self.__leased_until = 0.0
+        # sites being crawled are renewed but not handed over until the crawl ends
+        self.__crawling: dict[tuple[str, str], int] = {}
+        self.__lock = asyncio.Lock()
+
+    def owns(self, kind: str, site: str) -> bool:
+        return (kind, site) in self.__leased and time.monotonic() < self.__leased_until
+
+    @contextmanager
+    def crawling[S: Enum](self, kind: str, sites: Sequence[S]) -> Iterator[list[S]]:
+        """
+        The sites of the kind leased to this replica, kept until the with block ends
+        """
+        owned = [site for site in sites if self.owns(kind, site.value)]
+        keys = [(kind, site.value) for site in owned]
+        for key in keys:
+            self.__crawling[key] = self.__crawling.get(key, 0) + 1
+        try:
+            yield owned
+        finally:
+            for key in keys:
+                self.__crawling[key] -= 1
+                if not self.__crawling[key]:
+                    del self.__crawling[key]
+
+    async def renew(self):
+        async with self.__lock:
+            try:
+                await self.__renew()
+            except Exception as e:
+                # the leases expire unless a later renewal succeeds in time, owns() stops the crawls then
+                logger.error(f"renewing crawl leases of replica {self.__replica_id} failed: {e}", exc_info=True)
+
+    async def __renew(self):
+        started = time.monotonic()
+        replicas = await self.__tdbm.heartbeat_crawler_replica(self.__replica_id, self.__ttl)
+        if self.__replica_id not in replicas:
+            replicas.append(self.__replica_id)
+        LIVE_REPLICAS.set(len(replicas))
+        assignment = assign_sites(self.__keys, replicas)
+        wanted = {key for key, replica in assignment.items() if replica == self.__replica_id} | set(self.__crawling)
+        handed_over = self.__leased - wanted
+        await self.__tdbm.release_crawl_leases(self.__replica_id, sorted(handed_over))
+        leased = set(await self.__tdbm.acquire_crawl_leases(self.__replica_id, sorted(wanted), self.__ttl))
+        self.__leased_until = started + self.__ttl
+        for kind, site in handed_over:
+            LEASE_CHANGES.inc(kind=kind, site=site, change='handed_over')
+        for kind, site in (self.__leased - handed_over) - leased:
+            LEASE_CHANGES.inc(kind=kind, site=site, change='lost')
+        for kind, site in leased - self.__leased:
+            LEASE_CHANGES.inc(kind=kind, site=site, change='taken')
+        if leased != self.__leased:
+            logger.info(f"replica {self.__replica_id} of {len(replicas)} crawls: {sorted(f'{kind}/{site}' for kind, site in leased)}")
+        self.__update_crawl_status(leased)
+        self.__leased = leased
+        for kind in {kind for kind, _ in self.__keys}:
+            OWNED_SITES.set(sum(1 for key in leased if key[0] == kind), kind=kind)
+
+    def __update_crawl_status(self, leased: set[tuple[str, str]]):
+        if self.__crawl_status is None:
+            return
+        for kind, site in leased - self.__leased:
+            self.__crawl_status.expect(kind, site)
+        for kind, site in self.__leased - leased:
+            self.__crawl_status.forget(kind, site)
+
+    async def stop(self):
+        """
+        Leave the replicas and release the leases, the others take the sites over with their next renewal
+        """
+        async with self.__lock:
+            self.__update_crawl_status(set())
+            self.__leased = set()
+            try:
+                await self.__tdbm.remove_crawler_replica(self.__replica_id)
+            except Exception as e:
+                logger.error(f"removing replica {self.__replica_id} failed, its leases expire instead: {e}", exc_info=True)
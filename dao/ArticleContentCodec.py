@@ -0,0 +1,81 @@
+from typing import Optional
+
+try:
+    # standard library from python 3.14
+    from compression import zstd # type: ignore
+except ImportError:
+    try:
+        # installed with aiohttp[speedups] before 3.14
+        from backports import zstd # type: ignore
+    except ImportError:
+        zstd = None
+
+# first byte of t_article.content_zstd, a zstd frame follows
+ZSTD_MARKER = b'\x01'
+# zstd's own default dictionary size
+DEFAULT_DICT_SIZE = 112640
+
+def zstd_available() -> bool:
+    return zstd is not None
+
+class ArticleContentCodec:
+    """
+    zstd compression of article bodies, with the latest dictionary trained for the site when there is one.
+    The frame header records the dictionary id, decode picks the dictionary by it, so bodies compressed with
+    older dictionaries stay readable as long as those are kept.
+    """
+    def __init__(self, level: int):
+        if zstd is None:
+            raise RuntimeError("zstd compression needs python 3.14 or the backports.zstd package")
+        self.__level = level
+        self.__dicts: dict[int, object] = {}
+        self.__site_dicts: dict[str, object] = {}
+
+    def add_dict(self, site: str, dict_content: bytes) -> int:
+        """
+        Add a trained dictionary, the last one added for a site is used to encode its bodies
+
+        Returns:
+            dictionary id
+        """
+        zstd_dict = zstd.ZstdDict(dict_content)
+        self.__dicts[zstd_dict.dict_id] = zstd_dict
+        self.__site_dicts[site] = zstd_dict
+        return zstd_dict.dict_id
+
+    def has_dict(self, dict_id: int) -> bool:
+        return dict_id in self.__dicts
+
+    def encode(self, site: str, content: str) -> bytes:
+        zstd_dict = self.__site_dicts.get(site)
+        # digested once per level and cached on the dictionary, loading it undigested per call is several times slower
+        return ZSTD_MARKER + zstd.compress(content.encode('utf-8'), level=self.__level,
+                                           zstd_dict=zstd_dict.as_digested_dict if zstd_dict is not None else None)
+
+    @staticmethod
+    def dict_id_of(blob: bytes) -> int:
+        """
+        Dictionary id the body was compressed with, 0 for none
+        """
+        if blob[:1] != ZSTD_MARKER:
+            raise ValueError(f"Unknown article content format marker: {blob[:1]!r}")
+        return zstd.get_frame_info(blob[1:]).dictionary_id
+
+    def decode(self, blob: bytes) -> str:
+        dict_id = self.dict_id_of(blob)
+        zstd_dict: Optional[object] = None
+        if dict_id:
+            zstd_dict = self.__dicts.get(dict_id)
+            if zstd_dict is None:
+                raise KeyError(f"zstd dictionary {dict_id} is not loaded")
+            zstd_dict = zstd_dict.as_digested_dict # type: ignore
+        return zstd.decompress(blob[1:], zstd_dict=zstd_dict).decode('utf-8')
+
+    @staticmethod
+    def train_dict(samples: list[str], dict_size: int = DEFAULT_DICT_SIZE) -> bytes:
+        """
+        Train a dictionary on sample bodies of one site, a few hundred samples are enough
+        """
+        if zstd is None:
+            raise RuntimeError("zstd compression needs python 3.14 or the backports.zstd package")
+        return zstd.train_dict([sample.encode('utf-8') for sample in samples], dict_size).dict_content
@@ -1,19 +1,24 @@
-from typing import Any, Optional, Callable, Awaitable
+import time
+from typing import Any, Optional, Callable, Awaitable, Iterable, Sequence
 import asyncpg
 from asyncpg.exceptions import PostgresError, InterfaceError
 from asyncpg.pool import PoolConnectionProxy
 
+from .PgClient import PgClient, POOL_WAIT_SECONDS, QUERY_SECONDS
+from ..diagnostics import stage, span_attributes
+
 import logging
 
 log = logging.getLogger(__name__)
 
-class AsyncpgPgClient:
-    def __init__(self, user: str, password: str, host: str, port: int, db_name: str):
+class AsyncpgPgClient(PgClient):
+    def __init__(self, user: str, password: str, host: str, port: int, db_name: str, max_size: int = 10):
         self.__user = user
         self.__password = password
         self.__host = host
         self.__port = port
         self.__db_name = db_name
+        self.__max_size = max_size
         self.__pool: Optional[asyncpg.pool.Pool] = None
 
     async def test_connection(self) -> bool:
@@ -45,7 +50,8 @@ class AsyncpgPgClient:
                 host=self.__host,
                 port=self.__port,
                 database=self.__db_name,
-                max_size=10
+                min_size=min(self.__max_size, 10), # asyncpg default min_size is 10
+                max_size=self.__max_size
             )
         except Exception as e:
             log.error(f"Failed to open connection pool: {e}", exc_info=True)
@@ -56,14 +62,22 @@ class AsyncpgPgClient:
             return
         await self.__pool.close()
 
-    async def __on_conn[R](self, callback: Callable[[PoolConnectionProxy], Awaitable[R]]) -> R:
+    async def __on_conn[R](self, op: str, callback: Callable[[PoolConnectionProxy], Awaitable[R]]) -> R:
         if self.__pool is None:
             await self.open()
             if self.__pool is None:
                 raise Exception("failed to init connection pool")
         try:
-            async with self.__pool.acquire() as conn:
-                return await callback(conn)
+            with stage(f"db_{op}", backend='asyncpg'):
+                wait_start = time.perf_counter()
+                async with self.__pool.acquire() as conn:
+                    query_start = time.perf_counter()
+                    POOL_WAIT_SECONDS.observe(query_start - wait_start, backend='asyncpg')
+                    span_attributes(poolWaitMs=round((query_start - wait_start) * 1000, 3))
+                    try:
+                        return await callback(conn)
+                    finally:
+                        QUERY_SECONDS.observe(time.perf_counter() - query_start, backend='asyncpg', op=op)
         except PostgresError as e:
             log.error(f"DB Error: {e}", exc_info=True)
             raise e
@@ -88,19 +102,40 @@ class AsyncpgPgClient:
                             break
                         result.extend(list(map(result_mapper, batch)))
                     return result
-            return await self.__on_conn(callback)
+            return await self.__on_conn('fetch', callback)
         else:
-            records = await self.__on_conn(lambda conn: conn.fetch(query_str, *params))
+            records = await self.__on_conn('fetch', lambda conn: conn.fetch(query_str, *params))
             return list(map(result_mapper, records))
 
     async def execute(self, query_str: str, *params):
         async def callback(conn: PoolConnectionProxy):
             async with conn.transaction():
                 await conn.execute(query_str, *params)
-        return await self.__on_conn(callback)
+        return await self.__on_conn('execute', callback)
 
-    async def executemany(self, query_str: str, params_list: list[tuple]):
+    async def executemany(self, query_str: str, params_list: Iterable[tuple]):
         async def callback(conn: PoolConnectionProxy):
             async with conn.transaction():
                 await conn.executemany(query_str, params_list)
-        return await self.__on_conn(callback)
+        return await self.__on_conn('executemany', callback)
+
+    async def fetchmany[R](self, query_str: str, result_mapper: Callable[[dict[str, Any]], R], params_list: Iterable[tuple]) -> list[R]:
+        async def callback(conn: PoolConnectionProxy):
+            async with conn.transaction():
+                return await conn.fetchmany(query_str, params_list)
+        records = await self.__on_conn('fetchmany', callback)
+        return list(map(result_mapper, records))
+
+    async def copy_records(self, table: str, columns: Sequence[str], records: Iterable[tuple], on_conflict: str = '') -> int:
+        if not records:
+            return 0
+        stage_table = f"_copy_{table}"
+        column_str = ', '.join(columns)
+        async def callback(conn: PoolConnectionProxy):
+            async with conn.transaction():
+                await conn.execute(f"CREATE TEMP TABLE {stage_table} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+                await conn.copy_records_to_table(stage_table, records=records, columns=list(columns))
+                status = await conn.execute(f"INSERT INTO {table} ({column_str}) SELECT {column_str} FROM {stage_table} {on_conflict}")
+                # status is 'INSERT 0 <rows>'
+                return int(status.split()[-1])
+        return await self.__on_conn('copy', callback)
@@ -0,0 +1,61 @@
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Iterable, Sequence
+
+from ..diagnostics import registry
+
+POOL_WAIT_SECONDS = registry.histogram('crawler_db_pool_wait_seconds', 'Time spent waiting for a pooled connection', ['backend'])
+QUERY_SECONDS = registry.histogram('crawler_db_query_seconds', 'Time a pooled connection was held per operation', ['backend', 'op'])
+
+class PgClient(ABC):
+    """
+    Async postgres client interface consumed by TradebotDatabaseManagerAsync.
+    Queries use asyncpg style positional placeholders ($1, $2, ...) for every backend.
+    """
+
+    @abstractmethod
+    async def test_connection(self) -> bool:
+        pass
+
+    @abstractmethod
+    def pool_is_closing(self) -> bool:
+        pass
+
+    @abstractmethod
+    async def open(self):
+        pass
+
+    @abstractmethod
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def fetch[R](self, query_str: str, result_mapper: Callable[[dict[str, Any]], R], *params, batch_mode=False, batch_size=5000) -> list[R]:
+        pass
+
+    @abstractmethod
+    async def execute(self, query_str: str, *params):
+        pass
+
+    @abstractmethod
+    async def executemany(self, query_str: str, params_list: Iterable[tuple]):
+        pass
+
+    @abstractmethod
+    async def fetchmany[R](self, query_str: str, result_mapper: Callable[[dict[str, Any]], R], params_list: Iterable[tuple]) -> list[R]:
+        """
+        Run query_str once per params in one transaction, like executemany, and return the rows of all runs
+        (e.g. of INSERT ... RETURNING)
+        """
+        pass
+
+    @abstractmethod
+    async def copy_records(self, table: str, columns: Sequence[str], records: Iterable[tuple], on_conflict: str = '') -> int:
+        """
+        Bulk insert records with binary COPY.
+        Records are copied into a transaction scoped staging table first, then moved into the target table
+        with INSERT ... SELECT so that on_conflict (e.g. 'ON CONFLICT (...) DO NOTHING') still applies.
+
+        Returns:
+            number of rows inserted into the target table
+        """
+        pass
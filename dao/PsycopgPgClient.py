@@ -1,129 +1,209 @@
 import logging
-from typing import Callable, Any
-from psycopg import Error as PsycopgError
-from psycopg import IsolationLevel
-from psycopg_pool import pool, PoolClosed, PoolTimeout
-from psycopg import Cursor
-from psycopg.rows import tuple_row
-from psycopg_pool import ConnectionPool
-from typing import cast
+import re
+import time
+from functools import lru_cache
+from typing import Any, Callable, Iterable, Optional, Sequence
+from psycopg import AsyncConnection, Error as PsycopgError
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+
+from .PgClient import PgClient, POOL_WAIT_SECONDS, QUERY_SECONDS
+from ..diagnostics import stage, span_attributes
 
 log = logging.getLogger(__name__)
 
-class PsycopgPgClient:
-    def __init__(self, user: str, password: str, host: str, port: int, db_name: str):
+_PLACEHOLDER_PATTERN = re.compile(r'\$(\d+)')
+
+@lru_cache(maxsize=256)
+def _convert_query(query_str: str) -> tuple[str, tuple[int, ...]]:
+    """
+    Convert an asyncpg style query ($1, $2, ...) into psycopg style (%s, ...).
+    Returns the converted query and the param index for each placeholder, in order of appearance.
+    """
+    param_order: list[int] = []
+    def replace(match: re.Match) -> str:
+        param_order.append(int(match.group(1)) - 1)
+        return '%s'
+    converted = _PLACEHOLDER_PATTERN.sub(replace, query_str.replace('%', '%%'))
+    return converted, tuple(param_order)
+
+def _order_params(params: Sequence[Any], param_order: tuple[int, ...]) -> tuple:
+    return tuple(params[i] for i in param_order)
+
+class PsycopgPgClient(PgClient):
+    """
+    psycopg3 backend on top of AsyncConnectionPool.
+    executemany runs in pipeline mode and copy_records uses binary COPY.
+    """
+    def __init__(self, user: str, password: str, host: str, port: int, db_name: str, max_size: int = 10):
         self.__user = user
         self.__password = password
         self.__host = host
         self.__port = port
         self.__db_name = db_name
-        self.__connection_pool = None
+        self.__max_size = max_size
+        self.__pool: Optional[AsyncConnectionPool] = None
         self.__binary_mode = False
+        self.__copy_types: dict[tuple[str, tuple[str, ...]], list[int]] = {}
+
+    def toggle_binary_mode(self, enabled: bool):
+        self.__binary_mode = enabled
+
+    async def test_connection(self) -> bool:
+        """
+        Test connection to the database
 
-    @property
-    def is_connected(self) -> bool:
-        def test_query(cursor: Cursor):
-            cursor.execute("SELECT 1")
-            return cursor.fetchone()
+        Returns:
+            bool: True if connection is successful, False otherwise
+        """
         try:
-            result = self.query(test_query)
-            log.info(f"Connection test result: {result}")
-            return result is not None and result[0] == 1
+            result = await self.fetch("SELECT 1 AS test", lambda record: record['test'])
+            return result is not None and len(result) > 0 and result[0] == 1
         except Exception as e:
-            log.error(f"Connection test failed: {e}", exc_info=True)
+            log.error(f"Failed to test connection: {e}", exc_info=True)
             return False
 
-    def open(self):
-        if self.__connection_pool is not None:
+    def pool_is_closing(self) -> bool:
+        if self.__pool is None:
+            return False
+        return self.__pool.closed
+
+    async def open(self):
+        if self.__pool is not None:
             return
-        conn_str = f"postgresql://{self.__user}:{self.__password}@{self.__host}:{self.__port}/{self.__db_name}"
-        self.__connection_pool = pool.ConnectionPool(conn_str)
+        conninfo = make_conninfo(
+            user=self.__user,
+            password=self.__password,
+            host=self.__host,
+            port=self.__port,
+            dbname=self.__db_name,
+        )
+        pool = AsyncConnectionPool(conninfo, min_size=1, max_size=self.__max_size, kwargs={'autocommit': True}, open=False)
+        try:
+            await pool.open(wait=True)
+        except Exception as e:
+            log.error(f"Failed to open connection pool: {e}", exc_info=True)
+            await pool.close()
+            raise e
+        self.__pool = pool
         log.info(f"Opened connection pool to postgresql://{self.__host}:{self.__port}/{self.__db_name} with user {self.__user}")
 
-    def close(self):
-        if self.__connection_pool is None:
+    async def close(self):
+        if self.__pool is None:
             return
-        self.__connection_pool.close()
-        self.__connection_pool = None
+        await self.__pool.close()
+        self.__pool = None
         log.info(f"Closed connection pool to postgresql://{self.__host}:{self.__port}/{self.__db_name} with user {self.__user}")
 
-    def toggle_binary_mode(self, enabled: bool):
-        self.__binary_mode = enabled
-
-    def query[R](self, callback: Callable[[Cursor[Any]], R], row_factory: Callable[[Cursor[Any]], Any] = tuple_row, retry_count: int = 0) -> R:
-        """
-        Execute a database queries using the provided callback function.
-        
-        Args:
-            callback: A function that takes a psycopg cursor, take some operations and then returns a result of type R if any
-            
-        Returns:
-            The result of the callback if successful, raise an exception if an error occurs
-        """
-
-        conn = None
+    async def __on_conn[R](self, op: str, callback: Callable[[AsyncConnection], Any]) -> R:
+        if self.__pool is None:
+            await self.open()
+            if self.__pool is None:
+                raise Exception("failed to init connection pool")
         try:
-            if self.__connection_pool is None:
-                self.open()
-            conn = cast(ConnectionPool, self.__connection_pool).getconn(timeout=2)
-            conn.set_autocommit(True)
-            with conn.cursor(row_factory=row_factory, binary=self.__binary_mode) as cursor:
-                return callback(cursor)
-        except (PoolClosed, PoolTimeout) as e:
-            self.__connection_pool = None
-            if retry_count > 0:
-                log.error(f"Database pool closed unexpectedly, retry connect {retry_count} times, still failed")
-                raise e
-            else:
-                log.error(f"Database pool closed unexpectedly, retry connect {retry_count} times")
-                self.open()
-                return self.query(callback, row_factory, retry_count + 1)
+            with stage(f"db_{op}", backend='psycopg'):
+                wait_start = time.perf_counter()
+                async with self.__pool.connection() as conn:
+                    query_start = time.perf_counter()
+                    POOL_WAIT_SECONDS.observe(query_start - wait_start, backend='psycopg')
+                    span_attributes(poolWaitMs=round((query_start - wait_start) * 1000, 3))
+                    try:
+                        return await callback(conn)
+                    finally:
+                        QUERY_SECONDS.observe(time.perf_counter() - query_start, backend='psycopg', op=op)
         except PsycopgError as e:
-            log.error(f"Database error: {e}", exc_info=True)
+            log.error(f"DB Error: {e}", exc_info=True)
+            raise e
+        except PoolTimeout as e:
+            log.error(f"Pool Timeout: {e}", exc_info=True)
             raise e
-        finally:
-            if conn:
-                conn.set_autocommit(False)
-                cast(ConnectionPool, self.__connection_pool).putconn(conn)
-        
 
-    def txn[R](self, callback: Callable[[Cursor[Any]], R], isolation_lvl: IsolationLevel = IsolationLevel.READ_COMMITTED, row_factory: Callable[[Cursor[Any]], Any] = tuple_row, retry_count: int = 0) -> R:
-        """
-        Execute a database queries in a single transaction using the provided callback function.
-        
-        Args:
-            callback: A function that takes a psycopg cursor, take some operations and then returns a result of type R if any
-            
-        Returns:
-            The result of the callback if successful, raise an exception if an error occurs
-        """
+    async def fetch[R](self, query_str: str, result_mapper: Callable[[dict[str, Any]], R], *params, batch_mode=False, batch_size=5000) -> list[R]:
+        query, param_order = _convert_query(query_str)
+        ordered_params = _order_params(params, param_order)
 
-        if isolation_lvl not in [IsolationLevel.READ_COMMITTED, IsolationLevel.REPEATABLE_READ, IsolationLevel.SERIALIZABLE]:
-            raise ValueError(f"Not allowed isolation level: {isolation_lvl}")
+        if batch_mode:
+            async def batch_callback(conn: AsyncConnection) -> list[R]:
+                async with conn.transaction():
+                    async with conn.cursor(name='batch_fetch', row_factory=dict_row, binary=self.__binary_mode) as cursor:
+                        await cursor.execute(query, ordered_params)
+                        result = []
+                        while True:
+                            batch = await cursor.fetchmany(batch_size)
+                            if not batch:
+                                break
+                            result.extend(list(map(result_mapper, batch)))
+                        return result
+            return await self.__on_conn('fetch', batch_callback)
+        else:
+            async def callback(conn: AsyncConnection) -> list[R]:
+                async with conn.cursor(row_factory=dict_row, binary=self.__binary_mode) as cursor:
+                    await cursor.execute(query, ordered_params)
+                    return list(map(result_mapper, await cursor.fetchall()))
+            return await self.__on_conn('fetch', callback)
 
-        conn = None
-        try:
-            if self.__connection_pool is None:
-                self.open()
-            conn = cast(ConnectionPool, self.__connection_pool).getconn(timeout=2)
-            conn.set_isolation_level(isolation_lvl)
-            with conn.transaction():
-                with conn.cursor(row_factory=row_factory) as cursor:
-                    result = callback(cursor)
-                    return result
-        except (PoolClosed, PoolTimeout) as e:
-            self.__connection_pool = None
-            if retry_count > 0:
-                log.error(f"Database pool closed unexpectedly, retry connect {retry_count} times, still failed")
-                raise e
-            else:
-                log.error(f"Database pool closed unexpectedly, retry connect {retry_count} times")
-                self.open()
-                return self.txn(callback, isolation_lvl, row_factory, retry_count + 1)
-        except PsycopgError as e:
-            log.error(f"Database error: {e}", exc_info=True)
-            raise e
-        finally:
-            if conn:
-                conn.set_isolation_level(IsolationLevel.READ_COMMITTED)
-                cast(ConnectionPool, self.__connection_pool).putconn(conn)
+    async def execute(self, query_str: str, *params):
+        query, param_order = _convert_query(query_str)
+        async def callback(conn: AsyncConnection):
+            async with conn.transaction():
+                await conn.execute(query, _order_params(params, param_order))
+        return await self.__on_conn('execute', callback)
+
+    async def executemany(self, query_str: str, params_list: Iterable[tuple]):
+        query, param_order = _convert_query(query_str)
+        async def callback(conn: AsyncConnection):
+            # pipeline mode sends every statement without waiting for the previous result
+            async with conn.pipeline():
+                async with conn.transaction():
+                    async with conn.cursor(binary=self.__binary_mode) as cursor:
+                        await cursor.executemany(query, (_order_params(params, param_order) for params in params_list))
+        return await self.__on_conn('executemany', callback)
+
+    async def fetchmany[R](self, query_str: str, result_mapper: Callable[[dict[str, Any]], R], params_list: Iterable[tuple]) -> list[R]:
+        query, param_order = _convert_query(query_str)
+        async def callback(conn: AsyncConnection) -> list[R]:
+            async with conn.pipeline():
+                async with conn.transaction():
+                    async with conn.cursor(row_factory=dict_row, binary=self.__binary_mode) as cursor:
+                        await cursor.executemany(query, (_order_params(params, param_order) for params in params_list), returning=True)
+                        result: list[R] = []
+                        # one result set per params
+                        while True:
+                            result.extend(map(result_mapper, await cursor.fetchall()))
+                            if not cursor.nextset():
+                                break
+                        return result
+        return await self.__on_conn('fetchmany', callback)
+
+    async def copy_records(self, table: str, columns: Sequence[str], records: Iterable[tuple], on_conflict: str = '') -> int:
+        if not records:
+            return 0
+        stage_table = f"_copy_{table}"
+        column_str = ', '.join(columns)
+        async def callback(conn: AsyncConnection):
+            async with conn.transaction():
+                await conn.execute(f"CREATE TEMP TABLE {stage_table} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+                column_types = await self.__get_copy_types(conn, table, stage_table, tuple(columns))
+                async with conn.cursor() as cursor:
+                    async with cursor.copy(f"COPY {stage_table} ({column_str}) FROM STDIN (FORMAT BINARY)") as copy:
+                        copy.set_types(column_types)
+                        for record in records:
+                            await copy.write_row(record)
+                cursor = await conn.execute(f"INSERT INTO {table} ({column_str}) SELECT {column_str} FROM {stage_table} {on_conflict}")
+                return cursor.rowcount
+        return await self.__on_conn('copy', callback)
+
+    async def __get_copy_types(self, conn: AsyncConnection, table: str, stage_table: str, columns: tuple[str, ...]) -> list[int]:
+        """
+        Binary COPY needs the postgres type oid of every column, cached per target table and column list
+        """
+        key = (table, columns)
+        if key not in self.__copy_types:
+            cursor = await conn.execute(
+                "SELECT attname, atttypid::int FROM pg_attribute WHERE attrelid = %s::regclass AND attnum > 0",
+                (stage_table,)
+            )
+            type_by_column = {name: type_oid for name, type_oid in await cursor.fetchall()}
+            self.__copy_types[key] = [type_by_column[column] for column in columns]
+        return self.__copy_types[key]
@@ -0,0 +1,44 @@
+from typing import Any, Iterator, Sequence
+
+class RecordBatch:
+    """
+    Rows to insert into one table kept as one list per column, handed to executemany / COPY as an iterator of row
+    tuples that are built while the driver encodes them instead of all up front.
+    Large batches (backfills) can be filled column by column without a record object per row.
+    """
+    __slots__ = ('__columns', '__values')
+
+    def __init__(self, values: dict[str, list[Any]]):
+        """
+        Args:
+            values: column name -> values of the column, all of the same length
+        """
+        lengths = {len(column_values) for column_values in values.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Columns of a record batch differ in length: {sorted(lengths)}")
+        self.__columns = tuple(values)
+        self.__values = list(values.values())
+
+    @property
+    def columns(self) -> tuple[str, ...]:
+        return self.__columns
+
+    def column(self, name: str) -> list[Any]:
+        return self.__values[self.__columns.index(name)]
+
+    def with_column(self, name: str, values: list[Any]) -> 'RecordBatch':
+        """
+        Batch with the column added, or replaced when it exists
+        """
+        columns = dict(zip(self.__columns, self.__values))
+        columns[name] = values
+        return RecordBatch(columns)
+
+    def select(self, columns: Sequence[str]) -> 'RecordBatch':
+        return RecordBatch({name: self.column(name) for name in columns})
+
+    def __len__(self) -> int:
+        return len(self.__values[0]) if self.__values else 0
+
+    def rows(self) -> Iterator[tuple]:
+        return zip(*self.__values)
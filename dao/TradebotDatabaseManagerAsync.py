@@ -1,92 +1,462 @@
+import asyncio
 import logging
-from typing import Optional, List
+from typing import Optional, List, TypedDict
 
-from crawler.const import ArticleSite, FlashNewsSite
+from crawler.const import ArticleSite, ArticleSource, FlashNewsSite, FlashNewsSource, DbBackend
+from crawler.dao.ArticleContentCodec import ArticleContentCodec
 from crawler.dao.AsyncpgPgClient import AsyncpgPgClient
-from ..config import TRADEBOT_DB_USER, TRADEBOT_DB_PASSWORD, TRADEBOT_DB_HOST, TRADEBOT_DB_PORT, TRADEBOT_DB_NAME
-from datetime import datetime
+from crawler.dao.PgClient import PgClient
+from crawler.dao.RecordBatch import RecordBatch
+from ..config import TRADEBOT_DB_USER, TRADEBOT_DB_PASSWORD, TRADEBOT_DB_HOST, TRADEBOT_DB_PORT, TRADEBOT_DB_NAME, \
+    TRADEBOT_DB_POOL_MAX_SIZE, TRADEBOT_DB_COPY_THRESHOLD, TRADEBOT_DB_BACKEND, ARTICLE_CONTENT_COMPRESSION, \
+    ARTICLE_CONTENT_ZSTD_LEVEL, FLASH_NEWS_DEDUP_ENABLED, ARTICLE_REVISIT_ENABLED
+from datetime import datetime, timezone
 from ..po.FlashNewsPo import FlashNewsPo
 from ..po.SearchResultPo import SearchResultPo
 from ..po.ArticlePo import ArticlePo
+from ..hashing import fingerprint
 
 log = logging.getLogger(__name__)
 
-class TradebotDatabaseManagerAsync(AsyncpgPgClient):
-    def __init__(self):
+FLASH_NEWS_COLUMNS = ('source', 'site', 'title', 'title_md5', 'description', 'url', 'create_time', 'publish_time')
+# near duplicate clusters (static/sql/flash_news_cluster.sql)
+FLASH_NEWS_CLUSTER_COLUMNS = FLASH_NEWS_COLUMNS + ('cluster_md5',)
+ARTICLE_COLUMNS = ('source', 'site', 'title', 'title_md5', 'content', 'url', 'create_time', 'publish_time')
+# compressed bodies go to content_zstd (static/sql/article_content_zstd.sql) with content NULL
+ARTICLE_ZSTD_COLUMNS = ARTICLE_COLUMNS + ('content_zstd',)
+
+def flash_news_batch(flash_news_list: List[FlashNewsPo]) -> RecordBatch:
+    return RecordBatch({
+        'source': [news.source.value for news in flash_news_list],
+        'site': [news.site.value for news in flash_news_list],
+        'title': [news.title for news in flash_news_list],
+        'title_md5': [news.title_md5 for news in flash_news_list],
+        'description': [news.description for news in flash_news_list],
+        'url': [news.url for news in flash_news_list],
+        'create_time': [news.create_time for news in flash_news_list],
+        'publish_time': [news.publish_time for news in flash_news_list],
+        'cluster_md5': [news.cluster_md5 for news in flash_news_list],
+    })
+
+def article_batch(articles_list: List[ArticlePo]) -> RecordBatch:
+    return RecordBatch({
+        'source': [article.source.value for article in articles_list],
+        'site': [article.site.value for article in articles_list],
+        'title': [article.title for article in articles_list],
+        'title_md5': [article.title_md5 for article in articles_list],
+        'content': [article.content for article in articles_list],
+        'url': [article.url for article in articles_list],
+        'create_time': [article.create_time for article in articles_list],
+        'publish_time': [article.publish_time for article in articles_list],
+        'content_fingerprint': [article.content_fingerprint for article in articles_list],
+    })
+
+class StoredArticleFingerprint(TypedDict):
+    id: int
+    url: str
+    content_fingerprint: Optional[int]
+
+class ArticleDetailTask(TypedDict):
+    id: int
+    site: str
+    url: str
+    title: Optional[str]
+    publish_time: Optional[datetime]
+    # including the current one
+    attempts: int
+
+def pg_client_class(backend: DbBackend) -> type[PgClient]:
+    if backend == DbBackend.PSYCOPG:
+        # psycopg is an optional dependency, only import it when selected
+        from crawler.dao.PsycopgPgClient import PsycopgPgClient
+        return PsycopgPgClient
+    return AsyncpgPgClient
+
+class TradebotDatabaseManagerAsync(pg_client_class(TRADEBOT_DB_BACKEND)):
+    def __init__(self, max_size: int = TRADEBOT_DB_POOL_MAX_SIZE):
         super().__init__(
             user=TRADEBOT_DB_USER,
             password=TRADEBOT_DB_PASSWORD,
             host=TRADEBOT_DB_HOST,
             port=TRADEBOT_DB_PORT,
-            db_name=TRADEBOT_DB_NAME
+            db_name=TRADEBOT_DB_NAME,
+            max_size=max_size
         )
+        self.__article_codec: Optional[ArticleContentCodec] = None
+        self.__article_dicts_loaded = False
+        # whether t_article.content_zstd exists, None until checked
+        self.__article_content_zstd: Optional[bool] = None
+
+    async def open(self):
+        await super().open()
+        try:
+            await self.__has_article_content_zstd()
+        except Exception as e:
+            log.warning(f"checking for t_article.content_zstd failed, checking again on the first read: {e}")
 
-    async def insert_many_flash_news(self, flash_news_list: List[FlashNewsPo]):
+    async def __has_article_content_zstd(self) -> bool:
+        """
+        Whether t_article.content_zstd exists (static/sql/article_content_zstd.sql), compressed contents are read
+        whatever ARTICLE_CONTENT_COMPRESSION new articles are written with
+        """
+        if self.__article_content_zstd is None:
+            query = """
+                SELECT EXISTS (
+                    SELECT 1 FROM pg_attribute
+                    WHERE attrelid = to_regclass('t_article') AND attname = 'content_zstd' AND NOT attisdropped
+                ) AS found
+            """
+            self.__article_content_zstd = (await self.fetch(query, lambda record: record['found']))[0]
+        return self.__article_content_zstd
+
+    async def insert_many_flash_news(self, flash_news_list: List[FlashNewsPo] | RecordBatch) -> int:
         """
         Insert multiple FlashNewsPo objects into the database
         
         Args:
-            flash_news_list: List of FlashNewsPo objects to insert
+            flash_news_list: List of FlashNewsPo objects to insert, or their flash_news_batch
             
         Returns:
-            True if all records were inserted successfully, False otherwise
+            Number of rows inserted, rows that already exist are skipped
+        """
+        if not len(flash_news_list):
+            return 0
+        batch = flash_news_list if isinstance(flash_news_list, RecordBatch) else flash_news_batch(flash_news_list)
+        columns = FLASH_NEWS_CLUSTER_COLUMNS if FLASH_NEWS_DEDUP_ENABLED else FLASH_NEWS_COLUMNS
+        return await self.__insert_batch('t_flash_news', batch.select(columns))
+
+    async def get_flash_news(self, after: datetime, created_after: Optional[datetime] = None) -> List[FlashNewsPo]:
+        """
+        Flash news of all sites published after the given time, oldest first, with their near duplicate clusters
+
+        Args:
+            created_after: only news crawled after this time, e.g. the ones other crawler replicas stored since
         """
-        if not flash_news_list:
-            return True
-            
         query = f"""
-            INSERT INTO t_flash_news (
-                source, 
-                site,
-                title, 
-                title_md5, 
-                description, 
-                url, 
-                create_time, 
-                publish_time
-            )
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-            ON CONFLICT (site, title_md5, publish_time) DO NOTHING
+            SELECT id, source, site, title, title_md5, description, url, create_time, publish_time, cluster_md5
+            FROM t_flash_news
+            WHERE publish_time > $1 {'AND create_time > $2' if created_after is not None else ''}
+            ORDER BY publish_time
         """
-        flash_news_values = [
-            (news.source.value, news.site.value, news.title, news.title_md5, news.description, 
-                news.url, news.create_time, news.publish_time)
-            for news in flash_news_list
-        ]
-        await self.executemany(query, flash_news_values)
+        return await self.fetch(query, lambda record: FlashNewsPo(
+            id=record['id'],
+            source=FlashNewsSource(record['source']),
+            site=FlashNewsSite(record['site']),
+            title=record['title'],
+            title_md5=record['title_md5'],
+            description=record['description'],
+            url=record['url'],
+            create_time=record['create_time'],
+            publish_time=record['publish_time'],
+            cluster_md5=record['cluster_md5'],
+        ), after, *([created_after] if created_after is not None else []))
 
-    async def insert_many_articles(self, articles_list: List[ArticlePo]):
+    async def insert_many_articles(self, articles_list: List[ArticlePo] | RecordBatch) -> int:
         """
-        Insert multiple ArticlePo objects into the database
+        Insert multiple ArticlePo objects into the database, with ARTICLE_CONTENT_COMPRESSION=zstd the contents
+        are stored compressed in content_zstd
         
         Args:
-            articles_list: List of ArticlePo objects to insert
+            articles_list: List of ArticlePo objects to insert, or their article_batch
             
         Returns:
-            True if all records were inserted successfully, False otherwise
+            Number of rows inserted, rows that already exist are skipped
+        """
+        if not len(articles_list):
+            return 0
+        batch = articles_list if isinstance(articles_list, RecordBatch) else article_batch(articles_list)
+        columns = ARTICLE_COLUMNS
+        if ARTICLE_CONTENT_COMPRESSION == 'zstd':
+            codec = await self.__get_article_codec()
+            sites, contents = batch.column('site'), batch.column('content')
+            blobs = await asyncio.to_thread(lambda: [codec.encode(site, content) for site, content in zip(sites, contents)])
+            batch = batch.with_column('content', [None] * len(blobs)).with_column('content_zstd', blobs)
+            columns = ARTICLE_ZSTD_COLUMNS
+        if ARTICLE_REVISIT_ENABLED:
+            columns += ('content_fingerprint',)
+        return await self.__insert_batch('t_article', batch.select(columns))
+
+    async def __insert_batch(self, table: str, batch: RecordBatch) -> int:
+        """
+        Insert the rows skipping the ones that already exist, by COPY from TRADEBOT_DB_COPY_THRESHOLD rows on
+
+        Returns:
+            Number of rows inserted
+        """
+        on_conflict = 'ON CONFLICT (site, title_md5, publish_time) DO NOTHING'
+        if 0 < TRADEBOT_DB_COPY_THRESHOLD <= len(batch):
+            return await self.copy_records(table, batch.columns, batch.rows(), on_conflict=on_conflict)
+        query = f"""
+            INSERT INTO {table} ({', '.join(batch.columns)})
+            VALUES ({', '.join(f'${i}' for i in range(1, len(batch.columns) + 1))})
+            {on_conflict}
+            RETURNING 1 AS inserted
         """
-        if not articles_list:
-            return True
+        return len(await self.fetchmany(query, lambda record: record['inserted'], batch.rows()))
+
+    async def get_articles(self, site: ArticleSite, after: datetime, limit: int = 100) -> List[ArticlePo]:
+        """
+        Articles of the site published after the given time, newest first, compressed contents are decompressed
+        """
+        content_zstd = 'content_zstd' if await self.__has_article_content_zstd() else 'NULL::bytea AS content_zstd'
+        query = f"""
+            SELECT id, source, site, title, title_md5, content, {content_zstd}, url, create_time, publish_time
+            FROM t_article
+            WHERE site = $1 AND publish_time > $2
+            ORDER BY publish_time DESC
+            LIMIT $3
+        """
+        rows = await self.fetch(query, lambda record: dict(record), site.value, after, limit)
+        blobs = [bytes(row['content_zstd']) for row in rows if row['content_zstd'] is not None]
+        contents = iter([])
+        if blobs:
+            codec = await self.__get_article_codec()
+            dict_ids = {codec.dict_id_of(blob) for blob in blobs} - {0}
+            if not all(codec.has_dict(dict_id) for dict_id in dict_ids):
+                # trained by another process since the last load
+                await self.load_article_dicts()
+            contents = iter(await asyncio.to_thread(lambda: [codec.decode(blob) for blob in blobs]))
+        return [
+            ArticlePo(
+                id=row['id'],
+                source=ArticleSource(row['source']),
+                site=ArticleSite(row['site']),
+                title=row['title'],
+                title_md5=row['title_md5'],
+                content=next(contents) if row['content_zstd'] is not None else row['content'],
+                url=row['url'],
+                create_time=row['create_time'],
+                publish_time=row['publish_time'],
+            )
+            for row in rows
+        ]
+
+    async def get_articles_to_revisit(self, site: ArticleSite,
+                                      publish_time_ranges: List[tuple[datetime, datetime]]) -> List[StoredArticleFingerprint]:
+        """
+        Articles of the site published within any of the (after, until] ranges, without their contents
+        """
+        if not publish_time_ranges:
+            return []
         query = """
-            INSERT INTO t_article (
-                source, 
-                site,
-                title, 
-                title_md5, 
-                content, 
-                url, 
-                create_time, 
-                publish_time
+            SELECT id, url, content_fingerprint
+            FROM t_article a
+            WHERE site = $1
+            AND EXISTS (
+                SELECT 1 FROM unnest($2::timestamptz[], $3::timestamptz[]) AS r(after_time, until_time)
+                WHERE a.publish_time > r.after_time AND a.publish_time <= r.until_time
             )
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-            ON CONFLICT (site, title_md5, publish_time) DO NOTHING
         """
-        article_values = [
-            (article.source.value, article.site.value, article.title, article.title_md5, article.content, 
-                article.url, article.create_time, article.publish_time)
-            for article in articles_list
-        ]
-        await self.executemany(query, article_values)
+        return await self.fetch(query, lambda record: StoredArticleFingerprint(
+            id=record['id'], url=record['url'], content_fingerprint=record['content_fingerprint']),
+            site.value, [after for after, _ in publish_time_ranges], [until for _, until in publish_time_ranges])
+
+    async def update_article_contents(self, site: ArticleSite, contents: dict[int, str]) -> int:
+        """
+        Replace the contents of stored articles of the site, by id, unless their content_fingerprint is unchanged
+
+        Returns:
+            Number of rows updated
+        """
+        if not contents:
+            return 0
+        ids = list(contents)
+        texts = [contents[article_id] for article_id in ids]
+        if ARTICLE_CONTENT_COMPRESSION == 'zstd':
+            codec = await self.__get_article_codec()
+            values = await asyncio.to_thread(lambda: [codec.encode(site.value, text) for text in texts])
+            content_column = 'content = NULL, content_zstd'
+        else:
+            values = texts
+            content_column = 'content'
+        query = f"""
+            UPDATE t_article
+            SET {content_column} = $2, content_fingerprint = $3, update_time = $4
+            WHERE id = $1 AND content_fingerprint IS DISTINCT FROM $3
+            RETURNING 1 AS updated
+        """
+        now = datetime.now(timezone.utc)
+        params_list = [(article_id, value, fingerprint(text), now) for article_id, value, text in zip(ids, values, texts)]
+        return len(await self.fetchmany(query, lambda record: record['updated'], params_list))
+
+    async def heartbeat_crawler_replica(self, replica_id: str, ttl_seconds: float) -> List[str]:
+        """
+        Record the replica as alive, by the database clock so that replicas need not agree on the time
+
+        Returns:
+            ids of the replicas with a heartbeat within ttl_seconds, this one included
+        """
+        await self.execute("""
+            INSERT INTO t_crawler_replica (replica_id, heartbeat_time) VALUES ($1, now())
+            ON CONFLICT (replica_id) DO UPDATE SET heartbeat_time = now()
+        """, replica_id)
+        # replicas that stopped without removing themselves, e.g. killed containers with generated host names
+        await self.execute("DELETE FROM t_crawler_replica WHERE heartbeat_time < now() - interval '1 day'")
+        query = """
+            SELECT replica_id FROM t_crawler_replica
+            WHERE heartbeat_time > now() - make_interval(secs => $1)
+            ORDER BY replica_id
+        """
+        return await self.fetch(query, lambda record: record['replica_id'], ttl_seconds)
+
+    async def remove_crawler_replica(self, replica_id: str):
+        """
+        Remove a stopping replica and release its leases, so that the others take its sites over right away
+        """
+        await self.execute("DELETE FROM t_crawl_lease WHERE owner = $1", replica_id)
+        await self.execute("DELETE FROM t_crawler_replica WHERE replica_id = $1", replica_id)
+
+    async def acquire_crawl_leases(self, owner: str, keys: List[tuple[str, str]], ttl_seconds: float) -> List[tuple[str, str]]:
+        """
+        Take or renew the leases of (kind, site) keys for ttl_seconds, a lease of another owner is only taken
+        once it has expired
+
+        Returns:
+            keys leased to the owner
+        """
+        if not keys:
+            return []
+        query = """
+            INSERT INTO t_crawl_lease (kind, site, owner, expire_time)
+            SELECT k.kind, k.site, $1, now() + make_interval(secs => $4)
+            FROM unnest($2::varchar[], $3::varchar[]) AS k(kind, site)
+            ON CONFLICT (kind, site) DO UPDATE SET owner = EXCLUDED.owner, expire_time = EXCLUDED.expire_time
+            WHERE t_crawl_lease.owner = EXCLUDED.owner OR t_crawl_lease.expire_time < now()
+            RETURNING kind, site
+        """
+        return await self.fetch(query, lambda record: (record['kind'], record['site']),
+                                owner, [kind for kind, _ in keys], [site for _, site in keys], ttl_seconds)
+
+    async def release_crawl_leases(self, owner: str, keys: List[tuple[str, str]]):
+        if not keys:
+            return
+        query = """
+            DELETE FROM t_crawl_lease l
+            USING unnest($2::varchar[], $3::varchar[]) AS k(kind, site)
+            WHERE l.owner = $1 AND l.kind = k.kind AND l.site = k.site
+        """
+        await self.execute(query, owner, [kind for kind, _ in keys], [site for _, site in keys])
+
+    async def enqueue_article_detail_tasks(self, site: ArticleSite,
+                                           listings: List[tuple[str, Optional[str], Optional[datetime]]]) -> int:
+        """
+        Queue the detail pages of listed articles, urls queued before (done or not) are skipped
+
+        Args:
+            listings: (url, title, publish_time) from the listing, title and publish_time None when not listed
+
+        Returns:
+            Number of tasks queued
+        """
+        if not listings:
+            return 0
+        query = """
+            INSERT INTO t_article_detail_task (site, url, title, publish_time)
+            SELECT $1, l.url, l.title, l.publish_time
+            FROM unnest($2::text[], $3::text[], $4::timestamptz[]) AS l(url, title, publish_time)
+            ON CONFLICT (site, url) DO NOTHING
+            RETURNING 1 AS queued
+        """
+        return len(await self.fetch(query, lambda record: record['queued'], site.value,
+                                    [url for url, _, _ in listings], [title for _, title, _ in listings],
+                                    [publish_time for _, _, publish_time in listings]))
+
+    async def claim_article_detail_tasks(self, sites: List[ArticleSite], limit: int, lease_seconds: float) -> List[ArticleDetailTask]:
+        """
+        Claim up to limit available tasks of the sites, oldest first. A claimed task is hidden from other workers
+        for lease_seconds, when its worker dies before completing or retrying it the task is claimed again after that.
+        Tasks claimed concurrently by other workers are skipped instead of waited for.
+        """
+        query = """
+            UPDATE t_article_detail_task t
+            SET attempts = t.attempts + 1, available_time = now() + make_interval(secs => $3)
+            FROM (
+                SELECT id FROM t_article_detail_task
+                WHERE site = ANY($1::varchar[]) AND available_time <= now()
+                ORDER BY available_time
+                LIMIT $2
+                FOR UPDATE SKIP LOCKED
+            ) claimed
+            WHERE t.id = claimed.id
+            RETURNING t.id, t.site, t.url, t.title, t.publish_time, t.attempts
+        """
+        return await self.fetch(query, lambda record: ArticleDetailTask(
+            id=record['id'], site=record['site'], url=record['url'], title=record['title'],
+            publish_time=record['publish_time'], attempts=record['attempts']),
+            [site.value for site in sites], limit, lease_seconds)
+
+    async def complete_article_detail_tasks(self, task_ids: List[int]):
+        if not task_ids:
+            return
+        await self.execute("""
+            UPDATE t_article_detail_task SET available_time = NULL, done_time = now(), last_error = NULL
+            WHERE id = ANY($1::bigint[])
+        """, task_ids)
+
+    async def retry_article_detail_tasks(self, failures: List[tuple[int, str, Optional[float]]]):
+        """
+        Args:
+            failures: (task id, error, seconds until the task can be claimed again or None to give it up)
+        """
+        if not failures:
+            return
+        await self.executemany("""
+            UPDATE t_article_detail_task
+            SET last_error = $2, available_time = CASE WHEN $3::float8 IS NULL THEN NULL ELSE now() + make_interval(secs => $3::float8) END
+            WHERE id = $1
+        """, failures)
+
+    async def delete_article_detail_tasks(self, finished_before: datetime) -> int:
+        """
+        Delete tasks that are done or given up and were queued before the given time, their urls can be queued again
+
+        Returns:
+            Number of tasks deleted
+        """
+        query = """
+            DELETE FROM t_article_detail_task
+            WHERE available_time IS NULL AND create_time < $1
+            RETURNING 1 AS deleted
+        """
+        return len(await self.fetch(query, lambda record: record['deleted'], finished_before))
+
+    async def __get_article_codec(self) -> ArticleContentCodec:
+        if self.__article_codec is None:
+            self.__article_codec = ArticleContentCodec(ARTICLE_CONTENT_ZSTD_LEVEL)
+        if not self.__article_dicts_loaded:
+            await self.load_article_dicts()
+        return self.__article_codec
+
+    async def load_article_dicts(self):
+        """
+        Load the trained zstd dictionaries, the newest of each site is used for compression
+        """
+        if self.__article_codec is None:
+            self.__article_codec = ArticleContentCodec(ARTICLE_CONTENT_ZSTD_LEVEL)
+        query = """
+            SELECT site, dict
+            FROM t_article_zstd_dict
+            ORDER BY create_time, dict_id
+        """
+        for site, dict_content in await self.fetch(query, lambda record: (record['site'], bytes(record['dict']))):
+            self.__article_codec.add_dict(site, dict_content)
+        self.__article_dicts_loaded = True
+
+    async def save_article_dict(self, site: ArticleSite, dict_content: bytes) -> int:
+        """
+        Store a dictionary trained with ArticleContentCodec.train_dict, new bodies of the site are compressed with it
+
+        Returns:
+            dictionary id
+        """
+        codec = await self.__get_article_codec()
+        dict_id = codec.add_dict(site.value, dict_content)
+        await self.execute("""
+            INSERT INTO t_article_zstd_dict (dict_id, site, dict, create_time)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (dict_id) DO NOTHING
+        """, dict_id, site.value, dict_content, datetime.now(timezone.utc))
+        return dict_id
 
     async def get_article_last_publish_time(self, site: ArticleSite) -> Optional[datetime]:
         query = f"""
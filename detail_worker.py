@@ -0,0 +1,145 @@
+"""
+Fetch the article detail pages queued in t_article_detail_task by the listing stage of the crawler
+(ARTICLE_DETAIL_QUEUE_ENABLED=true) and store the articles.
+
+Usage:
+    python -m crawler.detail_worker --workers 4
+
+Any number of worker processes, on any number of machines, can share the queue: tasks are claimed with
+FOR UPDATE SKIP LOCKED so that no two workers fetch the same page. A claimed task stays in the queue until its article
+is stored, a worker that dies leaves its tasks to be claimed again after ARTICLE_DETAIL_LEASE_SECONDS; an article
+stored twice that way is skipped by the insert.
+"""
+import argparse
+import asyncio
+from typing import Optional
+
+from .config import ACTIVATED_ARTICLE_SITES, ARTICLE_DETAIL_CLAIM_SIZE, ARTICLE_DETAIL_LEASE_SECONDS, \
+    ARTICLE_DETAIL_MAX_ATTEMPTS, ARTICLE_DETAIL_RETRY_BASE_SECONDS, ARTICLE_DETAIL_POLL_SECONDS
+from .const import ArticleSite
+from .dao import TradebotDatabaseManagerAsync
+from .dao.TradebotDatabaseManagerAsync import ArticleDetailTask
+from .diagnostics import registry, stage
+from .po import ArticlePo
+from .source import ArticleFetcherFacade
+from .source.article_fetcher import ArticleListing
+from .run import start_wait_stop_runner
+import logging
+logger = logging.getLogger(__name__)
+
+DETAIL_TASKS = registry.counter('crawler_article_detail_tasks_total', 'Article detail tasks processed, by outcome', ['site', 'result'])
+
+def retry_delay(attempts: int, base: float) -> float:
+    """
+    Seconds until a task that failed its attempts-th attempt is retried, doubled on every attempt
+    """
+    return base * 2 ** (attempts - 1)
+
+class ArticleDetailWorker:
+    """
+    Claims queued article detail tasks and stores their articles, in worker coroutines sharing the database manager
+    """
+    def __init__(self, tdbm: TradebotDatabaseManagerAsync, fetcher: ArticleFetcherFacade, sites: list[ArticleSite],
+                 workers: int, claim_size: int = ARTICLE_DETAIL_CLAIM_SIZE):
+        self.__tdbm = tdbm
+        self.__fetcher = fetcher
+        self.__sites = sites
+        self.__workers = workers
+        self.__claim_size = claim_size
+
+    async def process(self) -> int:
+        """
+        Claim a batch of tasks and fetch them
+
+        Returns:
+            number of tasks claimed
+        """
+        tasks = await self.__tdbm.claim_article_detail_tasks(self.__sites, self.__claim_size, ARTICLE_DETAIL_LEASE_SECONDS)
+        tasks_by_site: dict[str, list[ArticleDetailTask]] = {}
+        for task in tasks:
+            tasks_by_site.setdefault(task['site'], []).append(task)
+        for site, site_tasks in tasks_by_site.items():
+            with stage('details', site=f"article/{site}", rows=len(site_tasks)):
+                await self.__process_site(ArticleSite(site), site_tasks)
+        return len(tasks)
+
+    async def __process_site(self, site: ArticleSite, tasks: list[ArticleDetailTask]):
+        listings: list[ArticleListing] = [{'url': task['url'], 'title': task['title'], 'publish_time': task['publish_time']} for task in tasks]
+        results = await self.__fetcher.fetch_details(site, listings)
+        articles: list[ArticlePo] = []
+        done: list[int] = []
+        failures: list[tuple[int, str, Optional[float]]] = []
+        for task, result in zip(tasks, results):
+            if isinstance(result, Exception):
+                error = f"{type(result).__name__}: {result}"
+                give_up = task['attempts'] >= ARTICLE_DETAIL_MAX_ATTEMPTS
+                failures.append((task['id'], error, None if give_up else retry_delay(task['attempts'], ARTICLE_DETAIL_RETRY_BASE_SECONDS)))
+                DETAIL_TASKS.inc(site=site.value, result='given_up' if give_up else 'retried')
+                logger.warning(f"article detail {task['url']} attempt {task['attempts']} failed{', giving up' if give_up else ''}: {error}")
+                continue
+            done.append(task['id'])
+            if result is None:
+                DETAIL_TASKS.inc(site=site.value, result='empty')
+            else:
+                articles.append(result)
+        # stored before the tasks complete, a crash in between fetches the pages again and the insert skips them
+        inserted = await self.__tdbm.insert_many_articles(articles)
+        DETAIL_TASKS.inc(len(articles), site=site.value, result='stored')
+        await self.__tdbm.complete_article_detail_tasks(done)
+        await self.__tdbm.retry_article_detail_tasks(failures)
+        logger.info(f"article details on site: {site}, claimed: {len(tasks)}, fetched: {len(articles)}, inserted: {inserted}, failed: {len(failures)}")
+
+    async def __work(self, stop: asyncio.Event):
+        while not stop.is_set():
+            try:
+                claimed = await self.process()
+            except Exception as e:
+                # claimed tasks are claimed again once their lease expires
+                logger.error(f"article detail worker ERROR: {e}", exc_info=True)
+                claimed = 0
+            if claimed < self.__claim_size:
+                # the queue is drained, wait for the next listing
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=ARTICLE_DETAIL_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def run(self, stop: asyncio.Event):
+        """
+        Work until stop is set, the batches in progress are finished
+        """
+        logger.info(f"article detail workers: {self.__workers}, sites: {[site.value for site in self.__sites]}")
+        await asyncio.gather(*[self.__work(stop) for _ in range(self.__workers)])
+
+class DetailWorkerProcess:
+    def __init__(self, workers: int, sites: list[ArticleSite]):
+        self.__tdbm = TradebotDatabaseManagerAsync(max_size=workers)
+        self.__worker = ArticleDetailWorker(self.__tdbm, ArticleFetcherFacade(), sites, workers)
+        self.__stop = asyncio.Event()
+        self.__loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def main(self):
+        self.__loop = asyncio.get_running_loop()
+        await self.__tdbm.open()
+        try:
+            await self.__worker.run(self.__stop)
+        finally:
+            await self.__tdbm.close()
+
+    def start(self):
+        asyncio.run(self.main())
+
+    def stop(self):
+        if self.__loop is None or self.__loop.is_closed():
+            self.__stop.set()
+        else:
+            # called from a signal handler
+            self.__loop.call_soon_threadsafe(self.__stop.set)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch queued article detail pages")
+    parser.add_argument('--workers', type=int, default=4, help="task batches fetched at a time")
+    parser.add_argument('--site', type=ArticleSite, action='append', help="only this site, can be repeated, default the activated sites")
+    args = parser.parse_args()
+    process = DetailWorkerProcess(args.workers, args.site or ACTIVATED_ARTICLE_SITES)
+    start_wait_stop_runner(process.start, process.stop, "article detail worker")
@@ -0,0 +1,93 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from .Metrics import registry
+from .Stage import current_stage
+
+import logging
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_SECONDS = registry.histogram(
+    'crawler_event_loop_lag_seconds', 'Delay of the event loop heartbeat beyond its interval',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+LOOP_STALLS = registry.counter('crawler_event_loop_stalls_total', 'Event loop blocked longer than the lag threshold', ['site', 'stage'])
+
+class LoopLagMonitor:
+    """
+    Measures event loop scheduling delay and finds what blocks the loop.
+
+    A heartbeat task sleeps interval seconds in a loop and records how late it wakes up. A watchdog thread checks
+    the last heartbeat, and when the loop has been blocked for more than threshold seconds it captures the stack
+    of the loop thread and the site / stage of the running task (see diagnostics.stage) while the loop is still
+    blocked. Each stall is reported once.
+    """
+    def __init__(self, interval: float, threshold: float):
+        self.__interval = interval
+        self.__threshold = threshold
+        self.__loop: Optional[asyncio.AbstractEventLoop] = None
+        self.__loop_thread_id: Optional[int] = None
+        self.__last_beat = time.monotonic()
+        self.__heartbeat_task: Optional[asyncio.Task] = None
+        self.__watchdog: Optional[threading.Thread] = None
+        self.__stopped = threading.Event()
+
+    def start(self):
+        """
+        Start monitoring the running loop, must be called from the loop thread
+        """
+        self.__loop = asyncio.get_running_loop()
+        self.__loop_thread_id = threading.get_ident()
+        self.__last_beat = time.monotonic()
+        self.__stopped.clear()
+        self.__heartbeat_task = self.__loop.create_task(self.__heartbeat(), name='loop-lag-heartbeat')
+        self.__watchdog = threading.Thread(target=self.__watch, name='loop-lag-watchdog', daemon=True)
+        self.__watchdog.start()
+
+    async def stop(self):
+        self.__stopped.set()
+        if self.__heartbeat_task is not None:
+            self.__heartbeat_task.cancel()
+            try:
+                await self.__heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self.__heartbeat_task = None
+        if self.__watchdog is not None:
+            await asyncio.to_thread(self.__watchdog.join)
+            self.__watchdog = None
+
+    async def __heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.__interval
+            await asyncio.sleep(self.__interval)
+            now = time.monotonic()
+            LOOP_LAG_SECONDS.observe(max(0.0, now - expected))
+            self.__last_beat = now
+
+    def __watch(self):
+        reported_beat: Optional[float] = None
+        poll_interval = min(self.__interval, self.__threshold) / 2
+        while not self.__stopped.wait(poll_interval):
+            last_beat = self.__last_beat
+            blocked = time.monotonic() - last_beat - self.__interval
+            if blocked >= self.__threshold and reported_beat != last_beat:
+                reported_beat = last_beat
+                self.__report(blocked)
+
+    def __report(self, blocked: float):
+        frame = sys._current_frames().get(self.__loop_thread_id) # type: ignore
+        stack = ''.join(traceback.format_stack(frame)) if frame is not None else ''
+        task = asyncio.tasks._current_tasks.get(self.__loop) # type: ignore
+        stage = current_stage(task.get_context()) if task is not None else None
+        site = stage.site if stage is not None else ''
+        stage_name = stage.name if stage is not None else ''
+        LOOP_STALLS.inc(site=site, stage=stage_name)
+        logger.warning(
+            f"event loop blocked for {blocked:.3f}s+, task: {task.get_name() if task is not None else None}, "
+            f"site: {site}, stage: {stage_name}, loop thread stack:\n{stack}"
+        )
@@ -0,0 +1,202 @@
+import asyncio
+import gc
+import os
+import resource
+import tracemalloc
+import weakref
+from collections import Counter
+from enum import Enum
+from typing import Optional
+
+from .Metrics import registry
+from ..config import MEMORY_SNAPSHOT_INTERVAL_SECONDS, MEMORY_TRACEMALLOC_FRAMES, MEMORY_REPORT_TOP
+
+import logging
+logger = logging.getLogger(__name__)
+
+PROCESS_RSS_BYTES = registry.gauge('crawler_process_rss_bytes', 'Resident set size of the process')
+LIVE_OBJECTS = registry.gauge('crawler_live_objects', 'Live objects of the tracked types, as of the last memory report', ['type', 'site'])
+TRACED_BYTES = registry.gauge('crawler_tracemalloc_traced_bytes', 'Memory traced by tracemalloc, 0 when not tracing')
+
+# crawled records and parsed pages, the objects a leaking fetcher would pile up
+TRACKED_TYPES = ('FlashNewsPo', 'ArticlePo', 'BeautifulSoup')
+
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+def rss_bytes() -> int:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+def peak_rss_bytes() -> int:
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class MemoryTracker:
+    """
+    Memory growth tracking of the long running process.
+
+    - report: RSS and live object counts of TRACKED_TYPES by site. Records carry their site, other objects
+      (BeautifulSoup trees) are tagged with it when created.
+    - snapshot: tracemalloc snapshot diffed against the previous or the first snapshot, top growing allocation
+      sites. Tracing starts with the first snapshot and slows allocations down until stop_tracing.
+    With interval > 0, start() traces from startup and logs the growth every interval seconds.
+    """
+    def __init__(self, interval: float, frames: int, top: int):
+        self.__interval = interval
+        self.__frames = frames
+        self.__top = top
+        self.__tags: dict[int, str] = {}
+        self.__reported_objects: set[tuple[str, str]] = set()
+        self.__baseline: Optional[tracemalloc.Snapshot] = None
+        self.__previous: Optional[tracemalloc.Snapshot] = None
+        self.__lock = asyncio.Lock()
+        self.__task: Optional[asyncio.Task] = None
+
+    def tag(self, obj: object, site: str):
+        """
+        Attribute a live object to a site in reports, until it is garbage collected
+        """
+        key = id(obj)
+        self.__tags[key] = site
+        weakref.finalize(obj, self.__tags.pop, key, None)
+
+    def __site_of(self, obj: object) -> str:
+        site = self.__tags.get(id(obj))
+        if site is not None:
+            return site
+        # instance dict or slot only, BeautifulSoup would treat a missing attribute as a tag lookup
+        if 'site' in getattr(type(obj), '__slots__', ()):
+            site = getattr(obj, 'site', None)
+        else:
+            site = getattr(obj, '__dict__', {}).get('site')
+        if isinstance(site, Enum):
+            return site.value
+        return '' if site is None else str(site)
+
+    def __count_objects(self) -> Counter[tuple[str, str]]:
+        counts: Counter[tuple[str, str]] = Counter()
+        for obj in gc.get_objects():
+            type_name = type(obj).__name__
+            if type_name in TRACKED_TYPES:
+                counts[(type_name, self.__site_of(obj))] += 1
+        return counts
+
+    def __report(self, collect: bool) -> dict:
+        if collect:
+            gc.collect()
+        counts = self.__count_objects()
+        for type_name, site in self.__reported_objects - counts.keys():
+            LIVE_OBJECTS.set(0, type=type_name, site=site)
+        for (type_name, site), count in counts.items():
+            LIVE_OBJECTS.set(count, type=type_name, site=site)
+        self.__reported_objects = set(counts)
+        rss = rss_bytes()
+        PROCESS_RSS_BYTES.set(rss)
+        traced, traced_peak = tracemalloc.get_traced_memory()
+        TRACED_BYTES.set(traced)
+        return {
+            'rssBytes': rss,
+            'peakRssBytes': peak_rss_bytes(),
+            'objects': [
+                {'type': type_name, 'site': site, 'count': count}
+                for (type_name, site), count in sorted(counts.items())
+            ],
+            'tracing': tracemalloc.is_tracing(),
+            'tracedBytes': traced,
+            'peakTracedBytes': traced_peak,
+        }
+
+    async def report(self, collect: bool = False) -> dict:
+        """
+        RSS and live object counts, collect runs a full garbage collection first so that only reachable
+        objects are counted (BeautifulSoup trees are reference cycles that linger until the next collection)
+        """
+        return await asyncio.to_thread(self.__report, collect)
+
+    def __snapshot(self, against: str, top: int) -> dict:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.__frames)
+        snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        reference = self.__baseline if against == 'baseline' else self.__previous
+        if self.__baseline is None:
+            self.__baseline = snapshot
+        self.__previous = snapshot
+        if reference is None:
+            return {'against': against, 'growth': []}
+        growth = [stat for stat in snapshot.compare_to(reference, 'lineno') if stat.size_diff > 0][:top]
+        return {
+            'against': against,
+            'growth': [
+                {
+                    'site': str(stat.traceback),
+                    'sizeDiffBytes': stat.size_diff,
+                    'sizeBytes': stat.size,
+                    'countDiff': stat.count_diff,
+                    'count': stat.count,
+                }
+                for stat in growth
+            ],
+        }
+
+    async def snapshot(self, against: str = 'previous', top: Optional[int] = None) -> dict:
+        """
+        Take a tracemalloc snapshot and return the top allocation sites grown since the previous snapshot,
+        or since the first one with against 'baseline'. Starts tracing on first use, the first snapshot has no growth.
+        """
+        if against not in ('previous', 'baseline'):
+            raise ValueError(f"Unknown snapshot reference: {against}")
+        async with self.__lock:
+            return await asyncio.to_thread(self.__snapshot, against, top or self.__top)
+
+    async def stop_tracing(self):
+        async with self.__lock:
+            tracemalloc.stop()
+            self.__baseline = None
+            self.__previous = None
+        TRACED_BYTES.set(0)
+
+    def start(self):
+        """
+        Start tracing and periodic growth logging when interval > 0, must be called from the loop thread
+        """
+        if self.__interval <= 0:
+            return
+        tracemalloc.start(self.__frames)
+        self.__task = asyncio.get_running_loop().create_task(self.__run(), name='memory-tracker')
+
+    async def stop(self):
+        if self.__task is not None:
+            self.__task.cancel()
+            try:
+                await self.__task
+            except asyncio.CancelledError:
+                pass
+            self.__task = None
+
+    async def __run(self):
+        await self.snapshot()
+        while True:
+            await asyncio.sleep(self.__interval)
+            try:
+                report = await self.report()
+                growth = (await self.snapshot())['growth']
+                lines = '\n'.join(
+                    f"  {item['site']}: +{item['sizeDiffBytes'] / 1024:.1f} KiB ({item['countDiff']:+d} blocks), "
+                    f"{item['sizeBytes'] / 1024:.1f} KiB total"
+                    for item in growth
+                )
+                objects = ', '.join(f"{item['type']}[{item['site']}]={item['count']}" for item in report['objects'])
+                logger.info(
+                    f"memory rss: {report['rssBytes'] / 2**20:.1f} MiB, traced: {report['tracedBytes'] / 2**20:.1f} MiB, "
+                    f"objects: {objects}, top growth since last snapshot:\n{lines}"
+                )
+            except Exception as e:
+                logger.error(f"memory snapshot failed: {e}", exc_info=True)
+
+memory_tracker = MemoryTracker(MEMORY_SNAPSHOT_INTERVAL_SECONDS, MEMORY_TRACEMALLOC_FRAMES, MEMORY_REPORT_TOP)
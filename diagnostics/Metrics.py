@@ -0,0 +1,138 @@
+from bisect import bisect_left
+from typing import Iterable, Optional
+
+type LabelValues = tuple[str, ...]
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+class Metric:
+    """
+    Base class of metrics, exported in prometheus text format.
+
+    Updates are plain dict/number operations without locks: metrics are updated from the event loop thread,
+    and the few updates from other threads are single dict item assignments that are atomic under the GIL.
+    """
+    type_name = 'untyped'
+
+    def __init__(self, name: str, help_text: str, label_names: Iterable[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+
+    def _key(self, labels: dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def _label_str(self, key: LabelValues, extra: Optional[tuple[str, str]] = None) -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, key)]
+        if extra is not None:
+            pairs.append(f'{extra[0]}="{extra[1]}"')
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+class Counter(Metric):
+    type_name = 'counter'
+
+    def __init__(self, name: str, help_text: str, label_names: Iterable[str] = ()):
+        super().__init__(name, help_text, label_names)
+        self.__values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        self.__values[key] = self.__values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self.__values.get(self._key(labels), 0)
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{self._label_str(key)} {value}" for key, value in list(self.__values.items())]
+
+class Gauge(Metric):
+    type_name = 'gauge'
+
+    def __init__(self, name: str, help_text: str, label_names: Iterable[str] = ()):
+        super().__init__(name, help_text, label_names)
+        self.__values: dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str):
+        self.__values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        self.__values[key] = self.__values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels: str) -> float:
+        return self.__values.get(self._key(labels), 0)
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{self._label_str(key)} {value}" for key, value in list(self.__values.items())]
+
+class Histogram(Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, help_text: str, label_names: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket..., count of +Inf bucket], sum
+        self.__counts: dict[LabelValues, list[int]] = {}
+        self.__sums: dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        counts = self.__counts.get(key)
+        if counts is None:
+            counts = self.__counts[key] = [0] * (len(self.buckets) + 1)
+        counts[bisect_left(self.buckets, value)] += 1
+        self.__sums[key] = self.__sums.get(key, 0.0) + value
+
+    def samples(self) -> list[str]:
+        lines = []
+        for key, counts in list(self.__counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._label_str(key, ('le', str(bound)))} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{self.name}_bucket{self._label_str(key, ('le', '+Inf'))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_str(key)} {self.__sums.get(key, 0.0)}")
+            lines.append(f"{self.name}_count{self._label_str(key)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self.__metrics: dict[str, Metric] = {}
+
+    def __register[M: Metric](self, metric: M) -> M:
+        existing = self.__metrics.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric):
+                raise ValueError(f"Metric {metric.name} already registered as {existing.type_name}")
+            return existing # type: ignore
+        self.__metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, label_names: Iterable[str] = ()) -> Counter:
+        return self.__register(Counter(name, help_text, label_names))
+
+    def gauge(self, name: str, help_text: str, label_names: Iterable[str] = ()) -> Gauge:
+        return self.__register(Gauge(name, help_text, label_names))
+
+    def histogram(self, name: str, help_text: str, label_names: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self.__register(Histogram(name, help_text, label_names, buckets))
+
+    def render(self) -> str:
+        return '\n'.join(metric.render() for metric in list(self.__metrics.values())) + '\n'
+
+registry = MetricsRegistry()
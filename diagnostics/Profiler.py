@@ -0,0 +1,192 @@
+import asyncio
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from types import FrameType
+from typing import Iterator, Optional
+
+from ..config import LOG_DIR, PROFILE_SAMPLE_INTERVAL_SECONDS
+
+import logging
+logger = logging.getLogger(__name__)
+
+PROFILE_KINDS = ('crawl', 'search')
+PROFILE_MODES = ('sample', 'cprofile')
+
+@dataclass
+class _Arming:
+    remaining: int
+    mode: str
+
+@dataclass(eq=False)
+class _Watch:
+    loop: asyncio.AbstractEventLoop
+    thread_id: int
+    stacks: Counter = field(default_factory=Counter)
+
+# the sampled run, inherited by the tasks it creates
+_current_watch: ContextVar[Optional[_Watch]] = ContextVar('crawler_profile_watch', default=None)
+
+def _fold(frame: Optional[FrameType]) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_qualname}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class Profiler:
+    """
+    On demand profiling of the next N crawl runs of a site or the next N search requests of a tool.
+
+    Profiles are armed at runtime (admin endpoint or signal) and written to output_dir, named by kind, target
+    and run id. Two modes:
+    - sample: a thread samples the loop thread stack every sample_interval seconds while the profiled task, or a
+      task it created, is the one running, written as collapsed stacks (flamegraph.pl / speedscope input).
+      Concurrent crawls of other sites are not attributed to the profiled one, several profiles may run at once.
+    - cprofile: deterministic cProfile of the loop thread for the duration of the run, written as pstats.
+      Everything the loop runs meanwhile is included and only one cProfile can be active at a time.
+    """
+    def __init__(self, output_dir: str, sample_interval: float = 0.005):
+        self.__output_dir = output_dir
+        self.__sample_interval = sample_interval
+        self.__armed: dict[tuple[str, str], _Arming] = {}
+        self.__lock = threading.Lock()
+        self.__watched: set[_Watch] = set()
+        self.__sampler: Optional[threading.Thread] = None
+        self.__cprofile_active = False
+
+    def arm(self, kind: str, target: str, count: int, mode: str = 'sample'):
+        """
+        Profile the next count runs of kind ('crawl' or 'search') whose target matches,
+        target is a site like 'flash_news/chaincatcher', a search tool like 'perplexity', or '*' for any
+        """
+        if kind not in PROFILE_KINDS:
+            raise ValueError(f"Unknown profile kind: {kind}")
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        if count <= 0:
+            raise ValueError("Profile count must be positive")
+        with self.__lock:
+            self.__armed[(kind, target)] = _Arming(remaining=count, mode=mode)
+        logger.info(f"profiling armed for next {count} {kind} runs of {target}, mode: {mode}")
+
+    def disarm(self, kind: str, target: str):
+        with self.__lock:
+            self.__armed.pop((kind, target), None)
+
+    def status(self) -> list[dict]:
+        with self.__lock:
+            return [
+                {'kind': kind, 'target': target, 'remaining': arming.remaining, 'mode': arming.mode}
+                for (kind, target), arming in self.__armed.items()
+            ]
+
+    def __take(self, kind: str, target: str) -> Optional[str]:
+        with self.__lock:
+            for key in ((kind, target), (kind, '*')):
+                arming = self.__armed.get(key)
+                if arming is None:
+                    continue
+                if arming.mode == 'cprofile':
+                    if self.__cprofile_active:
+                        return None
+                    self.__cprofile_active = True
+                arming.remaining -= 1
+                if arming.remaining <= 0:
+                    del self.__armed[key]
+                return arming.mode
+        return None
+
+    def __output_path(self, kind: str, target: str, run_id: str, extension: str) -> str:
+        os.makedirs(self.__output_dir, exist_ok=True)
+        name = re.sub(r'[^A-Za-z0-9_.-]+', '_', f"{kind}-{target}-{run_id}")
+        return os.path.join(self.__output_dir, f"{name}.{extension}")
+
+    @contextmanager
+    def profile(self, kind: str, target: str, run_id: str) -> Iterator[None]:
+        """
+        Profile the enclosed run when profiling is armed for it, otherwise a no-op.
+        Must be entered from the task doing the run.
+        """
+        mode = self.__take(kind, target) if self.__armed else None
+        if mode == 'cprofile':
+            with self.__cprofile(kind, target, run_id):
+                yield
+        elif mode == 'sample':
+            with self.__sample(kind, target, run_id):
+                yield
+        else:
+            yield
+
+    @contextmanager
+    def __cprofile(self, kind: str, target: str, run_id: str) -> Iterator[None]:
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # another profiling tool is active in this process
+            logger.warning(f"cannot profile {kind} {target} {run_id}: {e}")
+            with self.__lock:
+                self.__cprofile_active = False
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self.__lock:
+                self.__cprofile_active = False
+            path = self.__output_path(kind, target, run_id, 'pstats')
+            profile.dump_stats(path)
+            logger.info(f"wrote profile of {kind} {target} {run_id} to {path}")
+
+    @contextmanager
+    def __sample(self, kind: str, target: str, run_id: str) -> Iterator[None]:
+        watch = _Watch(loop=asyncio.get_running_loop(), thread_id=threading.get_ident())
+        token = _current_watch.set(watch)
+        with self.__lock:
+            self.__watched.add(watch)
+            if self.__sampler is None:
+                self.__sampler = threading.Thread(target=self.__sample_loop, name='profile-sampler', daemon=True)
+                self.__sampler.start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            _current_watch.reset(token)
+            with self.__lock:
+                self.__watched.discard(watch)
+            path = self.__output_path(kind, target, run_id, 'collapsed')
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in watch.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            logger.info(f"wrote {sum(watch.stacks.values())} stack samples of {kind} {target} {run_id} "
+                        f"({time.perf_counter() - start:.3f}s) to {path}")
+
+    def __sample_loop(self):
+        current_tasks = asyncio.tasks._current_tasks # type: ignore
+        while True:
+            with self.__lock:
+                if not self.__watched:
+                    self.__sampler = None
+                    return
+                loops = {watch.loop: watch.thread_id for watch in self.__watched}
+                watched = set(self.__watched)
+            frames = sys._current_frames() # type: ignore
+            for loop, thread_id in loops.items():
+                # only count samples where the running task belongs to a profiled run
+                task = current_tasks.get(loop)
+                watch = task.get_context().get(_current_watch) if task is not None else None
+                if watch in watched:
+                    watch.stacks[_fold(frames.get(thread_id))] += 1 # type: ignore
+            time.sleep(self.__sample_interval)
+
+profiler = Profiler(os.path.join(LOG_DIR, 'profiles'), sample_interval=PROFILE_SAMPLE_INTERVAL_SECONDS)
@@ -0,0 +1,41 @@
+from contextlib import contextmanager
+from contextvars import Context, ContextVar
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional
+
+from .Tracing import span
+
+@dataclass(frozen=True, slots=True)
+class Stage:
+    """
+    What the current task is working on, e.g. site 'flash_news/chaincatcher' and name 'parse'
+    """
+    site: str
+    name: str
+
+_current_stage: ContextVar[Optional[Stage]] = ContextVar('crawler_stage', default=None)
+
+@contextmanager
+def stage(name: str, site: Optional[str] = None, **attributes: Any) -> Iterator[Stage]:
+    """
+    Mark the current task as being in stage name, site defaults to the site of the enclosing stage.
+    Inside a trace the stage is also recorded as a span with the attributes.
+    """
+    if site is None:
+        outer = _current_stage.get()
+        site = outer.site if outer is not None else ''
+    current = Stage(site=site, name=name)
+    token = _current_stage.set(current)
+    try:
+        with span(name, site, **attributes):
+            yield current
+    finally:
+        _current_stage.reset(token)
+
+def current_stage(context: Optional[Context] = None) -> Optional[Stage]:
+    """
+    Stage of the calling task, or of the task owning context (e.g. task.get_context() read from another thread)
+    """
+    if context is None:
+        return _current_stage.get()
+    return context.get(_current_stage)
@@ -0,0 +1,235 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from logging.handlers import TimedRotatingFileHandler
+from typing import Any, Iterator, Optional
+
+from ..config import LOG_DIR, LOG_NAME, SPAN_EXPORTER, SPAN_OTLP_ENDPOINT
+
+logger = logging.getLogger(__name__)
+
+@dataclass(slots=True)
+class Span:
+    """
+    Timed section of a trace, e.g. the 'parse' stage of site 'flash_news/chaincatcher' in a crawl cycle
+    """
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    cycle_id: str
+    name: str
+    site: str
+    start_time: float # epoch seconds
+    attributes: dict[str, Any] = field(default_factory=dict)
+    duration: float = 0.0
+    error: Optional[str] = None
+    _start: float = field(default_factory=time.perf_counter)
+
+_current_span: ContextVar[Optional[Span]] = ContextVar('crawler_span', default=None)
+
+class SpanExporter(ABC):
+    @abstractmethod
+    def export(self, spans: list[Span]):
+        pass
+
+    def close(self):
+        pass
+
+class JsonlSpanExporter(SpanExporter):
+    """
+    One json object per span and line, rotated at midnight like the log files
+    """
+    def __init__(self, path: str):
+        self.__handler = TimedRotatingFileHandler(path, when="midnight", interval=1, backupCount=36, encoding="utf-8")
+        self.__handler.suffix = "%Y-%m-%d"
+        self.__handler.setFormatter(logging.Formatter('%(message)s'))
+
+    def export(self, spans: list[Span]):
+        for span in spans:
+            line = json.dumps({
+                'traceId': span.trace_id,
+                'spanId': span.span_id,
+                'parentId': span.parent_id,
+                'cycleId': span.cycle_id,
+                'name': span.name,
+                'site': span.site,
+                'start': datetime.fromtimestamp(span.start_time, tz=timezone.utc).isoformat(),
+                'durationMs': round(span.duration * 1000, 3),
+                'attributes': span.attributes,
+                'error': span.error,
+            }, default=str)
+            self.__handler.handle(logging.makeLogRecord({'msg': line}))
+
+    def close(self):
+        self.__handler.close()
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+class OtlpHttpSpanExporter(SpanExporter):
+    """
+    OTLP/HTTP json export to a collector, e.g. http://otel-collector:4318
+    """
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 5.0):
+        self.__url = f"{endpoint.rstrip('/')}/v1/traces"
+        self.__service_name = service_name
+        self.__timeout = timeout
+
+    def export(self, spans: list[Span]):
+        otlp_spans = []
+        for span in spans:
+            attributes = {'crawler.cycle_id': span.cycle_id, 'crawler.site': span.site, **span.attributes}
+            otlp_span: dict[str, Any] = {
+                'traceId': span.trace_id,
+                'spanId': span.span_id,
+                'name': span.name,
+                'kind': 1, # internal
+                'startTimeUnixNano': str(int(span.start_time * 1e9)),
+                'endTimeUnixNano': str(int((span.start_time + span.duration) * 1e9)),
+                'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in attributes.items()],
+            }
+            if span.parent_id is not None:
+                otlp_span['parentSpanId'] = span.parent_id
+            if span.error is not None:
+                otlp_span['status'] = {'code': 2, 'message': span.error}
+            otlp_spans.append(otlp_span)
+        body = json.dumps({'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': self.__service_name}}]},
+            'scopeSpans': [{'scope': {'name': 'crawler'}, 'spans': otlp_spans}],
+        }]}).encode('utf-8')
+        request = urllib.request.Request(self.__url, data=body, headers={'Content-Type': 'application/json'}, method='POST')
+        with urllib.request.urlopen(request, timeout=self.__timeout) as response:
+            response.read()
+
+class SpanRecorder:
+    """
+    Queues finished spans and exports them in batches from a background thread, off the event loop.
+    Spans are only created inside a trace while the recorder is started.
+    """
+    def __init__(self, exporter: str, batch_size: int = 512, flush_interval: float = 2.0):
+        self.__exporter_name = exporter
+        self.__batch_size = batch_size
+        self.__flush_interval = flush_interval
+        self.__queue: queue.SimpleQueue[Optional[Span]] = queue.SimpleQueue()
+        self.__thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.__thread is not None
+
+    def __create_exporter(self) -> Optional[SpanExporter]:
+        if self.__exporter_name == 'jsonl':
+            return JsonlSpanExporter(os.path.join(LOG_DIR, f"{LOG_NAME}.spans.jsonl"))
+        if self.__exporter_name == 'otlp':
+            return OtlpHttpSpanExporter(SPAN_OTLP_ENDPOINT, LOG_NAME)
+        if self.__exporter_name != 'none':
+            raise ValueError(f"Unknown span exporter: {self.__exporter_name}")
+        return None
+
+    def start(self):
+        exporter = self.__create_exporter()
+        if exporter is None:
+            return
+        self.__thread = threading.Thread(target=self.__run, args=(exporter,), name='span-exporter', daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        """
+        Export the queued spans and stop, blocks until done
+        """
+        if self.__thread is None:
+            return
+        self.__queue.put(None)
+        self.__thread.join()
+        self.__thread = None
+
+    def record(self, span: Span):
+        if self.__thread is not None:
+            self.__queue.put(span)
+
+    def __run(self, exporter: SpanExporter):
+        stopping = False
+        while not stopping:
+            batch: list[Span] = []
+            deadline = time.monotonic() + self.__flush_interval
+            while len(batch) < self.__batch_size:
+                try:
+                    span = self.__queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if span is None:
+                    stopping = True
+                    break
+                batch.append(span)
+            if batch:
+                try:
+                    exporter.export(batch)
+                except Exception as e:
+                    logger.warning(f"dropped {len(batch)} spans, export failed: {e}")
+        exporter.close()
+
+span_recorder = SpanRecorder(SPAN_EXPORTER)
+
+@contextmanager
+def _run_span(span: Span) -> Iterator[Span]:
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span.duration = time.perf_counter() - span._start
+        _current_span.reset(token)
+        span_recorder.record(span)
+
+@contextmanager
+def trace(name: str, cycle_id: str, site: str = '', **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Root span of a crawl cycle, stages entered within (also in tasks created within) become its child spans.
+    No-op unless the span recorder is started.
+    """
+    if not span_recorder.enabled:
+        yield None
+        return
+    span = Span(trace_id=os.urandom(16).hex(), span_id=os.urandom(8).hex(), parent_id=None, cycle_id=cycle_id,
+                name=name, site=site, start_time=time.time(), attributes=attributes)
+    with _run_span(span):
+        yield span
+
+@contextmanager
+def span(name: str, site: str = '', **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Child span of the current span, no-op outside a trace
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(trace_id=parent.trace_id, span_id=os.urandom(8).hex(), parent_id=parent.span_id, cycle_id=parent.cycle_id,
+                 name=name, site=site or parent.site, start_time=time.time(), attributes=attributes)
+    with _run_span(child):
+        yield child
+
+def span_attributes(**attributes: Any):
+    """
+    Add attributes to the current span, e.g. row counts known at the end of a stage
+    """
+    current = _current_span.get()
+    if current is not None:
+        current.attributes.update(attributes)
@@ -0,0 +1,6 @@
+from .Metrics import registry, MetricsRegistry, Counter, Gauge, Histogram
+from .Tracing import Span, SpanRecorder, span_recorder, trace, span, span_attributes
+from .Stage import Stage, stage, current_stage
+from .LoopLagMonitor import LoopLagMonitor
+from .Profiler import Profiler, profiler
+from .MemoryTracker import MemoryTracker, memory_tracker
@@ -1,4 +1,4 @@
-from .requests import DoSearchRequest
-from .responses import CrawlerApiResponse, SearchResult
+from .requests import DoSearchRequest, DoBatchSearchRequest
+from .responses import CrawlerApiResponse, SearchResult, BatchSearchResult
 
-__all__ = ['DoSearchRequest', 'CrawlerApiResponse', 'SearchResult']
+__all__ = ['DoSearchRequest', 'DoBatchSearchRequest', 'CrawlerApiResponse', 'SearchResult', 'BatchSearchResult']
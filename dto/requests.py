@@ -11,3 +11,10 @@ class DoSearchRequest(TypedDict, total=False):
     query: str  # Built search query string
     fromTime: NotRequired[str]  # ISO format datetime string
     toTime: NotRequired[str]  # ISO format datetime string
+
+class DoBatchSearchRequest(TypedDict, total=False):
+    """
+    Request DTO for crawler batch search endpoint
+    """
+    requests: list[DoSearchRequest]  # Search requests, executed concurrently
+    stream: NotRequired[bool]  # Stream each result as newline delimited json as soon as it is ready
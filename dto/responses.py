@@ -12,6 +12,16 @@ class SearchResult(TypedDict):
     url: Optional[str]  # URL of the search result (optional)
 
 
+class BatchSearchResult(TypedDict):
+    """
+    Result of one item of a batch search
+    """
+    index: int  # Position of the item in the batch request
+    success: bool  # Indicates if this search was successful
+    errorMessage: str  # Error message if this search failed
+    result: list[SearchResult]  # Search results of this item
+
+
 class CrawlerApiResponse(TypedDict, Generic[T]):
     """
     Generic response wrapper for crawler API endpoints
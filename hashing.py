@@ -0,0 +1,14 @@
+import xxhash
+
+def hash64(data: bytes) -> int:
+    """
+    64 bit xxh3 hash, persisted (fingerprint) and shared between replicas (assign_sites), so it must not change
+    """
+    return xxhash.xxh3_64_intdigest(data)
+
+def fingerprint(text: str) -> int:
+    """
+    64 bit hash of the text as signed int, to fit a BIGINT column
+    """
+    h = hash64(text.encode('utf-8'))
+    return h - (1 << 64) if h >= 1 << 63 else h
@@ -0,0 +1,162 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+from .config import HEALTH_CHECK_INTERVAL_SECONDS, READY_MAX_CYCLE_LAG_SECONDS, READY_MAX_PUBLISH_LAG_SECONDS
+from .dao import TradebotDatabaseManagerAsync
+from .diagnostics import registry
+
+import logging
+log = logging.getLogger(__name__)
+
+DB_UP = registry.gauge('crawler_db_up', 'Result of the last database health check, 1 ok, 0 failed')
+SITE_CYCLE_LAG_SECONDS = registry.gauge('crawler_site_cycle_lag_seconds', 'Seconds since the last successful crawl of the site', ['kind', 'site'])
+SITE_PUBLISH_LAG_SECONDS = registry.gauge('crawler_site_publish_lag_seconds', 'Seconds since the publish time of the newest stored record of the site', ['kind', 'site'])
+
+@dataclass
+class SiteStatus:
+    kind: str
+    site: str
+    last_success: Optional[datetime] = None
+    last_publish_time: Optional[datetime] = None
+    last_error: Optional[str] = None
+
+class CrawlStatus:
+    """
+    Outcome of the latest crawls per site, kept by the process running the crawler
+    """
+    def __init__(self):
+        self.__started = datetime.now(timezone.utc)
+        self.__sites: dict[tuple[str, str], SiteStatus] = {}
+
+    @property
+    def started(self) -> datetime:
+        return self.__started
+
+    def expect(self, kind: str, site: str):
+        """
+        Register an activated site, it is reported before its first crawl
+        """
+        self.__sites.setdefault((kind, site), SiteStatus(kind=kind, site=site))
+
+    def forget(self, kind: str, site: str):
+        """
+        Stop reporting a site, e.g. handed over to another crawler replica
+        """
+        self.__sites.pop((kind, site), None)
+
+    def record_success(self, kind: str, site: str, last_publish_time: Optional[datetime]):
+        """
+        last_publish_time: newest publish time stored for the site, None if unknown
+        """
+        status = self.__sites.setdefault((kind, site), SiteStatus(kind=kind, site=site))
+        status.last_success = datetime.now(timezone.utc)
+        status.last_error = None
+        if last_publish_time is not None and (status.last_publish_time is None or last_publish_time > status.last_publish_time):
+            status.last_publish_time = last_publish_time
+
+    def record_failure(self, kind: str, site: str, error: str):
+        status = self.__sites.setdefault((kind, site), SiteStatus(kind=kind, site=site))
+        status.last_error = error
+
+    def sites(self) -> list[SiteStatus]:
+        return list(self.__sites.values())
+
+class HealthMonitor:
+    """
+    Refreshes the database health check and site freshness every interval seconds in the background,
+    so that /health and /ready probes are answered from memory instead of taking a pooled connection.
+    """
+    def __init__(self, tdbm: TradebotDatabaseManagerAsync, crawl_status: Optional[CrawlStatus], interval: float = HEALTH_CHECK_INTERVAL_SECONDS):
+        self.__tdbm = tdbm
+        self.__crawl_status = crawl_status
+        self.__interval = interval
+        self.__db_ok = False
+        self.__checked_at: Optional[float] = None
+        self.__task: Optional[asyncio.Task] = None
+
+    async def __check(self):
+        self.__db_ok = await self.__tdbm.test_connection()
+        self.__checked_at = time.monotonic()
+        DB_UP.set(1 if self.__db_ok else 0)
+        if self.__crawl_status is not None:
+            for site in self.__site_freshness():
+                if site['cycleLagSeconds'] is not None:
+                    SITE_CYCLE_LAG_SECONDS.set(site['cycleLagSeconds'], kind=site['kind'], site=site['site'])
+                if site['publishLagSeconds'] is not None:
+                    SITE_PUBLISH_LAG_SECONDS.set(site['publishLagSeconds'], kind=site['kind'], site=site['site'])
+
+    async def __run(self):
+        while True:
+            await asyncio.sleep(self.__interval)
+            try:
+                await self.__check()
+            except Exception as e:
+                log.error(f"health check failed: {e}", exc_info=True)
+
+    async def start(self):
+        await self.__check()
+        self.__task = asyncio.create_task(self.__run(), name='health-monitor')
+
+    async def stop(self):
+        if self.__task is not None:
+            self.__task.cancel()
+            try:
+                await self.__task
+            except asyncio.CancelledError:
+                pass
+            self.__task = None
+
+    def health(self) -> tuple[bool, str]:
+        """
+        (healthy, reason) as of the last check, a check older than 3 intervals counts as failed
+        """
+        if self.__checked_at is None:
+            return False, "Database connection not checked yet"
+        if time.monotonic() - self.__checked_at > 3 * self.__interval:
+            return False, "Database health check is stale"
+        if not self.__db_ok:
+            return False, "Database connection failed"
+        return True, "OK"
+
+    def __site_freshness(self) -> list[dict]:
+        assert self.__crawl_status is not None
+        now = datetime.now(timezone.utc)
+        uptime = (now - self.__crawl_status.started).total_seconds()
+        sites = []
+        for status in self.__crawl_status.sites():
+            cycle_lag = (now - status.last_success).total_seconds() if status.last_success is not None else None
+            publish_lag = (now - status.last_publish_time).total_seconds() if status.last_publish_time is not None else None
+            max_cycle_lag = READY_MAX_CYCLE_LAG_SECONDS[status.kind]
+            max_publish_lag = READY_MAX_PUBLISH_LAG_SECONDS[status.kind]
+            # a site is given max_cycle_lag after startup for its first crawl
+            fresh = (cycle_lag if cycle_lag is not None else uptime) <= max_cycle_lag \
+                and (publish_lag is None or publish_lag <= max_publish_lag)
+            sites.append({
+                'kind': status.kind,
+                'site': status.site,
+                'fresh': fresh,
+                'lastSuccess': status.last_success.isoformat() if status.last_success is not None else None,
+                'cycleLagSeconds': round(cycle_lag, 3) if cycle_lag is not None else None,
+                'lastPublishTime': status.last_publish_time.isoformat() if status.last_publish_time is not None else None,
+                'publishLagSeconds': round(publish_lag, 3) if publish_lag is not None else None,
+                'lastError': status.last_error,
+            })
+        return sites
+
+    def readiness(self) -> tuple[bool, dict]:
+        """
+        (ready, report), ready when the database is healthy and every crawled site is fresh.
+        Processes that do not crawl (API workers of the split deployment) only report the database.
+        """
+        healthy, reason = self.health()
+        sites = self.__site_freshness() if self.__crawl_status is not None else []
+        ready = healthy and all(site['fresh'] for site in sites)
+        return ready, {
+            'ready': ready,
+            'database': reason,
+            'crawling': self.__crawl_status is not None,
+            'sites': sites,
+        }
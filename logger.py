@@ -5,7 +5,7 @@ from queue import Queue
 import sys
 import os
 from types import TracebackType
-from .config import LOG_DIR, LOG_LEVEL
+from .config import LOG_DIR, LOG_LEVEL, LOG_NAME
 
 # configure a logger instance, should be called only once
 def configure_logger():
@@ -25,7 +25,7 @@ def configure_logger():
     queue_handler = QueueHandler(log_queue)
 
     # File handler
-    file_handler = TimedRotatingFileHandler(f"{LOG_DIR}/crawler.{getLevelName(lvl).lower()}.log", when="midnight", interval=1, backupCount=36, encoding="utf-8")
+    file_handler = TimedRotatingFileHandler(f"{LOG_DIR}/{LOG_NAME}.{getLevelName(lvl).lower()}.log", when="midnight", interval=1, backupCount=36, encoding="utf-8")
     file_handler.setLevel(lvl)
     file_handler.suffix = "%Y-%m-%d"
 
@@ -1,15 +1,37 @@
+import argparse
 import asyncio
+import signal
+import time
 from datetime import datetime, timedelta, timezone
 from time import sleep
+from contextlib import contextmanager
+from enum import Enum
+from typing import Callable, Iterator, Optional
+from apscheduler.events import JobEvent, EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 
-from .server import Server
-from .config import STRATEGY_HOST, STRATEGY_PORT, ACTIVATED_ARTICLE_SITES, ACTIVATED_FLASH_NEWS_SITES
+from .server import Server, MetricsServer
+from .config import STRATEGY_HOST, STRATEGY_PORT, ACTIVATED_ARTICLE_SITES, ACTIVATED_FLASH_NEWS_SITES, \
+    CRAWLER_DEPLOYMENT_MODE, API_DB_POOL_MAX_SIZE, EVENT_LOOP, SCHEDULER_METRICS_PORT, LOOP_LAG_MONITOR_INTERVAL_SECONDS, \
+    LOOP_LAG_THRESHOLD_SECONDS, PROFILE_SIGNAL_KIND, PROFILE_SIGNAL_TARGET, PROFILE_SIGNAL_COUNT, PROFILE_MODE, \
+    FLASH_NEWS_DEDUP_ENABLED, FLASH_NEWS_DEDUP_THRESHOLD, FLASH_NEWS_DEDUP_WINDOW_MINUTES, FLASH_NEWS_DEDUP_SHINGLE_SIZE, \
+    ARTICLE_REVISIT_ENABLED, ARTICLE_REVISIT_FIRST_HOURS, ARTICLE_REVISIT_MAX_DAYS, CRAWL_COORDINATION_ENABLED, \
+    CRAWLER_REPLICA_ID, CRAWL_LEASE_TTL_SECONDS, CRAWL_LEASE_RENEW_SECONDS, ARTICLE_DETAIL_QUEUE_ENABLED, \
+    ARTICLE_DETAIL_LOCAL_WORKERS, ARTICLE_DETAIL_TASK_RETENTION_DAYS, API_WORKER_INDEX, API_METRICS_PORT
 from .source import FlashNewsFetcherFacade, ArticleFetcherFacade, SearcherFacade
-from .const import FlashNewsSite, ArticleSite
+from .source.HttpCassette import http_cassette
+from .source.NearDuplicateIndex import NearDuplicateIndex
+from .const import FlashNewsSite, ArticleSite, DeploymentMode, ProcessRole
 from .dao import TradebotDatabaseManagerAsync
+from .hashing import fingerprint
 from .run import start_wait_stop_runner
+from .supervisor import Supervisor
+from .health import CrawlStatus
+from .coordination import CrawlCoordinator
+from .detail_worker import ArticleDetailWorker
+from .diagnostics import registry, stage, trace, span_attributes, span_recorder, LoopLagMonitor, profiler, memory_tracker
 
 
 import logging
@@ -17,84 +39,348 @@ logger = logging.getLogger(__name__)
 
 STRATEGY_BASE_URL = f"http://{STRATEGY_HOST}:{STRATEGY_PORT}"
 GET_RESEARCH_INSTRUCTIONS_ENDPOINT = f"{STRATEGY_BASE_URL}/get-research-instructions"
+# news another replica fetched before the last load but inserted after it are still loaded
+NEAR_DUPLICATE_LOAD_OVERLAP = timedelta(minutes=10)
+
+CRAWL_CYCLE_SECONDS = registry.histogram('crawler_crawl_cycle_seconds', 'Duration of a crawl job run over all activated sites', ['job'])
+CRAWL_SITE_SECONDS = registry.histogram('crawler_crawl_site_seconds', 'Duration of crawling one site, fetch and insert', ['kind', 'site'])
+CRAWL_ERRORS = registry.counter('crawler_crawl_errors_total', 'Site crawls that failed', ['kind', 'site'])
+ROWS_FETCHED = registry.counter('crawler_rows_fetched_total', 'Records fetched from sites', ['kind', 'site'])
+ROWS_INSERTED = registry.counter('crawler_rows_inserted_total', 'Fetched records that were new and inserted', ['kind', 'site'])
+ARTICLES_REVISITED = registry.counter('crawler_articles_revisited_total', 'Stored articles fetched again to detect edits', ['site', 'result'])
+SKIPPED_RUNS = registry.counter('crawler_crawl_skipped_runs_total', 'Crawl job runs skipped by the scheduler', ['job', 'reason'])
+
+def revisit_publish_time_ranges(last_run: datetime, now: datetime, first_age: timedelta, max_age: timedelta) -> list[tuple[datetime, datetime]]:
+    """
+    (after, until] publish time ranges of the articles that reached a revisit age since the last run,
+    the ages being first_age, twice that and so on up to max_age
+    """
+    ranges = []
+    age = first_age
+    while age <= max_age:
+        ranges.append((last_run - age, now - age))
+        age *= 2
+    return ranges
+
+def event_loop_factory() -> Optional[Callable[[], asyncio.AbstractEventLoop]]:
+    """
+    uvloop event loop factory when EVENT_LOOP selects it, None for the default asyncio loop
+    """
+    if EVENT_LOOP == 'asyncio':
+        return None
+    try:
+        import uvloop
+        return uvloop.new_event_loop
+    except ImportError:
+        if EVENT_LOOP == 'uvloop':
+            raise
+        return None
 
 class Main():
-    def __init__(self):
+    def __init__(
+        self,
+        role: ProcessRole = ProcessRole.ALL,
+        tdbm: Optional[TradebotDatabaseManagerAsync] = None,
+        flash_news_sites: Optional[list[FlashNewsSite]] = None,
+        article_sites: Optional[list[ArticleSite]] = None
+    ):
+        """
+        Args:
+            role: ALL runs crawler and API server in this process, SCHEDULER only the crawler, API only the server
+            tdbm: database manager to use instead of the configured one (benchmarks)
+            flash_news_sites, article_sites: sites to crawl instead of the activated ones
+        """
+        self.__role = role
+        self.__run_scheduler = role in (ProcessRole.ALL, ProcessRole.SCHEDULER)
+
         self.__flash_news_fetcher = FlashNewsFetcherFacade()
         self.__article_fetcher = ArticleFetcherFacade()
-        self.__searcher_facade = SearcherFacade()
-        self.__tbdm = TradebotDatabaseManagerAsync()
-        self.__server = Server(self.__searcher_facade, self.__tbdm)
+        if tdbm is not None:
+            self.__tbdm = tdbm
+        elif role == ProcessRole.API:
+            self.__tbdm = TradebotDatabaseManagerAsync(max_size=API_DB_POOL_MAX_SIZE)
+        else:
+            self.__tbdm = TradebotDatabaseManagerAsync()
+        self.__activated_article_sites = ACTIVATED_ARTICLE_SITES if article_sites is None else article_sites
+        self.__activated_flash_news_sites = ACTIVATED_FLASH_NEWS_SITES if flash_news_sites is None else flash_news_sites
 
-        self.__scheduler = self.__create_scheduler()
+        self.__crawl_status = CrawlStatus()
+        self.__coordinator: Optional[CrawlCoordinator] = None
+        if CRAWL_COORDINATION_ENABLED and self.__run_scheduler:
+            # the coordinator reports the sites leased to this replica
+            keys = [('flash_news', site.value) for site in self.__activated_flash_news_sites] + \
+                [('article', site.value) for site in self.__activated_article_sites]
+            self.__coordinator = CrawlCoordinator(self.__tbdm, CRAWLER_REPLICA_ID, keys, CRAWL_LEASE_TTL_SECONDS, self.__crawl_status)
+        else:
+            for site in self.__activated_flash_news_sites:
+                self.__crawl_status.expect('flash_news', site.value)
+            for site in self.__activated_article_sites:
+                self.__crawl_status.expect('article', site.value)
+        # /ready of a process reports the crawls of that process only
+        crawl_status = self.__crawl_status if self.__run_scheduler else None
+
+        self.__server: Optional[Server] = None
+        self.__metrics_server: Optional[MetricsServer] = None
+        if role in (ProcessRole.ALL, ProcessRole.API):
+            self.__server = Server(SearcherFacade(), self.__tbdm, reuse_port=(role == ProcessRole.API), crawl_status=crawl_status)
+        if role == ProcessRole.SCHEDULER and SCHEDULER_METRICS_PORT > 0:
+            self.__metrics_server = MetricsServer(SCHEDULER_METRICS_PORT, self.__tbdm, crawl_status)
+        elif role == ProcessRole.API and API_WORKER_INDEX is not None and API_METRICS_PORT > 0:
+            # the shared port reaches any worker, every worker's metrics are scraped from a port of its own
+            self.__metrics_server = MetricsServer(API_METRICS_PORT + API_WORKER_INDEX, self.__tbdm, None, admin=False)
 
-        self.__activated_article_sites = ACTIVATED_ARTICLE_SITES
-        self.__activated_flash_news_sites = ACTIVATED_FLASH_NEWS_SITES
+        self.__scheduler = self.__create_scheduler()
+        self.__detail_worker: Optional[ArticleDetailWorker] = None
+        if ARTICLE_DETAIL_QUEUE_ENABLED and self.__run_scheduler and ARTICLE_DETAIL_LOCAL_WORKERS > 0:
+            self.__detail_worker = ArticleDetailWorker(self.__tbdm, self.__article_fetcher, self.__activated_article_sites,
+                                                       ARTICLE_DETAIL_LOCAL_WORKERS)
 
         self.__max_flash_news_fetch_lag_days = 3
+        self.__near_duplicates: Optional[NearDuplicateIndex] = None
+        if FLASH_NEWS_DEDUP_ENABLED:
+            self.__near_duplicates = NearDuplicateIndex(FLASH_NEWS_DEDUP_THRESHOLD,
+                                                        timedelta(minutes=FLASH_NEWS_DEDUP_WINDOW_MINUTES),
+                                                        FLASH_NEWS_DEDUP_SHINGLE_SIZE)
+        # when the stored news were last added to the index, None until it is seeded
+        self.__near_duplicates_loaded: Optional[datetime] = None
         self.__max_article_fetch_lag_days = 21
+        # end of the last successful revisit by site, a failed revisit is covered by the next run
+        self.__last_revisit_times: dict[ArticleSite, datetime] = {}
 
         self.__stop_scheduler = asyncio.Event()
         self.__stop_server = asyncio.Event()
+        self.__loop: Optional[asyncio.AbstractEventLoop] = None
 
     def __create_scheduler(self):
         scheduler = AsyncIOScheduler()
         scheduler.add_job(self.crawl_flash_news, CronTrigger(second=30), max_instances=1, id="crawl_flash_news_job")
         scheduler.add_job(self.crawl_articles, CronTrigger(minute=5, second=30), max_instances=1, id="crawl_articles_job")
+        if ARTICLE_REVISIT_ENABLED:
+            scheduler.add_job(self.revisit_articles, CronTrigger(minute=35, second=30), max_instances=1, id="revisit_articles_job")
+        if self.__coordinator is not None:
+            scheduler.add_job(self.__coordinator.renew, IntervalTrigger(seconds=CRAWL_LEASE_RENEW_SECONDS), max_instances=1, id="crawl_lease_job")
+        scheduler.add_listener(self.__on_job_skipped, EVENT_JOB_MAX_INSTANCES | EVENT_JOB_MISSED)
         return scheduler
 
+    def __on_job_skipped(self, event: JobEvent):
+        reason = 'still_running' if event.code == EVENT_JOB_MAX_INSTANCES else 'missed'
+        logger.warning(f"job {event.job_id} run skipped, reason: {reason}")
+        SKIPPED_RUNS.inc(job=event.job_id, reason=reason)
+
+    @contextmanager
+    def __owned_sites[S: Enum](self, kind: str, sites: list[S]) -> Iterator[list[S]]:
+        """
+        The sites this replica crawls, all activated ones unless CRAWL_COORDINATION_ENABLED splits them between replicas
+        """
+        if self.__coordinator is None:
+            yield sites
+            return
+        with self.__coordinator.crawling(kind, sites) as owned:
+            yield owned
+
+    @staticmethod
+    def __cycle_id() -> str:
+        return datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
     async def crawl_flash_news(self):
         logger.info("crawl flash news")
+        cycle_id = self.__cycle_id()
         async def crawl_flash_news_for_site(site: FlashNewsSite):
-            try:
-                logger.info(f"crawl flash news START on site: {site}")
-                latest_time = await self.__tbdm.get_flash_news_last_publish_time(site)
-                if (latest_time is None) or (datetime.now(timezone.utc) - latest_time > timedelta(days=self.__max_flash_news_fetch_lag_days)):
-                    latest_time = datetime.now(timezone.utc) - timedelta(days=self.__max_flash_news_fetch_lag_days)
+            with profiler.profile('crawl', f"flash_news/{site.value}", cycle_id), stage('crawl', site=f"flash_news/{site.value}"):
+                site_start = time.perf_counter()
+                try:
+                    logger.info(f"crawl flash news START on site: {site}")
+                    with stage('watermark', site=f"flash_news/{site.value}"):
+                        latest_time = await self.__tbdm.get_flash_news_last_publish_time(site)
+                    stored_publish_time = latest_time
+                    if (latest_time is None) or (datetime.now(timezone.utc) - latest_time > timedelta(days=self.__max_flash_news_fetch_lag_days)):
+                        latest_time = datetime.now(timezone.utc) - timedelta(days=self.__max_flash_news_fetch_lag_days)
                 
-                flash_news_po_list = await self.__flash_news_fetcher.fetch(site=site, after=latest_time)
-                await self.__tbdm.insert_many_flash_news(flash_news_po_list)
-                logger.info(f"crawl flash news END on site: {site}")
-            except Exception as e:
-                logger.error(f"crawl flash news ERROR on site: {site}, error: {e}", exc_info=True)
-        await asyncio.gather(*[crawl_flash_news_for_site(site) for site in self.__activated_flash_news_sites])
+                    with stage('fetch', site=f"flash_news/{site.value}"):
+                        flash_news_po_list = await self.__flash_news_fetcher.fetch(site=site, after=latest_time)
+                        span_attributes(rows=len(flash_news_po_list))
+                    ROWS_FETCHED.inc(len(flash_news_po_list), kind='flash_news', site=site.value)
+                    duplicates = 0
+                    if self.__near_duplicates is not None:
+                        with stage('dedup', site=f"flash_news/{site.value}"):
+                            duplicates = self.__near_duplicates.assign(flash_news_po_list)
+                    with stage('insert', site=f"flash_news/{site.value}"):
+                        inserted = await self.__tbdm.insert_many_flash_news(flash_news_po_list)
+                        span_attributes(rows=len(flash_news_po_list), inserted=inserted)
+                    ROWS_INSERTED.inc(inserted, kind='flash_news', site=site.value)
+                    if inserted:
+                        stored_publish_time = max(po.publish_time for po in flash_news_po_list)
+                    self.__crawl_status.record_success('flash_news', site.value, stored_publish_time)
+                    logger.info(f"crawl flash news END on site: {site}, fetched: {len(flash_news_po_list)}, inserted: {inserted}, near duplicates: {duplicates}")
+                except Exception as e:
+                    CRAWL_ERRORS.inc(kind='flash_news', site=site.value)
+                    span_attributes(error=str(e))
+                    self.__crawl_status.record_failure('flash_news', site.value, str(e))
+                    logger.error(f"crawl flash news ERROR on site: {site}, error: {e}", exc_info=True)
+                finally:
+                    CRAWL_SITE_SECONDS.observe(time.perf_counter() - site_start, kind='flash_news', site=site.value)
+        cycle_start = time.perf_counter()
+        await self.__load_near_duplicates()
+        with trace('crawl_flash_news', cycle_id, job='crawl_flash_news_job'):
+            with self.__owned_sites('flash_news', self.__activated_flash_news_sites) as sites:
+                await asyncio.gather(*[crawl_flash_news_for_site(site) for site in sites])
+        CRAWL_CYCLE_SECONDS.observe(time.perf_counter() - cycle_start, job='crawl_flash_news_job')
 
 
+    async def __load_near_duplicates(self):
+        """
+        Index the stored news of the dedup window once, so that news crawled after a restart join their clusters.
+        With crawl coordination the news other replicas stored since the last load are added before every cycle,
+        so that news of the sites leased to this replica join the clusters of the others' sites.
+        """
+        if self.__near_duplicates is None or (self.__near_duplicates_loaded is not None and self.__coordinator is None):
+            return
+        try:
+            now = datetime.now(timezone.utc)
+            after = now - timedelta(minutes=FLASH_NEWS_DEDUP_WINDOW_MINUTES)
+            # create_time is set when a news is fetched, before it is inserted, news already indexed are skipped
+            created_after = None if self.__near_duplicates_loaded is None else self.__near_duplicates_loaded - NEAR_DUPLICATE_LOAD_OVERLAP
+            stored = await self.__tbdm.get_flash_news(after, created_after)
+            indexed = len(self.__near_duplicates)
+            for news in stored:
+                self.__near_duplicates.add(news)
+            if self.__near_duplicates_loaded is None:
+                logger.info(f"near duplicate index seeded with {len(self.__near_duplicates)} stored flash news")
+            elif len(self.__near_duplicates) > indexed:
+                logger.info(f"near duplicate index added {len(self.__near_duplicates) - indexed} flash news stored by other replicas")
+            self.__near_duplicates_loaded = now
+        except Exception as e:
+            logger.error(f"loading the near duplicate index failed, retrying next cycle: {e}", exc_info=True)
+
     async def crawl_articles(self):
+        cycle_id = self.__cycle_id()
         async def crawl_articles_for_site(site: ArticleSite):
-            try:
-                logger.info(f"crawl articles START on site: {site}")
-                latest_time = await self.__tbdm.get_article_last_publish_time(site)
-                if (latest_time is None) or (datetime.now(timezone.utc) - latest_time > timedelta(days=self.__max_article_fetch_lag_days)):
-                    latest_time = datetime.now(timezone.utc) - timedelta(days=self.__max_article_fetch_lag_days)
+            with profiler.profile('crawl', f"article/{site.value}", cycle_id), stage('crawl', site=f"article/{site.value}"):
+                site_start = time.perf_counter()
+                try:
+                    logger.info(f"crawl articles START on site: {site}")
+                    with stage('watermark', site=f"article/{site.value}"):
+                        latest_time = await self.__tbdm.get_article_last_publish_time(site)
+                    stored_publish_time = latest_time
+                    if (latest_time is None) or (datetime.now(timezone.utc) - latest_time > timedelta(days=self.__max_article_fetch_lag_days)):
+                        latest_time = datetime.now(timezone.utc) - timedelta(days=self.__max_article_fetch_lag_days)
                 
-                article_po_list = await self.__article_fetcher.fetch(site=site, after=latest_time)
-                await self.__tbdm.insert_many_articles(article_po_list)
-                logger.info(f"crawl articles END on site: {site}")
-            except Exception as e:
-                logger.error(f"crawl articles ERROR on site: {site}, error: {e}", exc_info=True)
-        await asyncio.gather(*[crawl_articles_for_site(site) for site in self.__activated_article_sites])
+                    if ARTICLE_DETAIL_QUEUE_ENABLED:
+                        await self.__queue_article_details(site, latest_time, stored_publish_time)
+                        return
+                    with stage('fetch', site=f"article/{site.value}"):
+                        article_po_list = await self.__article_fetcher.fetch(site=site, after=latest_time)
+                        span_attributes(rows=len(article_po_list))
+                    ROWS_FETCHED.inc(len(article_po_list), kind='article', site=site.value)
+                    with stage('insert', site=f"article/{site.value}"):
+                        inserted = await self.__tbdm.insert_many_articles(article_po_list)
+                        span_attributes(rows=len(article_po_list), inserted=inserted)
+                    ROWS_INSERTED.inc(inserted, kind='article', site=site.value)
+                    if inserted:
+                        stored_publish_time = max(po.publish_time for po in article_po_list)
+                    self.__crawl_status.record_success('article', site.value, stored_publish_time)
+                    logger.info(f"crawl articles END on site: {site}, fetched: {len(article_po_list)}, inserted: {inserted}")
+                except Exception as e:
+                    CRAWL_ERRORS.inc(kind='article', site=site.value)
+                    span_attributes(error=str(e))
+                    self.__crawl_status.record_failure('article', site.value, str(e))
+                    logger.error(f"crawl articles ERROR on site: {site}, error: {e}", exc_info=True)
+                finally:
+                    CRAWL_SITE_SECONDS.observe(time.perf_counter() - site_start, kind='article', site=site.value)
+        cycle_start = time.perf_counter()
+        if ARTICLE_DETAIL_QUEUE_ENABLED:
+            await self.__delete_article_detail_tasks()
+        with trace('crawl_articles', cycle_id, job='crawl_articles_job'):
+            with self.__owned_sites('article', self.__activated_article_sites) as sites:
+                await asyncio.gather(*[crawl_articles_for_site(site) for site in sites])
+        CRAWL_CYCLE_SECONDS.observe(time.perf_counter() - cycle_start, job='crawl_articles_job')
         
 
+    async def __queue_article_details(self, site: ArticleSite, after: datetime, stored_publish_time: Optional[datetime]):
+        """
+        Listing stage only, the detail pages are queued for the detail workers
+        """
+        with stage('listing', site=f"article/{site.value}"):
+            listings = await self.__article_fetcher.fetch_listing(site=site, after=after)
+            span_attributes(rows=len(listings))
+        with stage('enqueue', site=f"article/{site.value}"):
+            queued = await self.__tbdm.enqueue_article_detail_tasks(site, [(listing['url'], listing['title'], listing['publish_time']) for listing in listings])
+            span_attributes(rows=len(listings), queued=queued)
+        self.__crawl_status.record_success('article', site.value, stored_publish_time)
+        logger.info(f"crawl articles END on site: {site}, listed: {len(listings)}, queued: {queued}")
+
+    async def __delete_article_detail_tasks(self):
+        try:
+            deleted = await self.__tbdm.delete_article_detail_tasks(datetime.now(timezone.utc) - timedelta(days=ARTICLE_DETAIL_TASK_RETENTION_DAYS))
+            if deleted:
+                logger.info(f"deleted {deleted} finished article detail tasks")
+        except Exception as e:
+            logger.error(f"deleting finished article detail tasks failed: {e}", exc_info=True)
+
+    async def revisit_articles(self):
+        """
+        Fetch the stored articles that reached a revisit age again and store the ones whose content changed,
+        unchanged articles are neither sent to nor written in the database
+        """
+        cycle_id = self.__cycle_id()
+        now = datetime.now(timezone.utc)
+        async def revisit_articles_for_site(site: ArticleSite):
+            with stage('revisit', site=f"article/{site.value}"):
+                try:
+                    # the job runs hourly
+                    last_run = self.__last_revisit_times.get(site) or now - timedelta(hours=1)
+                    ranges = revisit_publish_time_ranges(last_run, now, timedelta(hours=ARTICLE_REVISIT_FIRST_HOURS),
+                                                         timedelta(days=ARTICLE_REVISIT_MAX_DAYS))
+                    stored_list = await self.__tbdm.get_articles_to_revisit(site, ranges)
+                    if not stored_list:
+                        self.__last_revisit_times[site] = now
+                        return
+                    contents = await self.__article_fetcher.fetch_contents(site, [stored['url'] for stored in stored_list])
+                    changed: dict[int, str] = {}
+                    for stored in stored_list:
+                        content = contents.get(stored['url'])
+                        if content is None:
+                            ARTICLES_REVISITED.inc(site=site.value, result='failed')
+                        elif fingerprint(content) == stored['content_fingerprint']:
+                            ARTICLES_REVISITED.inc(site=site.value, result='unchanged')
+                        else:
+                            changed[stored['id']] = content
+                    updated = await self.__tbdm.update_article_contents(site, changed)
+                    ARTICLES_REVISITED.inc(updated, site=site.value, result='changed')
+                    self.__last_revisit_times[site] = now
+                    logger.info(f"revisit articles on site: {site}, revisited: {len(stored_list)}, fetched: {len(contents)}, updated: {updated}")
+                except Exception as e:
+                    CRAWL_ERRORS.inc(kind='article_revisit', site=site.value)
+                    span_attributes(error=str(e))
+                    logger.error(f"revisit articles ERROR on site: {site}, error: {e}", exc_info=True)
+        with trace('revisit_articles', cycle_id, job='revisit_articles_job'):
+            with self.__owned_sites('article', self.__activated_article_sites) as sites:
+                await asyncio.gather(*[revisit_articles_for_site(site) for site in sites])
+
     async def run_scheduler(self):
         logger.info("request scheduler start")
+        if self.__coordinator is not None:
+            # lease the sites before the first cycles run
+            await self.__coordinator.renew()
         self.__scheduler.start()
         logger.info("scheduler started")
         await self.__stop_scheduler.wait()
         logger.info("request scheduler stop")
         self.__scheduler.shutdown()
+        if self.__coordinator is not None:
+            await self.__coordinator.stop()
         logger.info("scheduler stopped")
 
-    async def run_server(self):
+    async def run_server(self, server: Server | MetricsServer):
         logger.info("request server start")
         # Start server in background task
-        server_task = asyncio.create_task(self.__server.start())
+        server_task = asyncio.create_task(server.start())
         logger.info("server started")
         # Wait for stop signal
         await self.__stop_server.wait()
         logger.info("request server stop")
         # Stop the server
-        await self.__server.stop()
+        await server.stop()
         # Wait for server task to complete
         try:
             await asyncio.wait_for(server_task, timeout=5.0)
@@ -108,15 +394,56 @@ class Main():
         logger.info("server stopped")
 
     async def main(self):
+        self.__loop = asyncio.get_running_loop()
+        loop_lag_monitor: Optional[LoopLagMonitor] = None
+        if LOOP_LAG_MONITOR_INTERVAL_SECONDS > 0:
+            loop_lag_monitor = LoopLagMonitor(LOOP_LAG_MONITOR_INTERVAL_SECONDS, LOOP_LAG_THRESHOLD_SECONDS)
+            loop_lag_monitor.start()
+        memory_tracker.start()
+        span_recorder.start()
+        await http_cassette.start()
+        # kill -USR2 <pid> profiles the next runs without a restart
+        self.__loop.add_signal_handler(signal.SIGUSR2, self.__arm_profiler)
+        try:
+            await self.__main()
+        finally:
+            self.__loop.remove_signal_handler(signal.SIGUSR2)
+            await http_cassette.stop()
+            await memory_tracker.stop()
+            await asyncio.to_thread(span_recorder.stop)
+            if loop_lag_monitor is not None:
+                await loop_lag_monitor.stop()
+
+    def __arm_profiler(self):
+        try:
+            profiler.arm(PROFILE_SIGNAL_KIND, PROFILE_SIGNAL_TARGET, PROFILE_SIGNAL_COUNT, PROFILE_MODE)
+        except ValueError as e:
+            logger.error(f"cannot arm profiler on signal: {e}")
+
+    async def __main(self):
         while True:
             try:
                 await self.__tbdm.open()
                 break
             except Exception as e:
                 logger.error(f"Fail to open tradebot database manager: {e}", exc_info=True)
-                await asyncio.sleep(5)
+                try:
+                    await asyncio.wait_for(self.__stop_scheduler.wait(), timeout=5)
+                    logger.info("stop requested before database was opened")
+                    return
+                except asyncio.TimeoutError:
+                    pass
+        runners = []
+        if self.__run_scheduler:
+            runners.append(self.run_scheduler())
+        if self.__server is not None:
+            runners.append(self.run_server(self.__server))
+        if self.__metrics_server is not None:
+            runners.append(self.run_server(self.__metrics_server))
+        if self.__detail_worker is not None:
+            runners.append(self.__detail_worker.run(self.__stop_scheduler))
         try:
-            await asyncio.gather(self.run_scheduler(), self.run_server())
+            await asyncio.gather(*runners)
         except Exception as e:
             logger.error(f"Error in main: {e}", exc_info=True)
             raise e
@@ -124,19 +451,34 @@ class Main():
             await self.__tbdm.close()
 
     def start(self):
-        logger.info("START crawler")
-        asyncio.run(self.main())
+        logger.info(f"START crawler, role: {self.__role.value}")
+        asyncio.run(self.main(), loop_factory=event_loop_factory())
 
-    def stop(self):
-        logger.info("STOP crawler")
+    def __set_stop_events(self):
         self.__stop_server.set()
         self.__stop_scheduler.set()
 
+    def stop(self):
+        logger.info("STOP crawler")
+        if self.__loop is None or self.__loop.is_closed():
+            self.__set_stop_events()
+        else:
+            # called from a signal handler, wake the loop up instead of waiting for its next timer
+            self.__loop.call_soon_threadsafe(self.__set_stop_events)
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the crawler")
+    parser.add_argument('--role', type=ProcessRole, default=None,
+                        help="run a single role, by default derived from CRAWLER_DEPLOYMENT_MODE")
+    args = parser.parse_args()
     try:
-        main = Main()
-        start_wait_stop_runner(main.start, main.stop, "crawler")
+        if args.role is None and CRAWLER_DEPLOYMENT_MODE == DeploymentMode.SPLIT:
+            supervisor = Supervisor()
+            start_wait_stop_runner(supervisor.start, supervisor.stop, "crawler supervisor")
+        else:
+            main = Main(args.role or ProcessRole.ALL)
+            start_wait_stop_runner(main.start, main.stop, f"crawler {(args.role or ProcessRole.ALL).value}")
     except Exception as e:
         logger.error(f"Error in main: {e}", exc_info=True)
         sleep(1)
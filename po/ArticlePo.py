@@ -1,12 +1,13 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from typing import Optional
 import hashlib
 
 from . import BasePo
 from ..const import ArticleSource, ArticleSite
+from ..hashing import fingerprint
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class ArticlePo(BasePo):
     source: ArticleSource
     site: ArticleSite
@@ -14,11 +15,15 @@ class ArticlePo(BasePo):
     title_md5: str
     content: str
     url: str
-    create_time: datetime = datetime.now(timezone.utc)
-    publish_time: datetime = datetime.now(timezone.utc)
+    create_time: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    publish_time: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    # hash of content to detect edits when revisiting, see TradebotDatabaseManagerAsync.get_articles_to_revisit
+    content_fingerprint: Optional[int] = None
     
     def __post_init__(self):
-        super().__post_init__()
+        BasePo.__post_init__(self)
         # Auto-generate title_md5 if not provided
         if not hasattr(self, 'title_md5') or not self.title_md5:
             self.title_md5 = hashlib.md5(self.title.encode('utf-8')).hexdigest()
+        if self.content_fingerprint is None and self.content is not None:
+            self.content_fingerprint = fingerprint(self.content)
@@ -1,9 +1,13 @@
 from dataclasses import dataclass
 from typing import Optional
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class BasePo:
-    """Base class for all persistent objects in the system"""
+    """
+    Base class for all persistent objects in the system.
+    Slotted, subclasses must be slotted dataclasses too and call BasePo.__post_init__(self) explicitly,
+    zero argument super() does not work in the classes dataclass recreates for slots before python 3.14
+    """
     id: Optional[int]
     
     def __eq__(self, other: object) -> bool:
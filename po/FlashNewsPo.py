@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from typing import Optional
 import hashlib
@@ -6,7 +6,7 @@ import hashlib
 from . import BasePo
 from ..const import FlashNewsSource, FlashNewsSite
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class FlashNewsPo(BasePo):
     source: FlashNewsSource
     site: FlashNewsSite
@@ -14,11 +14,13 @@ class FlashNewsPo(BasePo):
     title_md5: str
     description: str
     url: Optional[str] = None
-    create_time: datetime = datetime.now(timezone.utc)
-    publish_time: datetime = datetime.now(timezone.utc)
+    create_time: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    publish_time: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    # title_md5 of the earliest near duplicate news, its own title_md5 when there is none (NearDuplicateIndex)
+    cluster_md5: Optional[str] = None
     
     def __post_init__(self):
-        super().__post_init__()
+        BasePo.__post_init__(self)
         # Auto-generate title_md5 if not provided
         if not hasattr(self, 'title_md5') or not self.title_md5:
             self.title_md5 = hashlib.md5(self.title.encode('utf-8')).hexdigest()
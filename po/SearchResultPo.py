@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from typing import Optional
 import hashlib
@@ -6,7 +6,7 @@ import hashlib
 from . import BasePo
 from ..const import SearchTool
 
-@dataclass(eq=False)
+@dataclass(eq=False, slots=True)
 class SearchResultPo(BasePo):
     strategy_class_name: str
     query: str
@@ -14,10 +14,10 @@ class SearchResultPo(BasePo):
     content: str
     content_md5: str
     url: Optional[str] = None
-    create_time: datetime = datetime.now(timezone.utc)
+    create_time: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
     
     def __post_init__(self):
-        super().__post_init__()
+        BasePo.__post_init__(self)
         # Auto-generate content_md5 if not provided
         if not hasattr(self, 'content_md5') or not self.content_md5:
             self.content_md5 = hashlib.md5(self.content.encode('utf-8')).hexdigest()
@@ -1,28 +1,157 @@
+import asyncio
 from datetime import datetime
+import json
 import signal
+import socket
+import time
+import uuid
 import logging
+from typing import AsyncIterator, Optional
 import uvicorn
 from starlette.applications import Starlette
-from starlette.responses import JSONResponse, Response
+from starlette.responses import JSONResponse, Response, StreamingResponse
 from starlette.routing import Route
 from starlette.requests import Request
 
 from .source.SearcherFacade import SearcherFacade
+from .source.searcher import stream_results
+from .source.types import SearchStreamChunk
 from .const import SearchTool
-from .dto import DoSearchRequest, CrawlerApiResponse, SearchResult
-from .config import UVICORN_PORT, UVICORN_LOG_LEVEL
+from .dto import DoSearchRequest, DoBatchSearchRequest, CrawlerApiResponse, SearchResult, BatchSearchResult
+from .config import UVICORN_PORT, UVICORN_LOG_LEVEL, SEARCH_ADMISSION_MAX_CONCURRENCY, SEARCH_ADMISSION_MAX_QUEUE, \
+    SEARCH_ADMISSION_QUEUE_TIMEOUT_SECONDS, PERPLEXITY_MAX_CONCURRENCY, OPENROUTER_MAX_CONCURRENCY, SEARCH_BATCH_MAX_ITEMS, \
+    ADMIN_ENDPOINTS_ENABLED, SEARCH_HEDGE_PRIMARY_TOOL, SEARCH_HEDGE_SECONDARY_TOOL, api_worker_share
 from .dao import TradebotDatabaseManagerAsync
+from .admission import AdmissionController, AdmissionRejected
+from .health import CrawlStatus, HealthMonitor
+from .diagnostics import registry, profiler, memory_tracker
 
 log = logging.getLogger(__name__)
 
+SEARCH_SECONDS = registry.histogram('crawler_search_request_seconds', 'Search request latency including admission wait and cache', ['tool'])
+
+def propagate_uvicorn_loggers():
+    """
+    Ensure Uvicorn loggers propagate to the root logger
+    """
+    loggers_to_propagate = (
+        "uvicorn",
+        "uvicorn.access",
+        "uvicorn.error",
+    )
+    for logger_name in loggers_to_propagate:
+        logging_logger = logging.getLogger(logger_name)
+        logging_logger.handlers = []  # Clear any existing handlers
+        logging_logger.propagate = True # Allow logs to reach the root logger
+
+def metrics_response() -> Response:
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
+
+def health_response(health_monitor: HealthMonitor) -> Response:
+    healthy, reason = health_monitor.health()
+    return Response(content=reason, status_code=200 if healthy else 500)
+
+def ready_response(health_monitor: HealthMonitor) -> JSONResponse:
+    ready, report = health_monitor.readiness()
+    return JSONResponse(report, status_code=200 if ready else 503)
+
+async def profile_endpoint(request: Request) -> JSONResponse:
+    """
+    Runtime profiling of this process, profiles are written to LOG_DIR/profiles
+    GET: armed profiles
+    POST {"kind": "crawl" | "search", "target": site like "flash_news/chaincatcher" | search tool | "*",
+          "count": int, "mode": "sample" | "cprofile"}: profile the next count matching runs, count 0 disarms
+    """
+    if request.method == 'POST':
+        try:
+            data = await request.json()
+            kind = data.get('kind')
+            target = data.get('target') or '*'
+            count = int(data.get('count', 1))
+            if count == 0:
+                profiler.disarm(kind, target)
+            else:
+                profiler.arm(kind, target, count, data.get('mode') or 'sample')
+        except Exception as e:
+            return JSONResponse({'detail': str(e)}, status_code=400)
+    return JSONResponse({'armed': profiler.status()})
+
+async def memory_endpoint(request: Request) -> JSONResponse:
+    """
+    RSS and live FlashNewsPo / ArticlePo / BeautifulSoup counts by site
+    Query: collect=true runs a full garbage collection first
+    """
+    collect = request.query_params.get('collect', 'false').lower() == 'true'
+    return JSONResponse(await memory_tracker.report(collect=collect))
+
+async def memory_snapshot_endpoint(request: Request) -> JSONResponse:
+    """
+    POST {"against": "previous" | "baseline", "top": int}: tracemalloc snapshot and the top allocation sites grown
+    since the previous / first snapshot, tracing starts with the first snapshot
+    DELETE: stop tracing and drop the snapshots
+    """
+    if request.method == 'DELETE':
+        await memory_tracker.stop_tracing()
+        return JSONResponse({'tracing': False})
+    try:
+        data = await request.json() if await request.body() else {}
+        return JSONResponse(await memory_tracker.snapshot(against=data.get('against') or 'previous', top=data.get('top')))
+    except ValueError as e:
+        return JSONResponse({'detail': str(e)}, status_code=400)
+
+def admin_routes() -> list[Route]:
+    """
+    /admin/* routes (profiling, memory), empty unless ADMIN_ENDPOINTS_ENABLED
+    """
+    if not ADMIN_ENDPOINTS_ENABLED:
+        return []
+    return [
+        Route('/admin/profile', profile_endpoint, methods=['GET', 'POST']),
+        Route('/admin/memory', memory_endpoint, methods=['GET']),
+        Route('/admin/memory/snapshot', memory_snapshot_endpoint, methods=['POST', 'DELETE']),
+    ]
+
 class Server:
-    def __init__(self, searcher_facade: SearcherFacade, tdbm: TradebotDatabaseManagerAsync):
+    def __init__(
+        self,
+        searcher_facade: SearcherFacade,
+        tdbm: TradebotDatabaseManagerAsync,
+        reuse_port: bool = False,
+        crawl_status: Optional[CrawlStatus] = None
+    ):
+        """
+        Args:
+            reuse_port: bind with SO_REUSEPORT so that several server processes share the port (split deployment),
+                without /metrics and /admin/* which would reach any of the processes
+            crawl_status: crawl outcomes reported by /ready, None when the crawler runs in another process
+        """
         self.__searcher_facade = searcher_facade
         self.__tdbm = tdbm
+        self.__health_monitor = HealthMonitor(tdbm, crawl_status)
+        tool_limits = {
+            SearchTool.PERPLEXITY.value: api_worker_share(PERPLEXITY_MAX_CONCURRENCY),
+            SearchTool.OPENROUTER.value: api_worker_share(OPENROUTER_MAX_CONCURRENCY),
+        }
+        self.__search_admission = AdmissionController(
+            scope='search',
+            max_concurrency=api_worker_share(SEARCH_ADMISSION_MAX_CONCURRENCY),
+            key_limits={
+                **tool_limits,
+                # a hedged search can hold a call of both its tools
+                SearchTool.HEDGED.value: min(tool_limits[SEARCH_HEDGE_PRIMARY_TOOL.value], tool_limits[SEARCH_HEDGE_SECONDARY_TOOL.value]),
+            },
+            max_queue=api_worker_share(SEARCH_ADMISSION_MAX_QUEUE),
+            queue_timeout=SEARCH_ADMISSION_QUEUE_TIMEOUT_SECONDS,
+        )
         
         self.app: Starlette = Starlette(debug=False, routes=[
             Route('/health', self.health_test_endpoint, methods=['GET']),
+            Route('/ready', self.ready_endpoint, methods=['GET']),
+            *([] if reuse_port else [Route('/metrics', self.metrics_endpoint, methods=['GET'])]),
             Route('/search', self.search_endpoint, methods=['POST']),
+            Route('/search/batch', self.search_batch_endpoint, methods=['POST']),
+            Route('/search/stream', self.search_stream_endpoint, methods=['POST']),
+            *([] if reuse_port else admin_routes()),
         ], exception_handlers={
             Exception: self.handle_error,
         })
@@ -32,19 +161,12 @@ class Server:
         - Other containers on the Docker network (via container name)
         - The host machine (via port mapping if configured)
         """
-        config = uvicorn.Config(self.app, host="0.0.0.0", port=UVICORN_PORT, log_level=UVICORN_LOG_LEVEL)
+        self.__host = "0.0.0.0"
+        self.__reuse_port = reuse_port
+        config = uvicorn.Config(self.app, host=self.__host, port=UVICORN_PORT, log_level=UVICORN_LOG_LEVEL)
         self.__uvicorn_server = uvicorn.Server(config)
 
-        # Ensure Uvicorn loggers propagate to the root logger
-        loggers_to_propagate = (
-            "uvicorn",
-            "uvicorn.access",
-            "uvicorn.error",
-        )
-        for logger_name in loggers_to_propagate:
-            logging_logger = logging.getLogger(logger_name)
-            logging_logger.handlers = []  # Clear any existing handlers
-            logging_logger.propagate = True # Allow logs to reach the root logger
+        propagate_uvicorn_loggers()
 
     async def handle_error(self, request: Request, exc: Exception) -> JSONResponse:
         return JSONResponse({
@@ -54,11 +176,78 @@ class Server:
     
     async def health_test_endpoint(self, request: Request) -> Response:
         """
-        Health test endpoint
+        Health test endpoint, answered from the last background database check
+        """
+        return health_response(self.__health_monitor)
+
+    async def ready_endpoint(self, request: Request) -> JSONResponse:
+        """
+        Readiness endpoint, 503 when the database is unhealthy or a crawled site is stale
+        Response body: {ready, database, crawling, sites: [{kind, site, fresh, lastSuccess, cycleLagSeconds,
+            lastPublishTime, publishLagSeconds, lastError}]}
+        """
+        return ready_response(self.__health_monitor)
+
+    async def metrics_endpoint(self, request: Request) -> Response:
+        """
+        Metrics in prometheus text format
+        """
+        return metrics_response()
+    
+    def __parse_search_request(self, data: DoSearchRequest) -> tuple[SearchTool, str, Optional[datetime], Optional[datetime]]:
+        """
+        Parse and validate DoSearchRequestDto into (tool, query, from_time, to_time)
         """
-        if not (await self.__tdbm.test_connection()):
-            return Response(content="Database connection failed", status_code=500)
-        return Response(content="OK", status_code=200)
+        # Parse search tool from string
+        tool_str = data.get('tool')
+        if not tool_str:
+            raise ValueError("Search tool is required")
+        tool = SearchTool(tool_str)
+        
+        # Get query
+        query = data.get('query')
+        if not query:
+            raise ValueError("Query is required")
+
+        # Get from_time
+        from_time = None
+        from_time_str = data.get('fromTime')
+        if from_time_str is not None:
+            from_time = datetime.fromisoformat(from_time_str)
+        
+        # Get to_time
+        to_time = None
+        to_time_str = data.get('toTime')
+        if to_time_str is not None:
+            to_time = datetime.fromisoformat(to_time_str)
+        return tool, query, from_time, to_time
+
+    async def __search(self, data: DoSearchRequest) -> list[SearchResult]:
+        """
+        Perform one search request under admission control
+        
+        Raises:
+            AdmissionRejected: no search slot is available
+        """
+        tool, query, from_time, to_time = self.__parse_search_request(data)
+
+        # Perform search once admitted
+        start = time.perf_counter()
+        async with self.__search_admission.admit(tool.value):
+            with profiler.profile('search', tool.value, uuid.uuid4().hex[:12]):
+                search_results = await self.__searcher_facade.search(
+                    tool=tool,
+                    query=query,
+                    from_time=from_time,
+                    to_time=to_time
+                )
+        SEARCH_SECONDS.observe(time.perf_counter() - start, tool=tool.value)
+        
+        # Convert search results to DTO format
+        return [
+            SearchResult(content=result['content'], url=result.get('url'))
+            for result in search_results
+        ]
     
     async def search_endpoint(self, request: Request) -> JSONResponse:
         """
@@ -68,43 +257,7 @@ class Server:
         """
         try:
             data: DoSearchRequest = await request.json()
-            
-            # Parse search tool from string
-            tool_str = data.get('tool')
-            if not tool_str:
-                raise ValueError("Search tool is required")
-            tool = SearchTool(tool_str)
-            
-            # Get query
-            query = data.get('query')
-            if not query:
-                raise ValueError("Query is required")
-
-            # Get from_time
-            from_time = None
-            from_time_str = data.get('fromTime')
-            if from_time_str is not None:
-                from_time = datetime.fromisoformat(from_time_str)
-            
-            # Get to_time
-            to_time = None
-            to_time_str = data.get('toTime')
-            if to_time_str is not None:
-                to_time = datetime.fromisoformat(to_time_str)
-            
-            # Perform search
-            search_results = await self.__searcher_facade.search(
-                tool=tool,
-                query=query,
-                from_time=from_time,
-                to_time=to_time
-            )
-            
-            # Convert search results to DTO format
-            result_dtos: list[SearchResult] = [
-                SearchResult(content=result['content'], url=result.get('url'))
-                for result in search_results
-            ]
+            result_dtos = await self.__search(data)
             
             # Return response in CrawlerApiResponse format
             response: CrawlerApiResponse = CrawlerApiResponse(
@@ -113,6 +266,15 @@ class Server:
                 result=result_dtos
             )
             return JSONResponse(content=response)
+
+        except AdmissionRejected as e:
+            log.warning(f"search request rejected: {e}")
+            rejected_response: CrawlerApiResponse = CrawlerApiResponse(
+                success=False,
+                errorMessage=str(e),
+                result=[]
+            )
+            return JSONResponse(content=rejected_response, status_code=429, headers={'Retry-After': str(e.retry_after)})
             
         except Exception as e:
             log.error(f"Error in search_endpoint: {e}", exc_info=True)
@@ -123,8 +285,177 @@ class Server:
             )
             return JSONResponse(content=error_response)
     
+    @staticmethod
+    def __sse_event(event: str, data: object) -> str:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    async def search_stream_endpoint(self, request: Request) -> Response:
+        """
+        Streaming search endpoint, forwards the answer as server-sent events while it is generated
+        Request body: DoSearchRequestDto (tool, query, fromTime, toTime)
+        Response body (text/event-stream):
+            event: chunk, data: {"content": str} for every generated text chunk
+            event: result, data: CrawlerApiResponse<List<SearchResultDto>> with the results /search returns, last event on success
+            event: error, data: CrawlerApiResponse with errorMessage, last event on failure
+        """
+        try:
+            data: DoSearchRequest = await request.json()
+            tool, query, from_time, to_time = self.__parse_search_request(data)
+            self.__search_admission.check(tool.value)
+        except AdmissionRejected as e:
+            log.warning(f"search stream request rejected: {e}")
+            rejected_response: CrawlerApiResponse = CrawlerApiResponse(
+                success=False,
+                errorMessage=str(e),
+                result=[]
+            )
+            return JSONResponse(content=rejected_response, status_code=429, headers={'Retry-After': str(e.retry_after)})
+        except Exception as e:
+            log.error(f"Error in search_stream_endpoint: {e}", exc_info=True)
+            error_response: CrawlerApiResponse = CrawlerApiResponse(
+                success=False,
+                errorMessage=str(e),
+                result=[]
+            )
+            return JSONResponse(content=error_response)
+
+        async def events() -> AsyncIterator[str]:
+            chunks: list[SearchStreamChunk] = []
+            try:
+                start = time.perf_counter()
+                # admitted inside the stream so that the slot is released however the stream ends
+                async with self.__search_admission.admit(tool.value):
+                    async for chunk in self.__searcher_facade.stream(tool=tool, query=query, from_time=from_time, to_time=to_time):
+                        chunks.append(chunk)
+                        yield self.__sse_event('chunk', {'content': chunk['content']})
+                SEARCH_SECONDS.observe(time.perf_counter() - start, tool=tool.value)
+                # the same results as /search
+                response: CrawlerApiResponse = CrawlerApiResponse(
+                    success=True,
+                    errorMessage='',
+                    result=[SearchResult(content=result['content'], url=result.get('url')) for result in stream_results(chunks)]
+                )
+                yield self.__sse_event('result', response)
+            except Exception as e:
+                log.error(f"Error in search stream: {e}", exc_info=not isinstance(e, AdmissionRejected))
+                error_response: CrawlerApiResponse = CrawlerApiResponse(
+                    success=False,
+                    errorMessage=str(e),
+                    result=[]
+                )
+                yield self.__sse_event('error', error_response)
+
+        return StreamingResponse(events(), media_type='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no', # disable proxy buffering
+        })
+
+    async def __search_batch_item(self, index: int, data: DoSearchRequest) -> BatchSearchResult:
+        try:
+            return BatchSearchResult(index=index, success=True, errorMessage='', result=await self.__search(data))
+        except Exception as e:
+            log.error(f"Error in batch search item {index}: {e}", exc_info=not isinstance(e, AdmissionRejected))
+            return BatchSearchResult(index=index, success=False, errorMessage=str(e), result=[])
+
+    async def search_batch_endpoint(self, request: Request) -> Response:
+        """
+        Batch search endpoint, items are searched concurrently under the same admission limits as /search
+        Request body: DoBatchSearchRequestDto (requests: List<DoSearchRequestDto>, stream)
+        Response body:
+            stream false: CrawlerApiResponse<List<BatchSearchResultDto>> in request order
+            stream true: one BatchSearchResultDto json per line (application/x-ndjson) as soon as each item completes
+        """
+        try:
+            data: DoBatchSearchRequest = await request.json()
+            items = data.get('requests')
+            if not items:
+                raise ValueError("Requests are required")
+            if len(items) > SEARCH_BATCH_MAX_ITEMS:
+                raise ValueError(f"At most {SEARCH_BATCH_MAX_ITEMS} requests per batch")
+        except Exception as e:
+            log.error(f"Error in search_batch_endpoint: {e}", exc_info=True)
+            error_response: CrawlerApiResponse = CrawlerApiResponse(
+                success=False,
+                errorMessage=str(e),
+                result=[]
+            )
+            return JSONResponse(content=error_response)
+
+        tasks = [asyncio.create_task(self.__search_batch_item(index, item)) for index, item in enumerate(items)]
+
+        if data.get('stream'):
+            async def ndjson_lines() -> AsyncIterator[str]:
+                try:
+                    for completed in asyncio.as_completed(tasks):
+                        yield json.dumps(await completed) + '\n'
+                finally:
+                    # client went away, stop the remaining searches
+                    for task in tasks:
+                        task.cancel()
+            return StreamingResponse(ndjson_lines(), media_type='application/x-ndjson')
+
+        try:
+            batch_results = list(await asyncio.gather(*tasks))
+        finally:
+            for task in tasks:
+                task.cancel()
+        response: CrawlerApiResponse = CrawlerApiResponse(
+            success=True,
+            errorMessage='',
+            result=batch_results
+        )
+        return JSONResponse(content=response)
+    
+    def __reuse_port_socket(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((self.__host, UVICORN_PORT))
+        return sock
+
     async def start(self):
-        await self.__uvicorn_server.serve()
+        await self.__health_monitor.start()
+        try:
+            if self.__reuse_port:
+                # the kernel balances new connections across all processes listening on the port
+                await self.__uvicorn_server.serve(sockets=[self.__reuse_port_socket()])
+            else:
+                await self.__uvicorn_server.serve()
+        finally:
+            await self.__health_monitor.stop()
     
     async def stop(self):
         self.__uvicorn_server.handle_exit(signal.SIGTERM, None)
+
+class MetricsServer:
+    """
+    Serves /health, /ready, /metrics and the admin routes only, for the scheduler process of the split deployment
+    which has no API server, and on a port of its own for every API worker
+    """
+    def __init__(self, port: int, tdbm: TradebotDatabaseManagerAsync, crawl_status: Optional[CrawlStatus], admin: bool = True):
+        self.__health_monitor = HealthMonitor(tdbm, crawl_status)
+        async def metrics_endpoint(request: Request) -> Response:
+            return metrics_response()
+        async def health_endpoint(request: Request) -> Response:
+            return health_response(self.__health_monitor)
+        async def ready_endpoint(request: Request) -> JSONResponse:
+            return ready_response(self.__health_monitor)
+        self.app: Starlette = Starlette(debug=False, routes=[
+            Route('/health', health_endpoint, methods=['GET']),
+            Route('/ready', ready_endpoint, methods=['GET']),
+            Route('/metrics', metrics_endpoint, methods=['GET']),
+            *(admin_routes() if admin else []),
+        ])
+        config = uvicorn.Config(self.app, host="0.0.0.0", port=port, log_level=UVICORN_LOG_LEVEL, access_log=False)
+        self.__uvicorn_server = uvicorn.Server(config)
+        propagate_uvicorn_loggers()
+
+    async def start(self):
+        await self.__health_monitor.start()
+        try:
+            await self.__uvicorn_server.serve()
+        finally:
+            await self.__health_monitor.stop()
+
+    async def stop(self):
+        self.__uvicorn_server.handle_exit(signal.SIGTERM, None)
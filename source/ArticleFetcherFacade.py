@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Optional
 from ..const import ArticleSite
 from ..po import ArticlePo
 from .article_fetcher import *
@@ -20,7 +21,55 @@ class ArticleFetcherFacade:
         Fetch articles from the given source.
         return in chronological order
         """
+        return await self.__fetcher(site).fetch(after=after)
+
+    async def fetch_contents(self, site: ArticleSite, urls: list[str]) -> dict[str, str]:
+        """
+        Fetch the current content of stored articles, by url
+        """
+        return await self.__fetcher(site).fetch_contents(urls)
+
+    async def fetch_listing(self, site: ArticleSite, after: datetime) -> list[ArticleListing]:
+        """
+        Articles listed by the site as published after the given time, without their detail pages
+        """
+        return await self.__fetcher(site).fetch_listing(after)
+
+    async def fetch_details(self, site: ArticleSite, listings: list[ArticleListing]) -> list[Optional[ArticlePo] | Exception]:
+        """
+        Fetch the detail pages of listed articles, per listing the article, None when there is none to store,
+        or the error
+        """
+        return await self.__fetcher(site).fetch_details(listings)
+
+    async def fetch_range(self, site: ArticleSite, start: datetime, end: datetime) -> list[ArticlePo]:
+        """
+        Fetch articles published in [start, end) for a backfill, sites without supports_range raise NotImplementedError
+        return in chronological order
+        """
+        return await self.__fetcher(site).fetch_range(start, end)
+
+    def supports_range(self, site: ArticleSite) -> bool:
+        """
+        Whether the site can be paged back to a past time range
+        """
+        return type(self.__fetcher(site)).fetch_range is not ArticleFetcher.fetch_range
+
+    async def fetch_listing_range(self, site: ArticleSite, start: datetime, end: datetime) -> list[ArticleListing]:
+        """
+        Articles listed by the site as published in [start, end), without their detail pages, for a backfill
+        return in chronological order
+        """
+        return await self.__fetcher(site).fetch_listing_range(start, end)
+
+    def supports_listing_range(self, site: ArticleSite) -> bool:
+        """
+        Whether a backfill walks the listing of the site once for the whole range instead of once per shard
+        """
+        return type(self.__fetcher(site)).fetch_listing_range is not ArticleFetcher.fetch_listing_range
+
+    def __fetcher(self, site: ArticleSite) -> ArticleFetcher:
         fetcher = self.__fetchers.get(site)
         if fetcher is None:
             raise ValueError(f"Unknown article site: {site}")
-        return await fetcher.fetch(after=after)
\ No newline at end of file
+        return fetcher
\ No newline at end of file
@@ -20,7 +20,23 @@ class FlashNewsFetcherFacade:
         after: fetch flash news published after this time
         return in chronological order
         """
+        return await self.__fetcher(site).fetch(after=after)
+
+    async def fetch_range(self, site: FlashNewsSite, start: datetime, end: datetime) -> list[FlashNewsPo]:
+        """
+        Fetch flash news published in [start, end) for a backfill, sites without supports_range raise NotImplementedError
+        return in chronological order
+        """
+        return await self.__fetcher(site).fetch_range(start, end)
+
+    def supports_range(self, site: FlashNewsSite) -> bool:
+        """
+        Whether the site can be paged back to a past time range, most sites only list their latest news
+        """
+        return type(self.__fetcher(site)).fetch_range is not FlashNewsFetcher.fetch_range
+
+    def __fetcher(self, site: FlashNewsSite) -> FlashNewsFetcher:
         fetcher = self.__fetchers.get(site)
         if fetcher is None:
             raise ValueError(f"Unknown flash news site: {site}")
-        return await fetcher.fetch(after=after)
\ No newline at end of file
+        return fetcher
@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+import aiohttp
+
+from ..diagnostics import registry
+
+RATE_LIMIT_WAIT_SECONDS = registry.histogram('crawler_http_rate_limit_wait_seconds', 'Time a request waited for its host rate limit', ['host'])
+
+class HostRateLimiter:
+    """
+    Requests per second limit by host, shared by every session the middleware is added to
+    (HttpSessionFactory.add_session_middleware). Requests to a host are started at least 1 / rate seconds apart
+    in the order they arrive, a host with rate <= 0 is not limited.
+    """
+    def __init__(self, requests_per_second: float, host_limits: dict[str, float]):
+        """
+        Args:
+            requests_per_second: limit of hosts not in host_limits
+            host_limits: host -> requests per second, e.g. {'insights.glassnode.com': 0.5}
+        """
+        self.__requests_per_second = requests_per_second
+        self.__host_limits = dict(host_limits)
+        # host -> monotonic time the next request to the host may start at
+        self.__next_start: dict[str, float] = {}
+
+    async def wait(self, host: str):
+        rate = self.__host_limits.get(host, self.__requests_per_second)
+        if rate <= 0:
+            return
+        now = time.monotonic()
+        start = max(now, self.__next_start.get(host, now))
+        # reserve the slot before sleeping so that concurrent requests queue up behind each other
+        self.__next_start[host] = start + 1 / rate
+        if start > now:
+            RATE_LIMIT_WAIT_SECONDS.observe(start - now, host=host)
+            await asyncio.sleep(start - now)
+
+    async def middleware(self, request: aiohttp.ClientRequest, handler: aiohttp.ClientHandlerType) -> aiohttp.ClientResponse:
+        await self.wait(request.url.host or '')
+        return await handler(request)
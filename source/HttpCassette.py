@@ -0,0 +1,235 @@
+import asyncio
+import base64
+import gzip
+import json
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+import aiohttp
+from aiohttp import web
+from multidict import CIMultiDict
+from yarl import URL
+
+from ..config import HTTP_CASSETTE_MODE, HTTP_CASSETTE_PATH, HTTP_CASSETTE_TIMING
+from .HttpSessionFactory import add_session_middleware, remove_session_middleware, set_url_rewrites
+
+import logging
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODES = ('off', 'record', 'replay')
+CASSETTE_TIMINGS = ('recorded', 'fast')
+CASSETTE_VERSION = 1
+
+# bodies are stored decoded, the replayed response sets its own framing
+_SKIPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'keep-alive'}
+
+class CassetteRecorder:
+    """
+    Writes every crawler request and response to a gzipped json lines cassette, one interaction per line:
+    method, url, status, reason, headers, base64 body, start offset, time to headers and total duration in seconds.
+    Bodies are read before the response is handed to the fetcher, requests that fail without response are not recorded.
+    """
+    def __init__(self, path: str):
+        self.__path = path
+        self.__file: Optional[gzip.GzipFile] = None
+        self.__lock = asyncio.Lock()
+        self.__started = 0.0
+        self.interactions = 0
+
+    def open(self):
+        self.__file = gzip.open(self.__path, 'wb')
+        self.__started = time.perf_counter()
+        self.__write({'version': CASSETTE_VERSION, 'recorded': datetime.now(timezone.utc).isoformat()})
+        add_session_middleware(self.middleware)
+
+    async def close(self):
+        remove_session_middleware(self.middleware)
+        async with self.__lock:
+            if self.__file is not None:
+                await asyncio.to_thread(self.__file.close)
+                self.__file = None
+
+    def __write(self, entry: dict[str, Any]):
+        assert self.__file is not None
+        self.__file.write(json.dumps(entry, separators=(',', ':')).encode('utf-8') + b'\n')
+
+    async def middleware(self, request: aiohttp.ClientRequest, handler: aiohttp.ClientHandlerType) -> aiohttp.ClientResponse:
+        method, url = request.method, str(request.url)
+        start = time.perf_counter()
+        response = await handler(request)
+        headers_time = time.perf_counter()
+        body = await response.read()
+        end = time.perf_counter()
+        entry = {
+            'method': method,
+            'url': url,
+            'status': response.status,
+            'reason': response.reason,
+            'headers': [[key, value] for key, value in response.headers.items() if key.lower() not in _SKIPPED_HEADERS],
+            'body': base64.b64encode(body).decode('ascii'),
+            'start': round(start - self.__started, 6),
+            'ttfb': round(headers_time - start, 6),
+            'duration': round(end - start, 6),
+        }
+        async with self.__lock:
+            if self.__file is not None:
+                await asyncio.to_thread(self.__write, entry)
+                self.interactions += 1
+        return response
+
+class CassetteReplayServer:
+    """
+    Answers the crawler requests from a cassette. Serves on a local port from its own thread and event loop,
+    so that replaying costs the crawler loop nothing but the socket io, requests reach it through url rewrites
+    of every recorded origin: https://host/path -> http://127.0.0.1:port/https/host/path.
+    Repeated requests get the recorded responses in order, the last one once they run out, unknown requests a 404.
+    With timing 'recorded' every response takes as long as it did when recorded, with 'fast' it is sent at once.
+    """
+    def __init__(self, path: str, timing: str = 'recorded', host: str = '127.0.0.1'):
+        self.__path = path
+        self.__timing = timing
+        self.__host = host
+        self.__port = 0
+        self.__interactions: dict[tuple[str, str], list[dict[str, Any]]] = defaultdict(list)
+        self.__served: dict[tuple[str, str], int] = defaultdict(int)
+        self.__thread: Optional[threading.Thread] = None
+        self.__loop: Optional[asyncio.AbstractEventLoop] = None
+        self.__stop: Optional[asyncio.Event] = None
+        self.misses = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.__host}:{self.__port}"
+
+    def __load(self):
+        with gzip.open(self.__path, 'rb') as f:
+            header = json.loads(f.readline())
+            if header.get('version') != CASSETTE_VERSION:
+                raise ValueError(f"Unsupported cassette version {header.get('version')} in {self.__path}")
+            for line in f:
+                entry = json.loads(line)
+                self.__interactions[(entry['method'], entry['url'])].append(entry)
+
+    def url_rewrites(self) -> dict[str, str]:
+        origins = {str(URL(url).origin()) for _, url in self.__interactions}
+        return {origin: f"{self.base_url}/{origin.replace('://', '/', 1)}" for origin in origins}
+
+    def start(self):
+        """
+        Load the cassette and start serving, blocks until the server listens
+        """
+        self.__load()
+        ready = threading.Event()
+        errors: list[BaseException] = []
+        self.__thread = threading.Thread(target=self.__run, args=(ready, errors), name='cassette-replay', daemon=True)
+        self.__thread.start()
+        ready.wait()
+        if errors:
+            raise errors[0]
+        set_url_rewrites(self.url_rewrites())
+        logger.info(f"replaying {sum(len(v) for v in self.__interactions.values())} interactions from {self.__path}, timing: {self.__timing}")
+
+    def stop(self):
+        """
+        Stop serving, blocks until the server thread exits
+        """
+        if self.__thread is None:
+            return
+        set_url_rewrites({})
+        assert self.__loop is not None and self.__stop is not None
+        self.__loop.call_soon_threadsafe(self.__stop.set)
+        self.__thread.join()
+        self.__thread = None
+
+    def __run(self, ready: threading.Event, errors: list[BaseException]):
+        self.__loop = asyncio.new_event_loop()
+        try:
+            self.__loop.run_until_complete(self.__serve(ready))
+        except BaseException as e:
+            errors.append(e)
+            ready.set()
+        finally:
+            self.__loop.close()
+
+    async def __serve(self, ready: threading.Event):
+        self.__stop = asyncio.Event()
+        app = web.Application()
+        app.router.add_route('*', '/{scheme}/{authority}/{tail:.*}', self.__handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        try:
+            site = web.TCPSite(runner, self.__host, 0)
+            await site.start()
+            self.__port = site._server.sockets[0].getsockname()[1] # type: ignore
+            ready.set()
+            await self.__stop.wait()
+        finally:
+            await runner.cleanup()
+
+    async def __handle(self, request: web.Request) -> web.StreamResponse:
+        # raw path keeps the encoding of the original url
+        _, scheme, authority, rest = request.raw_path.split('/', 3)
+        key = (request.method, f"{scheme}://{authority}/{rest}")
+        entries = self.__interactions.get(key)
+        if not entries:
+            self.misses += 1
+            logger.warning(f"no recorded response for {key[0]} {key[1]}")
+            return web.Response(status=404, text='not in cassette')
+        entry = entries[min(self.__served[key], len(entries) - 1)]
+        self.__served[key] += 1
+        if self.__timing == 'recorded':
+            await asyncio.sleep(entry['ttfb'])
+        response = web.StreamResponse(status=entry['status'], reason=entry['reason'], headers=CIMultiDict(entry['headers']))
+        body = base64.b64decode(entry['body'])
+        response.content_length = len(body)
+        await response.prepare(request)
+        if self.__timing == 'recorded':
+            await asyncio.sleep(max(0.0, entry['duration'] - entry['ttfb']))
+        await response.write(body)
+        await response.write_eof()
+        return response
+
+class HttpCassette:
+    """
+    HTTP record / replay of the crawler requests (HTTP_CASSETTE_MODE), to reproduce a crawl cycle offline
+    for profiling and comparing fetcher changes. Applies to the sessions created by HttpSessionFactory.
+    """
+    def __init__(self, mode: str, path: str, timing: str):
+        self.__mode = mode
+        self.__path = path
+        self.__timing = timing
+        self.__recorder: Optional[CassetteRecorder] = None
+        self.__replay_server: Optional[CassetteReplayServer] = None
+
+    @property
+    def mode(self) -> str:
+        return self.__mode
+
+    async def start(self):
+        if self.__mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown http cassette mode: {self.__mode}")
+        if self.__timing not in CASSETTE_TIMINGS:
+            raise ValueError(f"Unknown http cassette timing: {self.__timing}")
+        if self.__mode == 'record':
+            self.__recorder = CassetteRecorder(self.__path)
+            await asyncio.to_thread(self.__recorder.open)
+            logger.info(f"recording http interactions to {self.__path}")
+        elif self.__mode == 'replay':
+            self.__replay_server = CassetteReplayServer(self.__path, self.__timing)
+            await asyncio.to_thread(self.__replay_server.start)
+
+    async def stop(self):
+        if self.__recorder is not None:
+            await self.__recorder.close()
+            logger.info(f"recorded {self.__recorder.interactions} http interactions to {self.__path}")
+            self.__recorder = None
+        if self.__replay_server is not None:
+            await asyncio.to_thread(self.__replay_server.stop)
+            if self.__replay_server.misses:
+                logger.warning(f"{self.__replay_server.misses} requests were not in the cassette {self.__path}")
+            self.__replay_server = None
+
+http_cassette = HttpCassette(HTTP_CASSETTE_MODE, HTTP_CASSETTE_PATH, HTTP_CASSETTE_TIMING)
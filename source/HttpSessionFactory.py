@@ -0,0 +1,84 @@
+import time
+from typing import Any
+
+import aiohttp
+from yarl import URL
+
+from ..config import HTTP_URL_REWRITES
+from ..diagnostics import registry
+
+HTTP_REQUEST_SECONDS = registry.histogram('crawler_http_request_seconds', 'Crawler HTTP request latency until response headers', ['kind', 'site'])
+HTTP_RESPONSES = registry.counter('crawler_http_responses_total', 'Crawler HTTP responses by status', ['kind', 'site', 'status'])
+HTTP_RESPONSE_BYTES = registry.counter('crawler_http_response_bytes_total', 'Crawler HTTP response body bytes read', ['kind', 'site'])
+HTTP_ERRORS = registry.counter('crawler_http_errors_total', 'Crawler HTTP requests failed without response', ['kind', 'site', 'error'])
+
+def _metrics_trace_config(kind: str, site: str) -> aiohttp.TraceConfig:
+    async def on_request_start(session: aiohttp.ClientSession, context: Any, params: aiohttp.TraceRequestStartParams):
+        context.start = time.perf_counter()
+
+    async def on_request_end(session: aiohttp.ClientSession, context: Any, params: aiohttp.TraceRequestEndParams):
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - context.start, kind=kind, site=site)
+        HTTP_RESPONSES.inc(kind=kind, site=site, status=str(params.response.status))
+
+    async def on_response_chunk_received(session: aiohttp.ClientSession, context: Any, params: aiohttp.TraceResponseChunkReceivedParams):
+        # ClientResponse.read() reports the whole body as one chunk
+        HTTP_RESPONSE_BYTES.inc(len(params.chunk), kind=kind, site=site)
+
+    async def on_request_exception(session: aiohttp.ClientSession, context: Any, params: aiohttp.TraceRequestExceptionParams):
+        HTTP_ERRORS.inc(kind=kind, site=site, error=type(params.exception).__name__)
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_response_chunk_received.append(on_response_chunk_received)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
+
+# origin (scheme://host[:port]) -> base url that requests to the origin are sent to instead
+_url_rewrites: dict[str, str] = dict(HTTP_URL_REWRITES)
+
+def set_url_rewrites(rewrites: dict[str, str]):
+    """
+    Send requests for the given origins to other base urls, e.g. {'https://www.chaincatcher.com': 'http://127.0.0.1:8900/chaincatcher'}
+    redirects https://www.chaincatcher.com/en/news to http://127.0.0.1:8900/chaincatcher/en/news. Applies to sessions created afterwards.
+    """
+    _url_rewrites.clear()
+    _url_rewrites.update({origin.rstrip('/'): base_url.rstrip('/') for origin, base_url in rewrites.items()})
+
+async def _url_rewrite_middleware(request: aiohttp.ClientRequest, handler: aiohttp.ClientHandlerType) -> aiohttp.ClientResponse:
+    base_url = _url_rewrites.get(str(request.url.origin()))
+    if base_url is not None:
+        # the response keeps reporting the original url
+        url = URL(f"{base_url}{request.url.raw_path_qs}", encoded=True)
+        request.url = url
+        request.update_host(url)
+        request.headers['Host'] = url.raw_authority
+    return await handler(request)
+
+# applied to every session created afterwards, outermost first, e.g. the cassette recorder
+_session_middlewares: list[aiohttp.ClientMiddlewareType] = []
+
+def add_session_middleware(middleware: aiohttp.ClientMiddlewareType):
+    _session_middlewares.append(middleware)
+
+def remove_session_middleware(middleware: aiohttp.ClientMiddlewareType):
+    if middleware in _session_middlewares:
+        _session_middlewares.remove(middleware)
+
+def create_session(kind: str, site: str, **session_kwargs: Any) -> aiohttp.ClientSession:
+    """
+    aiohttp session for crawling a site, every request is recorded in the crawler_http_* metrics.
+    Requests to origins with a url rewrite (HTTP_URL_REWRITES, set_url_rewrites) go to the rewritten url,
+    session middlewares (add_session_middleware) see the original url.
+
+    Args:
+        kind: 'flash_news' or 'article'
+        site: site enum value
+        session_kwargs: passed to aiohttp.ClientSession, e.g. timeout
+    """
+    middlewares = [*_session_middlewares]
+    if _url_rewrites:
+        middlewares.append(_url_rewrite_middleware)
+    if middlewares:
+        session_kwargs['middlewares'] = (*middlewares, *session_kwargs.get('middlewares', ()))
+    return aiohttp.ClientSession(trace_configs=[_metrics_trace_config(kind, site)], **session_kwargs)
@@ -0,0 +1,25 @@
+from collections import deque
+from typing import Optional
+
+
+class LatencyTracker:
+    """
+    Latencies of the most recent window calls, for quantile estimates that follow the current upstream behaviour.
+    """
+    def __init__(self, window: int):
+        self.__samples: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.__samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Nearest rank quantile of the recorded latencies, None when nothing is recorded yet
+        """
+        if not self.__samples:
+            return None
+        ordered = sorted(self.__samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def __len__(self) -> int:
+        return len(self.__samples)
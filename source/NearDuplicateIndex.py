@@ -0,0 +1,201 @@
+import heapq
+import re
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Optional
+
+from ..po.FlashNewsPo import FlashNewsPo
+from ..diagnostics import registry
+from ..hashing import hash64
+
+NEAR_DUPLICATES = registry.counter('crawler_flash_news_near_duplicates_total',
+                                   'Flash news marked as near duplicate of an earlier one', ['site', 'cluster_site'])
+
+# "[Category: x] " / "[类别: x] " prefixes the fetchers put in front of titles
+_CATEGORY_PREFIX = re.compile(r'^\s*\[[^\]]*\]\s*')
+# latin words and numbers as one token, every other letter (CJK) as a token of its own
+_TOKEN = re.compile(r'[0-9a-z]+|[^\W\d_]')
+
+# numbers with their thousands separators and decimals, compared as a whole
+_NUMBER = re.compile(r'\d+(?:[,.]\d+)*')
+
+_EMPTY = 1 << 64
+
+def normalize(title: str) -> str:
+    return unicodedata.normalize('NFKC', _CATEGORY_PREFIX.sub('', title)).lower()
+
+def shingles(text: str, size: int) -> frozenset[str]:
+    """
+    Overlapping runs of size tokens of the normalized text
+    """
+    tokens = _TOKEN.findall(text)
+    if len(tokens) <= size:
+        return frozenset({' '.join(tokens)} if tokens else ())
+    return frozenset(' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1))
+
+def numbers(text: str) -> frozenset[str]:
+    return frozenset(number.replace(',', '') for number in _NUMBER.findall(text))
+
+def minhash(features: frozenset[str], size: int) -> list[int]:
+    """
+    One permutation MinHash signature: the shingle hashes are spread over size bins by their low bits, each bin keeps
+    the smallest, an empty bin takes the value of the next bin that is not, offset by the distance (densification).
+    The share of equal values of two signatures estimates the Jaccard similarity of the features, at the cost of
+    one hash per shingle instead of one per shingle and signature value.
+    """
+    bins = [_EMPTY] * size
+    for feature in features:
+        h = hash64(feature.encode('utf-8'))
+        i = h % size
+        value = h // size
+        if value < bins[i]:
+            bins[i] = value
+    if not features:
+        return bins
+    signature = bins[:]
+    for i in range(size):
+        distance = 0
+        while bins[(i + distance) % size] == _EMPTY:
+            distance += 1
+        if distance:
+            signature[i] = bins[(i + distance) % size] + distance * _EMPTY
+    return signature
+
+class _Entry:
+    __slots__ = ('features', 'numbers', 'publish_time', 'cluster_md5', 'site', 'title_md5', 'band_keys')
+
+    def __init__(self, features: frozenset[str], numbers: frozenset[str], band_keys: list[int], news: FlashNewsPo,
+                 cluster_md5: str):
+        self.features = features
+        self.numbers = numbers
+        self.band_keys = band_keys
+        self.publish_time = news.publish_time
+        self.cluster_md5 = cluster_md5
+        self.site = news.site.value
+        self.title_md5 = news.title_md5
+
+    def is_news(self, news: FlashNewsPo) -> bool:
+        return self.title_md5 == news.title_md5 and self.site == news.site.value and self.publish_time == news.publish_time
+
+class NearDuplicateIndex:
+    """
+    Near duplicate detection of flash news titles across sites, MinHash signatures of the title shingles in an LSH
+    index over a sliding publish time window.
+    The signature is split in bands of rows_per_band values, titles sharing a band are candidates, likely from a
+    Jaccard similarity of about (1 / bands) ** (1 / rows_per_band) on. A candidate is a near duplicate when the exact
+    Jaccard similarity of the shingles reaches threshold and the numbers of one title are all in the other, which
+    keeps "BTC above 70,000" and "ETH above 4,000" apart. A news gets the cluster_md5 of the most similar earlier
+    news within window, or its own title_md5 when there is none.
+    Titles in different languages are not matched.
+    """
+    def __init__(self, threshold: float = 0.4, window: timedelta = timedelta(hours=6), shingle_size: int = 2,
+                 bands: int = 16, rows_per_band: int = 2, min_shingles: int = 4):
+        """
+        Args:
+            threshold: smallest Jaccard similarity of the title shingles of near duplicates
+            window: largest publish time difference of near duplicates
+            shingle_size: tokens per shingle, a token is a latin word, a number or a CJK character
+            bands, rows_per_band: LSH banding of the MinHash signature of bands * rows_per_band values
+            min_shingles: titles with fewer shingles are too short to compare and get their own cluster
+        """
+        self.__threshold = threshold
+        self.__window = window
+        self.__shingle_size = shingle_size
+        self.__bands = bands
+        self.__rows_per_band = rows_per_band
+        self.__min_shingles = min_shingles
+        self.__buckets: list[dict[int, list[_Entry]]] = [{} for _ in range(bands)]
+        # (publish timestamp, insertion counter, entry) for eviction
+        self.__heap: list[tuple[float, int, _Entry]] = []
+        self.__counter = 0
+        self.__newest: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self.__heap)
+
+    def __entry(self, news: FlashNewsPo) -> Optional[_Entry]:
+        text = normalize(news.title)
+        features = shingles(text, self.__shingle_size)
+        if len(features) < self.__min_shingles:
+            return None
+        signature = minhash(features, self.__bands * self.__rows_per_band)
+        rows = self.__rows_per_band
+        band_keys = [hash(tuple(signature[band * rows:(band + 1) * rows])) for band in range(self.__bands)]
+        return _Entry(features, numbers(text), band_keys, news, news.cluster_md5 or news.title_md5)
+
+    def add(self, news: FlashNewsPo):
+        """
+        Index a stored news with the cluster it was given, to seed the window after a restart or to add the news
+        other crawler replicas stored. News already indexed are skipped.
+        """
+        entry = self.__entry(news)
+        if entry is not None and not self.__contains(entry, news):
+            self.__add(entry)
+
+    def __contains(self, entry: _Entry, news: FlashNewsPo) -> bool:
+        # the same title has the same signature, so it shares every band and looking into one is enough
+        return any(candidate.is_news(news) for candidate in self.__buckets[0].get(entry.band_keys[0], ()))
+
+    def assign(self, news_list: list[FlashNewsPo]) -> int:
+        """
+        Set cluster_md5 of the news and index them, in publish time order so that the earliest news of an event
+        names its cluster
+
+        Returns:
+            number of news marked as near duplicate of an earlier one
+        """
+        duplicates = 0
+        for news in sorted(news_list, key=lambda po: po.publish_time):
+            news.cluster_md5 = news.title_md5
+            entry = self.__entry(news)
+            if entry is None:
+                continue
+            match = self.__closest(entry, news)
+            if match is not None:
+                news.cluster_md5 = entry.cluster_md5 = match.cluster_md5
+                if match.is_news(news):
+                    # fetched again, already indexed
+                    continue
+                duplicates += 1
+                NEAR_DUPLICATES.inc(site=news.site.value, cluster_site=match.site)
+            self.__add(entry)
+        return duplicates
+
+    def __closest(self, entry: _Entry, news: FlashNewsPo) -> Optional[_Entry]:
+        best: Optional[_Entry] = None
+        best_similarity = self.__threshold
+        seen: set[int] = set()
+        for key, buckets in zip(entry.band_keys, self.__buckets):
+            for candidate in buckets.get(key, ()):
+                if id(candidate) in seen:
+                    continue
+                seen.add(id(candidate))
+                if candidate.is_news(news):
+                    return candidate
+                if abs(candidate.publish_time - news.publish_time) > self.__window:
+                    continue
+                if not (entry.numbers <= candidate.numbers or candidate.numbers <= entry.numbers):
+                    continue
+                similarity = len(entry.features & candidate.features) / len(entry.features | candidate.features)
+                if similarity >= best_similarity:
+                    best, best_similarity = candidate, similarity
+        return best
+
+    def __add(self, entry: _Entry):
+        for key, buckets in zip(entry.band_keys, self.__buckets):
+            buckets.setdefault(key, []).append(entry)
+        self.__counter += 1
+        heapq.heappush(self.__heap, (entry.publish_time.timestamp(), self.__counter, entry))
+        if self.__newest is None or entry.publish_time > self.__newest:
+            self.__newest = entry.publish_time
+        self.__evict(self.__newest - self.__window)
+
+    def __evict(self, before: datetime):
+        threshold = before.timestamp()
+        while self.__heap and self.__heap[0][0] < threshold:
+            _, _, entry = heapq.heappop(self.__heap)
+            for key, buckets in zip(entry.band_keys, self.__buckets):
+                bucket = buckets[key]
+                bucket.remove(entry)
+                if not bucket:
+                    del buckets[key]
@@ -0,0 +1,147 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+
+from ..const import SearchTool
+from .types import SearchResultDict
+
+import logging
+logger = logging.getLogger(__name__)
+
+type SearchCacheKey = tuple[SearchTool, str, Optional[str], Optional[str]]
+
+@dataclass(eq=False)
+class _CacheEntry:
+    results: list[SearchResultDict]
+    size: int
+    expire_at: float
+
+class SearchResultCache:
+    """
+    In-memory LRU cache for search results with single-flight deduplication.
+
+    The TTL of an entry grows with the age of the searched time window: a window ending now
+    may still get new results, a window that ended weeks ago will not.
+    ttl = clamp((now - to_time) * ttl_age_ratio, min_ttl, max_ttl), to_time None means now.
+    """
+    def __init__(self, max_entries: int, max_bytes: int, min_ttl: float, max_ttl: float, ttl_age_ratio: float):
+        self.__max_entries = max_entries
+        self.__max_bytes = max_bytes
+        self.__min_ttl = min_ttl
+        self.__max_ttl = max_ttl
+        self.__ttl_age_ratio = ttl_age_ratio
+        self.__entries: OrderedDict[SearchCacheKey, _CacheEntry] = OrderedDict()
+        self.__total_bytes = 0
+        self.__in_flight: dict[SearchCacheKey, asyncio.Task[list[SearchResultDict]]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    @staticmethod
+    def normalize_time(value: Optional[datetime]) -> Optional[str]:
+        """
+        Searchers only filter by date, so times are normalized to the UTC date.
+        Naive datetimes are treated as UTC.
+        """
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc).date().isoformat()
+
+    @staticmethod
+    def make_key(tool: SearchTool, query: str, from_time: Optional[datetime], to_time: Optional[datetime]) -> SearchCacheKey:
+        return (
+            tool,
+            ' '.join(query.split()),
+            SearchResultCache.normalize_time(from_time),
+            SearchResultCache.normalize_time(to_time),
+        )
+
+    def ttl(self, to_time: Optional[datetime]) -> float:
+        if to_time is None:
+            return self.__min_ttl
+        if to_time.tzinfo is None:
+            to_time = to_time.replace(tzinfo=timezone.utc)
+        window_age = (datetime.now(timezone.utc) - to_time).total_seconds()
+        return min(self.__max_ttl, max(self.__min_ttl, window_age * self.__ttl_age_ratio))
+
+    def lookup(self, tool: SearchTool, query: str, from_time: Optional[datetime], to_time: Optional[datetime]) -> Optional[list[SearchResultDict]]:
+        entry = self.__get(self.make_key(tool, query, from_time, to_time))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return list(entry.results)
+
+    def store(self, tool: SearchTool, query: str, from_time: Optional[datetime], to_time: Optional[datetime], results: list[SearchResultDict]):
+        self.__put(self.make_key(tool, query, from_time, to_time), results, self.ttl(to_time))
+
+    async def get_or_load(
+        self,
+        tool: SearchTool,
+        query: str,
+        from_time: Optional[datetime],
+        to_time: Optional[datetime],
+        loader: Callable[[], Awaitable[list[SearchResultDict]]]
+    ) -> list[SearchResultDict]:
+        """
+        Return cached results or call loader once for all concurrent callers of the same key.
+        Failed loads are not cached.
+        """
+        key = self.make_key(tool, query, from_time, to_time)
+        entry = self.__get(key)
+        if entry is not None:
+            self.hits += 1
+            return list(entry.results)
+
+        task = self.__in_flight.get(key)
+        if task is not None:
+            self.shared += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(self.__load(key, to_time, loader))
+            self.__in_flight[key] = task
+        # shield so that one cancelled caller (e.g. client disconnect) does not cancel the shared upstream call
+        return list(await asyncio.shield(task))
+
+    async def __load(self, key: SearchCacheKey, to_time: Optional[datetime], loader: Callable[[], Awaitable[list[SearchResultDict]]]) -> list[SearchResultDict]:
+        try:
+            results = await loader()
+            self.__put(key, results, self.ttl(to_time))
+            return results
+        finally:
+            self.__in_flight.pop(key, None)
+
+    def __get(self, key: SearchCacheKey) -> Optional[_CacheEntry]:
+        entry = self.__entries.get(key)
+        if entry is None:
+            return None
+        if entry.expire_at <= time.monotonic():
+            self.__remove(key)
+            return None
+        self.__entries.move_to_end(key)
+        return entry
+
+    def __put(self, key: SearchCacheKey, results: list[SearchResultDict], ttl: float):
+        size = sum(len(result['content']) + len(result.get('url') or '') for result in results)
+        if size > self.__max_bytes:
+            logger.debug(f"search result of {size} bytes exceeds cache capacity, not cached")
+            return
+        self.__remove(key)
+        self.__entries[key] = _CacheEntry(results=results, size=size, expire_at=time.monotonic() + ttl)
+        self.__total_bytes += size
+        while len(self.__entries) > self.__max_entries or self.__total_bytes > self.__max_bytes:
+            oldest_key = next(iter(self.__entries))
+            self.__remove(oldest_key)
+
+    def __remove(self, key: SearchCacheKey):
+        entry = self.__entries.pop(key, None)
+        if entry is not None:
+            self.__total_bytes -= entry.size
+
+    def __len__(self) -> int:
+        return len(self.__entries)
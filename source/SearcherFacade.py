@@ -1,16 +1,54 @@
+import asyncio
+import time
 from datetime import datetime
-from typing import Optional
+from typing import AsyncIterator, Optional
 from ..const import SearchTool
+from ..config import SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_MAX_BYTES, SEARCH_CACHE_MIN_TTL_SECONDS, \
+    SEARCH_CACHE_MAX_TTL_SECONDS, SEARCH_CACHE_TTL_AGE_RATIO, SEARCH_HEDGE_PRIMARY_TOOL, SEARCH_HEDGE_SECONDARY_TOOL, \
+    SEARCH_HEDGE_DELAY_SECONDS, SEARCH_HEDGE_DELAY_QUANTILE, SEARCH_HEDGE_MIN_DELAY_SECONDS, SEARCH_HEDGE_MAX_DELAY_SECONDS, \
+    SEARCH_HEDGE_MIN_SAMPLES, SEARCH_LATENCY_WINDOW, PERPLEXITY_MAX_CONCURRENCY, OPENROUTER_MAX_CONCURRENCY, api_worker_share
+from ..diagnostics import registry
 from .searcher import *
-from .types import SearchResultDict
+from .types import SearchResultDict, SearchStreamChunk
+from .SearchResultCache import SearchResultCache
+from .LatencyTracker import LatencyTracker
+
+import logging
+logger = logging.getLogger(__name__)
+
+HEDGES_LAUNCHED = registry.counter('crawler_search_hedges_total', 'Hedged searches that started the secondary tool', ['tool'])
+HEDGE_WINS = registry.counter('crawler_search_hedge_wins_total', 'Hedged searches answered by the tool', ['tool'])
+UPSTREAM_SECONDS = registry.histogram('crawler_search_upstream_seconds', 'Latency of search tool calls', ['tool', 'outcome'])
 
 
 class SearcherFacade:
-    def __init__(self):
-        self.__searchers: dict[SearchTool, Searcher] = {
-            SearchTool.PERPLEXITY : PerplexitySearcher(),
-            SearchTool.OPENROUTER : OpenrouterSearcher(),
+    def __init__(self, searchers: Optional[dict[SearchTool, Searcher]] = None):
+        """
+        Args:
+            searchers: searchers to use instead of the configured clients (load tests)
+        """
+        self.__searchers: dict[SearchTool, Searcher] = searchers if searchers is not None else {
+            SearchTool.PERPLEXITY : PerplexitySearcher(max_concurrency=api_worker_share(PERPLEXITY_MAX_CONCURRENCY)),
+            SearchTool.OPENROUTER : OpenrouterSearcher(max_concurrency=api_worker_share(OPENROUTER_MAX_CONCURRENCY)),
+        }
+        self.__latencies: dict[SearchTool, LatencyTracker] = {
+            tool: LatencyTracker(SEARCH_LATENCY_WINDOW) for tool in self.__searchers
         }
+        self.__cache: Optional[SearchResultCache] = None
+        if SEARCH_CACHE_MAX_ENTRIES > 0:
+            self.__cache = SearchResultCache(
+                max_entries=SEARCH_CACHE_MAX_ENTRIES,
+                max_bytes=SEARCH_CACHE_MAX_BYTES,
+                min_ttl=SEARCH_CACHE_MIN_TTL_SECONDS,
+                max_ttl=SEARCH_CACHE_MAX_TTL_SECONDS,
+                ttl_age_ratio=SEARCH_CACHE_TTL_AGE_RATIO,
+            )
+
+    def __get_searcher(self, tool: SearchTool) -> Searcher:
+        searcher = self.__searchers.get(tool)
+        if searcher is None:
+            raise ValueError(f"Unknown search tool: {tool}")
+        return searcher
 
     async def search(
         self, 
@@ -21,9 +59,158 @@ class SearcherFacade:
     ) -> list[SearchResultDict]:
         """
         Search using the given tool with the provided query.
+        Identical requests are served from the cache, concurrent identical requests share one upstream call.
         return results in relevance order as list of dicts
         """
-        searcher = self.__searchers.get(tool)
-        if searcher is None:
-            raise ValueError(f"Unknown search tool: {tool}")
-        return await searcher.search(query, from_time, to_time)
\ No newline at end of file
+        if tool == SearchTool.HEDGED:
+            loader = lambda: self.__hedged_search(query, from_time, to_time)
+        else:
+            self.__get_searcher(tool)
+            loader = lambda: self.__timed_search(tool, query, from_time, to_time)
+        if self.__cache is None:
+            return await loader()
+        return await self.__cache.get_or_load(tool, query, from_time, to_time, loader)
+
+    async def __timed_search(
+        self,
+        tool: SearchTool,
+        query: str,
+        from_time: Optional[datetime],
+        to_time: Optional[datetime]
+    ) -> list[SearchResultDict]:
+        start = time.perf_counter()
+        try:
+            results = await self.__get_searcher(tool).search(query, from_time, to_time)
+        except asyncio.CancelledError:
+            # not a latency sample, a hedge loser is mostly cancelled right after it started and would make the tool look fast
+            UPSTREAM_SECONDS.observe(time.perf_counter() - start, tool=tool.value, outcome='cancelled')
+            raise
+        except Exception:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - start, tool=tool.value, outcome='error')
+            raise
+        # failures are not recorded, they are often fast and would make the tool look quick
+        self.__latencies[tool].record(time.perf_counter() - start)
+        UPSTREAM_SECONDS.observe(time.perf_counter() - start, tool=tool.value, outcome='ok')
+        return results
+
+    def __hedge_tools(self) -> tuple[SearchTool, SearchTool]:
+        """
+        (primary, secondary) tools of a hedged search.
+        The configured order is swapped while the secondary tool has the lower recent median latency.
+        """
+        primary, secondary = SEARCH_HEDGE_PRIMARY_TOOL, SEARCH_HEDGE_SECONDARY_TOOL
+        primary_latencies, secondary_latencies = self.__latencies[primary], self.__latencies[secondary]
+        if len(primary_latencies) >= SEARCH_HEDGE_MIN_SAMPLES and len(secondary_latencies) >= SEARCH_HEDGE_MIN_SAMPLES:
+            if secondary_latencies.quantile(0.5) < primary_latencies.quantile(0.5): # type: ignore
+                return secondary, primary
+        return primary, secondary
+
+    def hedge_delay(self, tool: SearchTool) -> float:
+        """
+        Seconds to wait for the tool before starting the other tool of a hedged search
+        """
+        latencies = self.__latencies[tool]
+        if SEARCH_HEDGE_DELAY_QUANTILE <= 0 or len(latencies) < SEARCH_HEDGE_MIN_SAMPLES:
+            return SEARCH_HEDGE_DELAY_SECONDS
+        delay = latencies.quantile(SEARCH_HEDGE_DELAY_QUANTILE) or SEARCH_HEDGE_DELAY_SECONDS
+        return min(SEARCH_HEDGE_MAX_DELAY_SECONDS, max(SEARCH_HEDGE_MIN_DELAY_SECONDS, delay))
+
+    async def __hedged_search(
+        self,
+        query: str,
+        from_time: Optional[datetime],
+        to_time: Optional[datetime]
+    ) -> list[SearchResultDict]:
+        """
+        Search with the primary tool and start the secondary tool only when the primary has not answered within
+        the hedge delay, or failed before it. The first non empty answer wins and the other search is cancelled.
+        Most requests only call one tool, only the slow tail pays for a second upstream call.
+        """
+        primary, secondary = self.__hedge_tools()
+        if self.__cache is not None:
+            # an answer cached for either tool is as good as a fresh hedged one
+            for tool in (primary, secondary):
+                cached_results = self.__cache.lookup(tool, query, from_time, to_time)
+                if cached_results:
+                    return cached_results
+
+        tasks: dict[asyncio.Task[list[SearchResultDict]], SearchTool] = {
+            asyncio.create_task(self.__timed_search(primary, query, from_time, to_time)): primary
+        }
+        hedge_deadline = time.monotonic() + self.hedge_delay(primary)
+        hedged = False
+        fallback_results: Optional[list[SearchResultDict]] = None
+        first_error: Optional[BaseException] = None
+        try:
+            while tasks:
+                timeout = None if hedged else max(0.0, hedge_deadline - time.monotonic())
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tool = tasks.pop(task)
+                    if task.exception() is not None:
+                        logger.warning(f"Hedged search with {tool.value} failed: {task.exception()}")
+                        first_error = first_error or task.exception()
+                        continue
+                    results = task.result()
+                    if any(result['content'] for result in results):
+                        HEDGE_WINS.inc(tool=tool.value)
+                        if self.__cache is not None:
+                            self.__cache.store(tool, query, from_time, to_time, results)
+                        return results
+                    fallback_results = results
+                if not hedged:
+                    # the primary is late, failed or came back empty
+                    hedged = True
+                    HEDGES_LAUNCHED.inc(tool=secondary.value)
+                    tasks[asyncio.create_task(self.__timed_search(secondary, query, from_time, to_time))] = secondary
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        if fallback_results is not None:
+            return fallback_results
+        assert first_error is not None
+        raise first_error
+
+    async def stream(
+        self,
+        tool: SearchTool,
+        query: str,
+        from_time: Optional[datetime],
+        to_time: Optional[datetime]
+    ) -> AsyncIterator[SearchStreamChunk]:
+        """
+        Stream the search answer of the given tool as chunks, stream_results of them are the results of search().
+        A cached answer is replayed at once, a streamed answer is cached when complete.
+        Hedged streams are not raced, they stream from the current primary tool of hedged searches.
+        """
+        if tool == SearchTool.HEDGED:
+            tool = self.__hedge_tools()[0]
+        searcher = self.__get_searcher(tool)
+        if self.__cache is not None:
+            cached_results = self.__cache.lookup(tool, query, from_time, to_time)
+            if cached_results is not None:
+                for result in cached_results:
+                    yield SearchStreamChunk(content=result['content'], item=True)
+                return
+
+        chunks: list[SearchStreamChunk] = []
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            async for chunk in searcher.stream(query, from_time, to_time):
+                chunks.append(chunk)
+                yield chunk
+            outcome = 'ok'
+            # a complete stream takes as long as the search, it counts for the hedge delay
+            self.__latencies[tool].record(time.perf_counter() - start)
+        except (asyncio.CancelledError, GeneratorExit):
+            # the client went away
+            outcome = 'cancelled'
+            raise
+        finally:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - start, tool=tool.value, outcome=outcome)
+        if self.__cache is not None:
+            self.__cache.store(tool, query, from_time, to_time, stream_results(chunks))
@@ -1,17 +1,72 @@
 from abc import ABC
 from datetime import datetime
+from typing import Any, Optional, TypedDict
+
+import aiohttp
 
 from crawler.const import ArticleSite
 
 from ...po import ArticlePo
+from ..HttpSessionFactory import create_session
 
 import logging
 logger = logging.getLogger(__name__)
 
+class ArticleListing(TypedDict):
+    """
+    An article found on a listing page, with what the listing tells about it, for its detail page to be fetched
+    """
+    url: str
+    title: Optional[str]
+    publish_time: Optional[datetime]
+
 class ArticleFetcher(ABC):
+    KIND = 'article'
 
     def __init__(self, site: ArticleSite):
         self.__site = site
 
+    @property
+    def site(self) -> ArticleSite:
+        return self.__site
+
+    def create_session(self, **session_kwargs: Any) -> aiohttp.ClientSession:
+        return create_session(ArticleFetcher.KIND, self.__site.value, **session_kwargs)
+
     async def fetch(self, after: datetime) -> list[ArticlePo]:
         raise NotImplementedError
+
+    async def fetch_contents(self, urls: list[str]) -> dict[str, str]:
+        """
+        Current content of stored articles by url, rendered like fetch does, articles that could not be fetched
+        or parsed are left out
+        """
+        raise NotImplementedError
+
+    async def fetch_range(self, start: datetime, end: datetime) -> list[ArticlePo]:
+        """
+        Articles published in [start, end), for backfills, in chronological order.
+        Listing request errors are raised instead of logged so that the range can be fetched again
+        """
+        raise NotImplementedError
+
+    async def fetch_listing_range(self, start: datetime, end: datetime) -> list[ArticleListing]:
+        """
+        Articles on the listing pages published in [start, end), for backfills that walk a listing only paged from
+        the newest article once and fetch the detail pages by shard, in chronological order. Listing request errors are raised
+        """
+        raise NotImplementedError
+
+    async def fetch_listing(self, after: datetime) -> list[ArticleListing]:
+        """
+        Articles on the listing pages published after the given time, all listed ones when the listing has no
+        publish times, without fetching their detail pages
+        """
+        raise NotImplementedError
+
+    async def fetch_details(self, listings: list[ArticleListing]) -> list[Optional[ArticlePo] | Exception]:
+        """
+        Detail pages of listed articles, per listing the article, None when the page holds no article to store,
+        or the error fetching or parsing it
+        """
+        raise NotImplementedError
@@ -1,14 +1,17 @@
+import html
 from datetime import datetime
 from typing import Optional, override, TypedDict
 
 import aiohttp
-from bs4 import BeautifulSoup, Tag
 from datetime import datetime, timezone, timedelta
 
-from crawler.const import ArticleSite, ArticleSource
+from crawler.const import ArticleSite, ArticleSource, ContentFormat
 
 from ...po import ArticlePo
-from . import ArticleFetcher
+from . import ArticleFetcher, ArticleListing
+from ..parsing import parse_html, render_content
+from ...config import ARTICLE_CONTENT_FORMAT
+from ...diagnostics import stage
 
 import logging
 logger = logging.getLogger(__name__)
@@ -44,22 +47,54 @@ class ChainCatcherArticleFetcher(ArticleFetcher):
 
     @override
     async def fetch(self, after: datetime) -> list[ArticlePo]:
-        async with aiohttp.ClientSession(timeout=self._timeout) as session:
-            url_list = await self.crawl_chaincatcher_article_url_list(session)
+        async with self.create_session(timeout=self._timeout) as session:
+            with stage('listing'):
+                url_list = await self.crawl_chaincatcher_article_url_list(session)
             article_list = []
             for url in url_list:
-                article = await self.crawl_chaincatcher_single_article(session, url, after)
+                with stage('detail', url=url):
+                    article = await self.crawl_chaincatcher_single_article(session, url, after)
                 if article:
                     article_list.append(article)
             return article_list
 
+    @override
+    async def fetch_contents(self, urls: list[str]) -> dict[str, str]:
+        contents: dict[str, str] = {}
+        async with self.create_session(timeout=self._timeout) as session:
+            for url in urls:
+                with stage('detail', url=url):
+                    article = await self.crawl_chaincatcher_single_article(session, url, datetime.fromtimestamp(0, timezone.utc))
+                if article:
+                    contents[url] = article.content
+        return contents
+
+    @override
+    async def fetch_listing(self, after: datetime) -> list[ArticleListing]:
+        # the listing has no publish times, fetch_details gives every listed article
+        async with self.create_session(timeout=self._timeout) as session:
+            url_list = await self.crawl_chaincatcher_article_url_list(session)
+        return [{'url': url, 'title': None, 'publish_time': None} for url in url_list]
+
+    @override
+    async def fetch_details(self, listings: list[ArticleListing]) -> list[Optional[ArticlePo] | Exception]:
+        results: list[Optional[ArticlePo] | Exception] = []
+        async with self.create_session(timeout=self._timeout) as session:
+            for listing in listings:
+                try:
+                    with stage('detail', url=listing['url']):
+                        results.append(await self.fetch_detail(session, listing['url']))
+                except Exception as e:
+                    results.append(e)
+        return results
+
     async def crawl_chaincatcher_article_url_list(self, session: aiohttp.ClientSession) -> list[str]:
         try:
             async with session.get(ChainCatcherArticleFetcher.BASE_URL + '/en/article', cookies=ChainCatcherArticleFetcher.COOKIES, headers=ChainCatcherArticleFetcher.HEADERS) as response:
                 response.raise_for_status()
                 content = await response.read()
 
-                soup = BeautifulSoup(content, 'html.parser')
+                soup = parse_html(content, self.KIND, self.site.value)
                 articles = soup.select('.article_wraper .article_area')
 
                 url_list = []
@@ -86,77 +121,9 @@ class ChainCatcherArticleFetcher(ArticleFetcher):
             logger.error(f"Unknown error: {e}")
             return []
 
-    @staticmethod
-    async def crawl_chaincatcher_single_article(session: aiohttp.ClientSession, url: str, after: datetime) -> Optional[ArticlePo]:
+    async def crawl_chaincatcher_single_article(self, session: aiohttp.ClientSession, url: str, after: datetime) -> Optional[ArticlePo]:
         try:
-            async with session.get(url, cookies=ChainCatcherArticleFetcher.COOKIES, headers=ChainCatcherArticleFetcher.HEADERS) as response:
-                response.raise_for_status()
-                content = await response.read()
-                soup = BeautifulSoup(content, 'html.parser')
-                wrapper = soup.select_one('.details_wraper')
-                if not wrapper:
-                    return
-                publish_time_tag = wrapper.select_one('.author .time')
-                if not publish_time_tag:
-                    return
-                publish_time_str = publish_time_tag.text.strip()
-                publish_time = datetime.strptime(publish_time_str, '%Y-%m-%d %H:%M:%S') - timedelta(hours=8)
-                publish_time = publish_time.replace(tzinfo=timezone.utc)
-                if publish_time <= after:
-                    return
-                
-                title_tag = soup.select_one('h1')
-                if not title_tag:
-                    return
-                title = title_tag.text.strip()
-                if not title:
-                    return
-                
-                related_topic_list = []
-                related_topic_tags = wrapper.select_one('.associated_labels .labels_content')
-                if related_topic_tags:
-                    related_topic_list = [tag.text.strip() for tag in related_topic_tags.select('a')]
-
-                abstract = ''
-                abstract_tag = wrapper.select_one('.abstract')
-                if abstract_tag:
-                    abstract = abstract_tag.text.strip()
-
-                content_tag = wrapper.select_one('.rich_text_content')
-                if not content_tag:
-                    return
-
-                REMOVE_ATTRIBUTES = [
-                    'lang','language','onmouseover','onmouseout','script','style','font',
-                    'dir','face','size','color','style','class','width','height','hspace',
-                    'border','valign','align','background','bgcolor','text','link','vlink',
-                    'alink','cellpadding','cellspacing', 'href', 'id', 'rel']
-                for tag in content_tag.descendants:
-                    if isinstance(tag, Tag):
-                        tag.attrs = {key: value for key, value in tag.attrs.items()
-                                    if key not in REMOVE_ATTRIBUTES}
-                content = content_tag.prettify()
-
-                if related_topic_list:
-                    related_topic_str = ''
-                    for topic in related_topic_list:
-                        related_topic_str += f'<li>{topic}</li>'
-                    content = f'<h3>Related Labels</h3>\n<ul id="related_labels">{related_topic_str}</ul>\n{content}'
-
-                if abstract:
-                    content = f'<h2 id="abstract">{abstract}</h2>\n{content}'
-
-                return ArticlePo(
-                    id=None,
-                    source=ArticleSource.CHAINCATCHER,
-                    site=ArticleSite.CHAINCATCHER,
-                    title=title,
-                    title_md5='',
-                    content=content,
-                    url=url,
-                    create_time=datetime.now(timezone.utc),
-                    publish_time=publish_time,
-                )
+            return await self.fetch_detail(session, url, after)
         except aiohttp.ClientError as e:
             logger.error(f"Error fetching the webpage, url: {url}, error: {e}")
             return
@@ -164,3 +131,78 @@ class ChainCatcherArticleFetcher(ArticleFetcher):
             logger.error(f"Error parsing article, url: {url}, error: {e}")
             return
 
+    @staticmethod
+    async def fetch_detail(session: aiohttp.ClientSession, url: str, after: Optional[datetime] = None) -> Optional[ArticlePo]:
+        """
+        Article of a detail page, None when the page is not an article or not published after the given time,
+        request and parse errors are raised
+        """
+        async with session.get(url, cookies=ChainCatcherArticleFetcher.COOKIES, headers=ChainCatcherArticleFetcher.HEADERS) as response:
+            response.raise_for_status()
+            page = await response.read()
+        return ChainCatcherArticleFetcher.parse_chaincatcher_article(url, page, after)
+
+    @staticmethod
+    def parse_chaincatcher_article(url: str, page: bytes, after: Optional[datetime] = None) -> Optional[ArticlePo]:
+        soup = parse_html(page, ArticleFetcher.KIND, ArticleSite.CHAINCATCHER.value)
+        wrapper = soup.select_one('.details_wraper')
+        if not wrapper:
+            return
+        publish_time_tag = wrapper.select_one('.author .time')
+        if not publish_time_tag:
+            return
+        publish_time_str = publish_time_tag.text.strip()
+        publish_time = datetime.strptime(publish_time_str, '%Y-%m-%d %H:%M:%S') - timedelta(hours=8)
+        publish_time = publish_time.replace(tzinfo=timezone.utc)
+        if after is not None and publish_time <= after:
+            return
+
+        title_tag = soup.select_one('h1')
+        if not title_tag:
+            return
+        title = title_tag.text.strip()
+        if not title:
+            return
+
+        related_topic_list = []
+        related_topic_tags = wrapper.select_one('.associated_labels .labels_content')
+        if related_topic_tags:
+            related_topic_list = [tag.text.strip() for tag in related_topic_tags.select('a')]
+
+        abstract = ''
+        abstract_tag = wrapper.select_one('.abstract')
+        if abstract_tag:
+            abstract = abstract_tag.text.strip()
+
+        content_tag = wrapper.select_one('.rich_text_content')
+        if not content_tag:
+            return
+
+        with stage('clean'):
+            content = render_content(content_tag)
+
+        if ARTICLE_CONTENT_FORMAT == ContentFormat.MARKDOWN:
+            if related_topic_list:
+                related_topic_str = '\n'.join(f'- {topic}' for topic in related_topic_list)
+                content = f'### Related Labels\n\n{related_topic_str}\n\n{content}'
+            if abstract:
+                content = f'## {abstract}\n\n{content}'
+        else:
+            if related_topic_list:
+                related_topic_str = ''.join(f'<li>{html.escape(topic)}</li>' for topic in related_topic_list)
+                content = f'<h3>Related Labels</h3><ul id="related_labels">{related_topic_str}</ul>{content}'
+            if abstract:
+                content = f'<h2 id="abstract">{html.escape(abstract)}</h2>{content}'
+
+        return ArticlePo(
+            id=None,
+            source=ArticleSource.CHAINCATCHER,
+            site=ArticleSite.CHAINCATCHER,
+            title=title,
+            title_md5='',
+            content=content,
+            url=url,
+            create_time=datetime.now(timezone.utc),
+            publish_time=publish_time,
+        )
+
@@ -2,13 +2,14 @@ from datetime import datetime
 from typing import Optional, override, TypedDict
 
 import aiohttp
-from bs4 import BeautifulSoup, Tag
 from datetime import datetime, timezone, timedelta
 
 from crawler.const import ArticleSite, ArticleSource
 
 from ...po import ArticlePo
-from . import ArticleFetcher
+from . import ArticleFetcher, ArticleListing
+from ..parsing import parse_html, render_content, DROP_TAGS
+from ...diagnostics import stage
 
 import logging
 logger = logging.getLogger(__name__)
@@ -28,67 +29,149 @@ class GlassnodeArticleFetcher(ArticleFetcher):
 
     @override
     async def fetch(self, after: datetime) -> list[ArticlePo]:
-        result_list: list[ArticlePo] = []
-        async with aiohttp.ClientSession(timeout=self._timeout) as session:
-            for article_info in await self.crawl_article_list(session, after):
+        async with self.create_session(timeout=self._timeout) as session:
+            with stage('listing'):
+                article_info_list = await self.crawl_article_list(session, after)
+            return await self.__fetch_articles(session, article_info_list)
+
+    @override
+    async def fetch_range(self, start: datetime, end: datetime) -> list[ArticlePo]:
+        async with self.create_session(timeout=self._timeout) as session:
+            article_info_list = await self.__crawl_article_list_range(session, start, end)
+            return await self.__fetch_articles(session, article_info_list)
+
+    @override
+    async def fetch_listing_range(self, start: datetime, end: datetime) -> list[ArticleListing]:
+        async with self.create_session(timeout=self._timeout) as session:
+            article_info_list = await self.__crawl_article_list_range(session, start, end)
+        return [{'url': info['url'], 'title': info['title'], 'publish_time': info['publish_datetime']} for info in article_info_list]
+
+    async def __crawl_article_list_range(self, session: aiohttp.ClientSession, start: datetime, end: datetime) -> list[ArticleInfo]:
+        # the tag listing is paged newest first, walk it until a page reaches back before start
+        article_info_list: list[ArticleInfo] = []
+        page = 1
+        while True:
+            with stage('listing', page=page):
+                url = f'{GlassnodeArticleFetcher.BASE_URL}/tag/newsletter/' + (f'page/{page}/' if page > 1 else '')
+                async with session.get(url) as response:
+                    if response.status == 404:
+                        # past the last page
+                        break
+                    response.raise_for_status()
+                    page_info_list = self.parse_article_list(await response.read())
+            if not page_info_list:
+                break
+            article_info_list.extend(info for info in page_info_list if start <= info['publish_datetime'] < end)
+            if min(info['publish_datetime'] for info in page_info_list) < start:
+                break
+            page += 1
+        article_info_list.sort(key=lambda info: info['publish_datetime'])
+        return article_info_list
+
+    @override
+    async def fetch_listing(self, after: datetime) -> list[ArticleListing]:
+        async with self.create_session(timeout=self._timeout) as session:
+            article_info_list = await self.crawl_article_list(session, after)
+        return [{'url': info['url'], 'title': info['title'], 'publish_time': info['publish_datetime']} for info in article_info_list]
+
+    @override
+    async def fetch_details(self, listings: list[ArticleListing]) -> list[Optional[ArticlePo] | Exception]:
+        results: list[Optional[ArticlePo] | Exception] = []
+        async with self.create_session(timeout=self._timeout) as session:
+            for listing in listings:
                 try:
-                    content = await self.crawl_single_article(session, article_info)
-                    if not content:
-                        continue
-                    result_list.append(ArticlePo(
-                        id=None,
-                        source=ArticleSource.GLASSNODE,
-                        site=ArticleSite.GLASSNODE,
-                        title=article_info['title'],
-                        title_md5='',
-                        content=content,
-                        url=article_info['url'],
-                        publish_time=article_info['publish_datetime'],
-                    ))
+                    if listing['title'] is None or listing['publish_time'] is None:
+                        raise ValueError(f"glassnode listing without title or publish time: {listing['url']}")
+                    article_info: ArticleInfo = {'url': listing['url'], 'title': listing['title'], 'publish_datetime': listing['publish_time']}
+                    with stage('detail', url=listing['url']):
+                        content = await self.crawl_single_article(session, article_info)
+                    results.append(self.__to_po(article_info, content) if content else None)
                 except Exception as e:
-                    logger.error(f'Error fetching article: {e}', exc_info=True)
+                    results.append(e)
+        return results
+
+    @staticmethod
+    def __to_po(article_info: ArticleInfo, content: str) -> ArticlePo:
+        return ArticlePo(
+            id=None,
+            source=ArticleSource.GLASSNODE,
+            site=ArticleSite.GLASSNODE,
+            title=article_info['title'],
+            title_md5='',
+            content=content,
+            url=article_info['url'],
+            publish_time=article_info['publish_datetime'],
+        )
+
+    async def __fetch_articles(self, session: aiohttp.ClientSession, article_info_list: list[ArticleInfo]) -> list[ArticlePo]:
+        result_list: list[ArticlePo] = []
+        for article_info in article_info_list:
+            try:
+                with stage('detail', url=article_info['url']):
+                    content = await self.crawl_single_article(session, article_info)
+                if not content:
                     continue
+                with stage('po'):
+                    result_list.append(self.__to_po(article_info, content))
+            except Exception as e:
+                logger.error(f'Error fetching article: {e}', exc_info=True)
+                continue
         return result_list
 
+    @override
+    async def fetch_contents(self, urls: list[str]) -> dict[str, str]:
+        contents: dict[str, str] = {}
+        async with self.create_session(timeout=self._timeout) as session:
+            for url in urls:
+                try:
+                    with stage('detail', url=url):
+                        content = await self.crawl_single_article(session, {'url': url, 'title': '', 'publish_datetime': datetime.fromtimestamp(0, timezone.utc)})
+                    if content:
+                        contents[url] = content
+                except Exception as e:
+                    logger.error(f'Error fetching article {url}: {e}', exc_info=True)
+        return contents
+
     async def crawl_article_list(self, session: aiohttp.ClientSession, after: datetime) -> list[ArticleInfo]:
         async with session.get(f'{GlassnodeArticleFetcher.BASE_URL}/tag/newsletter/') as response:
             response.raise_for_status()
             content = await response.read()
-            soup = BeautifulSoup(content, 'html.parser')
-            articles = soup.select('article')
-            article_info_list: list[ArticleInfo] = []
-            for article in articles:
-                try:
-                    url_tag = article.select_one('a.post-card-content-link')
-                    if not url_tag:
-                        continue
-                    url = f'{GlassnodeArticleFetcher.BASE_URL}{url_tag.attrs['href']}'
-                    title_tag = article.select_one('.post-card-title')
-                    if not title_tag:
-                        continue
-                    title = title_tag.text.strip()
-                    publish_datetime_tag = article.select_one('time.post-card-meta-date')
-                    if not publish_datetime_tag:
-                        continue
-                    publish_datetime = datetime.strptime(str(publish_datetime_tag.attrs['datetime']).strip(), '%Y-%m-%d')
-                    publish_datetime = publish_datetime.replace(tzinfo=timezone.utc)
-                    if (publish_datetime <= after):
-                        continue
-                    article_info_list.append({
-                        'url': url,
-                        'title': title,
-                        'publish_datetime': publish_datetime
-                    })
-                except Exception as e:
-                    logger.error(f'Error parsing article: {e}', exc_info=True)
-            return article_info_list
+            return [info for info in self.parse_article_list(content) if info['publish_datetime'] > after]
+
+    def parse_article_list(self, content: bytes) -> list[ArticleInfo]:
+        soup = parse_html(content, self.KIND, self.site.value)
+        articles = soup.select('article')
+        article_info_list: list[ArticleInfo] = []
+        for article in articles:
+            try:
+                url_tag = article.select_one('a.post-card-content-link')
+                if not url_tag:
+                    continue
+                url = f'{GlassnodeArticleFetcher.BASE_URL}{url_tag.attrs['href']}'
+                title_tag = article.select_one('.post-card-title')
+                if not title_tag:
+                    continue
+                title = title_tag.text.strip()
+                publish_datetime_tag = article.select_one('time.post-card-meta-date')
+                if not publish_datetime_tag:
+                    continue
+                publish_datetime = datetime.strptime(str(publish_datetime_tag.attrs['datetime']).strip(), '%Y-%m-%d')
+                publish_datetime = publish_datetime.replace(tzinfo=timezone.utc)
+                article_info_list.append({
+                    'url': url,
+                    'title': title,
+                    'publish_datetime': publish_datetime
+                })
+            except Exception as e:
+                logger.error(f'Error parsing article: {e}', exc_info=True)
+        return article_info_list
 
     @staticmethod
     async def crawl_single_article(session: aiohttp.ClientSession, article_info: ArticleInfo) -> Optional[str]:
         async with session.get(article_info['url']) as response:
             response.raise_for_status()
             content = await response.read()
-            soup = BeautifulSoup(content, 'html.parser')
+            soup = parse_html(content, ArticleFetcher.KIND, ArticleSite.GLASSNODE.value)
     
             article = soup.select_one("#site-main > article")
             if not article:
@@ -98,23 +181,6 @@ class GlassnodeArticleFetcher(ArticleFetcher):
             if byline:
                 byline.decompose()
     
-            script_tags = article.find_all('script')
-            if script_tags:
-                for tag in script_tags:
-                    tag.decompose()
-            noscript_tags = article.find_all('noscript')
-            if noscript_tags:
-                for tag in noscript_tags:
-                    tag.decompose()
-            img_tags = article.find_all('img')
-            if img_tags:
-                for tag in img_tags:
-                    tag.decompose()
-            figure_tags = article.find_all('figure')
-            if figure_tags:
-                for tag in figure_tags:
-                    tag.decompose()
-            
             separator = article.find('hr')
             if separator:
                 # Start with the immediate next sibling
@@ -126,13 +192,5 @@ class GlassnodeArticleFetcher(ArticleFetcher):
                     current_sibling = current_sibling.next_sibling # Get the next sibling before removing
                     next_to_remove.extract() # or next_to_remove.decompose()
     
-            REMOVE_ATTRIBUTES = [
-                'lang','language','onmouseover','onmouseout','script','style','font',
-                'dir','face','size','color','style','class','width','height','hspace',
-                'border','valign','align','background','bgcolor','text','link','vlink',
-                'alink','cellpadding','cellspacing', 'href', 'id', 'rel']
-            for tag in article.descendants:
-                if isinstance(tag, Tag):
-                    tag.attrs = {key: value for key, value in tag.attrs.items()
-                                if key not in REMOVE_ATTRIBUTES}
-            return article.prettify()
\ No newline at end of file
+            with stage('clean'):
+                return render_content(article, DROP_TAGS | {'img', 'figure'})
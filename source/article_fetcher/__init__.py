@@ -1,6 +1,6 @@
-from .ArticleFetcher import ArticleFetcher
+from .ArticleFetcher import ArticleFetcher, ArticleListing
 from .ChainCatcherArticleFetcher import ChainCatcherArticleFetcher
 from .GlassnodeArticleFetcher import GlassnodeArticleFetcher
 
 
-__all__ = ['ArticleFetcher', 'ChainCatcherArticleFetcher', 'GlassnodeArticleFetcher']
+__all__ = ['ArticleFetcher', 'ArticleListing', 'ChainCatcherArticleFetcher', 'GlassnodeArticleFetcher']
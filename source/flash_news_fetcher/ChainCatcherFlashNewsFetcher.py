@@ -1,11 +1,12 @@
 import aiohttp
-from bs4 import BeautifulSoup
 from datetime import datetime, timezone, timedelta
 from typing import Any, override
 
 from ...const import FlashNewsSite, FlashNewsSource
 from ...po.FlashNewsPo import FlashNewsPo
 from . import FlashNewsFetcher
+from ..parsing import parse_html
+from ...diagnostics import stage
 
 class ChainCatcherFlashNewsFetcher(FlashNewsFetcher):
     BASE_URL = 'https://www.chaincatcher.com'
@@ -18,17 +19,18 @@ class ChainCatcherFlashNewsFetcher(FlashNewsFetcher):
     @override
     async def fetch(self, after: datetime) -> list[FlashNewsPo]:
         result_list = await self.crawl_chaincatcher_flash_news(after)
-        return [FlashNewsPo(
-            id=None,
-            source=FlashNewsSource.CHAINCATCHER,
-            site=FlashNewsSite.CHAINCATCHER,
-            title=result['title'],
-            title_md5='',
-            description=result['description'],
-            url=result['url'],
-            create_time=datetime.now(timezone.utc),
-            publish_time=result['publish_datetime_utc']
-        ) for result in result_list]
+        with stage('po', rows=len(result_list)):
+            return [FlashNewsPo(
+                id=None,
+                source=FlashNewsSource.CHAINCATCHER,
+                site=FlashNewsSite.CHAINCATCHER,
+                title=result['title'],
+                title_md5='',
+                description=result['description'],
+                url=result['url'],
+                create_time=datetime.now(timezone.utc),
+                publish_time=result['publish_datetime_utc']
+            ) for result in result_list]
 
     async def crawl_chaincatcher_flash_news(self, after: datetime) -> list[dict[str, Any]]:
         """
@@ -42,12 +44,13 @@ class ChainCatcherFlashNewsFetcher(FlashNewsFetcher):
         }
         
         try:
-            async with aiohttp.ClientSession(timeout=self._timeout) as session:
-                async with session.get(ChainCatcherFlashNewsFetcher.NEWS_LISTING_URL, headers=headers) as response:
-                    response.raise_for_status()
-                    content = await response.read()
+            async with self.create_session(timeout=self._timeout) as session:
+                with stage('listing'):
+                    async with session.get(ChainCatcherFlashNewsFetcher.NEWS_LISTING_URL, headers=headers) as response:
+                        response.raise_for_status()
+                        content = await response.read()
                     
-                    soup = BeautifulSoup(content, 'html.parser')
+                    soup = parse_html(content, self.KIND, self.site.value)
                     
                     news_list = soup.find_all('div', class_='v-timeline-item')
                     result_list: list[dict] = []
@@ -76,24 +79,25 @@ class ChainCatcherFlashNewsFetcher(FlashNewsFetcher):
                             print(f"Error parsing news: {e}")
                             continue
 
-                    final_results = []
-                    for result in result_list:
-                        try:
-                            if not result['url']:
-                                continue
+                final_results = []
+                for result in result_list:
+                    try:
+                        if not result['url']:
+                            continue
+                        with stage('detail', url=result['url']):
                             async with session.get(result['url'], headers=headers) as detail_response:
                                 detail_response.raise_for_status()
                                 detail_content = await detail_response.read()
-                                soup = BeautifulSoup(detail_content, 'html.parser')
-                                description: str = soup.select_one('.rich_text_content').text.strip() # type: ignore
-                                result['description'] = description
-                                final_results.append(result)
-                            
-                        except Exception as e:
-                            print(f"Error fetching the webpage: {e}")
-                            continue
+                            soup = parse_html(detail_content, self.KIND, self.site.value)
+                            description: str = soup.select_one('.rich_text_content').text.strip() # type: ignore
+                        result['description'] = description
+                        final_results.append(result)
+                        
+                    except Exception as e:
+                        print(f"Error fetching the webpage: {e}")
+                        continue
 
-                    return final_results
+                return final_results
                 
         except Exception as e:
             print(f"Error fetching the webpage: {e}")
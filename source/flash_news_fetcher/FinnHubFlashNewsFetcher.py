@@ -5,6 +5,7 @@ from typing import override
 from ...const import FlashNewsSite, FlashNewsSource, FINNHUB_API_BASE_URL
 from ...po.FlashNewsPo import FlashNewsPo
 from . import FlashNewsFetcher
+from ...diagnostics import stage
 from ...config import FINNHUB_API_KEY
 
 import logging
@@ -27,12 +28,14 @@ class FinnHubFlashNewsFetcher(FlashNewsFetcher):
             return []
         
         result_list: list[FlashNewsPo] = []
-        async with aiohttp.ClientSession(timeout=self._timeout) as session:
+        async with self.create_session(timeout=self._timeout) as session:
             for category in ['crypto']:
                 try:
-                    async with session.get(f'{FINNHUB_API_BASE_URL}{FinnHubFlashNewsFetcher.NEWS_ENDPOINT}?category={category}', headers={ 'X-Finnhub-Token': FINNHUB_API_KEY }) as response:
-                        response.raise_for_status()
-                        data = await response.json()
+                    with stage('listing', category=category):
+                        async with session.get(f'{FINNHUB_API_BASE_URL}{FinnHubFlashNewsFetcher.NEWS_ENDPOINT}?category={category}', headers={ 'X-Finnhub-Token': FINNHUB_API_KEY }) as response:
+                            response.raise_for_status()
+                            data = await response.json()
+                    with stage('po', rows=len(data)):
                         for news in data:
                             source = FlashNewsSource.OTHERS
                             if news.get('source'):
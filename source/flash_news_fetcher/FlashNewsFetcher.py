@@ -1,18 +1,37 @@
 from abc import ABC, abstractmethod
 from datetime import datetime
+from typing import Any
+
+import aiohttp
 
 from crawler.const import FlashNewsSite
 
 from ...po import FlashNewsPo
+from ..HttpSessionFactory import create_session
 
 import logging
 logger = logging.getLogger(__name__)
 
 class FlashNewsFetcher(ABC):
+    KIND = 'flash_news'
 
     def __init__(self, site: FlashNewsSite):
         self.__site = site
 
+    @property
+    def site(self) -> FlashNewsSite:
+        return self.__site
+
+    def create_session(self, **session_kwargs: Any) -> aiohttp.ClientSession:
+        return create_session(FlashNewsFetcher.KIND, self.__site.value, **session_kwargs)
+
     @abstractmethod
     async def fetch(self, after: datetime) -> list[FlashNewsPo]:
-        pass
\ No newline at end of file
+        pass
+
+    async def fetch_range(self, start: datetime, end: datetime) -> list[FlashNewsPo]:
+        """
+        Flash news published in [start, end), for backfills, in chronological order.
+        Request errors are raised instead of logged so that the range can be fetched again
+        """
+        raise NotImplementedError
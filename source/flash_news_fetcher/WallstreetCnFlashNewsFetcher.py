@@ -8,6 +8,7 @@ from typing import Any, List, Dict, Optional, override
 from ...const import FlashNewsSite, FlashNewsSource
 from ...po.FlashNewsPo import FlashNewsPo
 from . import FlashNewsFetcher
+from ...diagnostics import stage
 
 import logging
 logger = logging.getLogger(__name__)
@@ -42,6 +43,8 @@ def get_channel_cn_name(channel: Channel) -> str:
 
 class WallstreetCnFlashNewsFetcher(FlashNewsFetcher):    
     URL = 'https://api-one-wscn.awtmt.com/apiv1/content/lives'
+    # items per page when paging back through a time range
+    RANGE_PAGE_SIZE = 100
 
     HEADERS = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:143.0) Gecko/20100101 Firefox/143.0',
@@ -80,49 +83,59 @@ class WallstreetCnFlashNewsFetcher(FlashNewsFetcher):
             channel_list.append(Channel.GLOBAL)
         return [get_channel_cn_name(channel) for channel in channel_list]
 
-    @override
-    async def fetch(self, after: datetime) -> list[FlashNewsPo]:
+    @staticmethod
+    def params(cursor: Optional[str] = None, limit: int = 20) -> dict[str, str]:
         params = {
             'channel': 'global-channel', # us-stock-channel, tech-channel, goldc-channel,oil-channel,commodity-channel, hk-stock-channel
             'client': 'pc',
-            'limit': '20',
-            'first_page': 'true',
+            'limit': str(limit),
+            'first_page': 'true' if cursor is None else 'false',
             'accept': 'live,vip-live',
             # 'score': 2 # 1 - 3, 3 is most important
         }
+        if cursor is not None:
+            params['cursor'] = cursor
+        return params
 
+    def to_po(self, news: dict[str, Any]) -> Optional[FlashNewsPo]:
+        title = news['title']
+        content = news['content_text']
+        channel_str_list = news['channels']
+        category_name_list = self.channel_str_list_to_category_name_list(channel_str_list if channel_str_list else [])
+        if not title:
+            if content:
+                title = content
+                content = ''
+            else:
+                return None
+        return FlashNewsPo(
+            id=None,
+            source=FlashNewsSource.WALLSTREETCN,
+            site=FlashNewsSite.WALLSTREETCN,
+            title=f"[类别: {', '.join(category_name_list)}] {title}",
+            title_md5='',
+            description=content,
+            url=news['uri'],
+            create_time=datetime.now(timezone.utc),
+            publish_time=datetime.fromtimestamp(float(news['display_time']), tz=timezone.utc),
+        )
+
+    @override
+    async def fetch(self, after: datetime) -> list[FlashNewsPo]:
         try:
-            async with aiohttp.ClientSession(timeout=self._timeout) as session:
-                async with session.get(WallstreetCnFlashNewsFetcher.URL, params=params, headers=WallstreetCnFlashNewsFetcher.HEADERS) as response:
-                    response.raise_for_status()
-                    data = await response.json()
+            async with self.create_session(timeout=self._timeout) as session:
+                with stage('listing'):
+                    async with session.get(WallstreetCnFlashNewsFetcher.URL, params=self.params(), headers=WallstreetCnFlashNewsFetcher.HEADERS) as response:
+                        response.raise_for_status()
+                        data = await response.json()
+                with stage('po', rows=len(data["data"]["items"])):
                     result_list: list[FlashNewsPo] = []
                     for news in data["data"]["items"]:
                         try:
-                            title = news['title']
-                            content = news['content_text']
-                            channel_str_list = news['channels']
-                            category_name_list = self.channel_str_list_to_category_name_list(channel_str_list if channel_str_list else [])
-                            if not title:
-                                if content:
-                                    title = content
-                                    content = ''
-                                else:
-                                    continue
-                            publish_time = datetime.fromtimestamp(float(news['display_time']), tz=timezone.utc)
-                            if publish_time <= after:
+                            po = self.to_po(news)
+                            if po is None or po.publish_time <= after:
                                 continue
-                            result_list.append(FlashNewsPo(
-                                id=None,
-                                source=FlashNewsSource.WALLSTREETCN,
-                                site=FlashNewsSite.WALLSTREETCN,
-                                title=f"[类别: {', '.join(category_name_list)}] {title}",
-                                title_md5='',
-                                description=content,
-                                url=news['uri'],
-                                create_time=datetime.now(timezone.utc),
-                                publish_time=publish_time,
-                            ))
+                            result_list.append(po)
                         except Exception as e:
                             logger.error(f'Error processing news: {news}, msg={e}', exc_info=True)
                     return result_list
@@ -132,4 +145,35 @@ class WallstreetCnFlashNewsFetcher(FlashNewsFetcher):
         except Exception as e:
             logger.error(f'Unknown error: {e}', exc_info=True)
             return []
-        
+
+    @override
+    async def fetch_range(self, start: datetime, end: datetime) -> list[FlashNewsPo]:
+        # the api pages backwards in time, the cursor of a page is the display time its items are older than
+        result_list: list[FlashNewsPo] = []
+        cursor = str(int(end.timestamp()))
+        async with self.create_session(timeout=self._timeout) as session:
+            while True:
+                with stage('listing', cursor=cursor):
+                    async with session.get(WallstreetCnFlashNewsFetcher.URL, params=self.params(cursor, WallstreetCnFlashNewsFetcher.RANGE_PAGE_SIZE), headers=WallstreetCnFlashNewsFetcher.HEADERS) as response:
+                        response.raise_for_status()
+                        data = await response.json()
+                items = data["data"]["items"]
+                reached_start = False
+                for news in items:
+                    try:
+                        po = self.to_po(news)
+                    except Exception as e:
+                        logger.error(f'Error processing news: {news}, msg={e}', exc_info=True)
+                        continue
+                    if po is None:
+                        continue
+                    if po.publish_time < start:
+                        reached_start = True
+                    elif po.publish_time < end:
+                        result_list.append(po)
+                next_cursor = str(data["data"].get("next_cursor") or '')
+                if reached_start or not items or not next_cursor or next_cursor == cursor:
+                    break
+                cursor = next_cursor
+        result_list.reverse()
+        return result_list
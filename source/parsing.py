@@ -0,0 +1,179 @@
+import html
+import re
+import time
+
+from bs4 import BeautifulSoup, NavigableString, PageElement, Tag
+
+from ..config import ARTICLE_CONTENT_FORMAT
+from ..const import ContentFormat
+from ..diagnostics import registry, stage, memory_tracker
+
+HTML_PARSE_SECONDS = registry.histogram('crawler_html_parse_seconds', 'Time spent building the BeautifulSoup tree of a page', ['kind', 'site'])
+
+def parse_html(markup: str | bytes, kind: str, site: str) -> BeautifulSoup:
+    """
+    BeautifulSoup(markup, 'html.parser') recorded in crawler_html_parse_seconds, in stage 'parse',
+    the tree is attributed to the site in memory reports
+    """
+    start = time.perf_counter()
+    with stage('parse', site=f"{kind}/{site}"):
+        soup = BeautifulSoup(markup, 'html.parser')
+    HTML_PARSE_SECONDS.observe(time.perf_counter() - start, kind=kind, site=site)
+    memory_tracker.tag(soup, f"{kind}/{site}")
+    return soup
+
+# dropped with their whole subtree
+DROP_TAGS = frozenset({'script', 'noscript', 'style', 'template', 'iframe'})
+# every other attribute is removed
+KEEP_ATTRIBUTES = frozenset({'src', 'alt', 'title', 'colspan', 'rowspan'})
+# whitespace between these is not rendered
+_BLOCK_TAGS = frozenset({
+    'address', 'article', 'aside', 'blockquote', 'body', 'dd', 'div', 'dl', 'dt', 'figcaption', 'figure', 'footer',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'html', 'li', 'main', 'nav', 'ol', 'p', 'pre', 'section',
+    'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'ul',
+})
+_WHITESPACE = re.compile(r'\s+')
+
+def _is_block_boundary(sibling: PageElement | None, parent_is_block: bool) -> bool:
+    if sibling is None:
+        return parent_is_block
+    return isinstance(sibling, Tag) and sibling.name in _BLOCK_TAGS
+
+def _html_attributes(tag: Tag, keep_attributes: frozenset[str]) -> str:
+    attributes = ''
+    for key, value in tag.attrs.items():
+        if key in keep_attributes:
+            if isinstance(value, list):
+                value = ' '.join(value)
+            attributes += f' {key}="{html.escape(value)}"'
+    return attributes
+
+def _write_html(node: Tag, out: list[str], drop_tags: frozenset[str], keep_attributes: frozenset[str], in_pre: bool):
+    block = node.name in _BLOCK_TAGS
+    for child in node.children:
+        if isinstance(child, Tag):
+            if child.name in drop_tags:
+                continue
+            out.append(f'<{child.name}{_html_attributes(child, keep_attributes)}>')
+            if child.can_be_empty_element and not child.contents:
+                continue
+            _write_html(child, out, drop_tags, keep_attributes, in_pre or child.name == 'pre')
+            out.append(f'</{child.name}>')
+        elif type(child) is NavigableString:
+            if in_pre:
+                out.append(html.escape(child, quote=False))
+                continue
+            text = _WHITESPACE.sub(' ', child)
+            if _is_block_boundary(child.previous_sibling, block) or out[-1].endswith(' '):
+                text = text.lstrip(' ')
+            if _is_block_boundary(child.next_sibling, block):
+                text = text.rstrip(' ')
+            if text:
+                out.append(html.escape(text, quote=False))
+
+def sanitize_html(root: Tag, drop_tags: frozenset[str] = DROP_TAGS, keep_attributes: frozenset[str] = KEEP_ATTRIBUTES) -> str:
+    """
+    Minified html of root in one traversal, without the subtrees of drop_tags, attributes other than keep_attributes,
+    comments and whitespace between blocks. The tree is not modified.
+    """
+    out = [f'<{root.name}>']
+    _write_html(root, out, drop_tags, keep_attributes, root.name == 'pre')
+    out.append(f'</{root.name}>')
+    return ''.join(out)
+
+class _MarkdownWriter:
+    def __init__(self, drop_tags: frozenset[str]):
+        self.__drop_tags = drop_tags
+        self.out: list[str] = []
+
+    def block(self, text: str = ''):
+        self.out.append(f'\n\n{text}')
+
+    def children(self, node: Tag, list_depth: int):
+        for child in node.children:
+            if isinstance(child, Tag):
+                if child.name not in self.__drop_tags:
+                    self.tag(child, list_depth)
+            elif type(child) is NavigableString:
+                self.text(_WHITESPACE.sub(' ', child))
+
+    def text(self, text: str):
+        # no leading space at line starts or after a space
+        if text.startswith(' ') and (not self.out or self.out[-1].endswith(('\n', ' '))):
+            text = text.lstrip(' ')
+        if text:
+            self.out.append(text)
+
+    def inline(self, node: Tag) -> str:
+        writer = _MarkdownWriter(self.__drop_tags)
+        writer.children(node, 0)
+        return _WHITESPACE.sub(' ', ''.join(writer.out)).strip()
+
+    def tag(self, node: Tag, list_depth: int):
+        name = node.name
+        if name in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+            self.block(f"{'#' * int(name[1])} {self.inline(node)}\n\n")
+        elif name in ('ul', 'ol'):
+            index = 0
+            for item in node.find_all('li', recursive=False):
+                index += 1
+                marker = f'{index}.' if name == 'ol' else '-'
+                self.out.append(f"\n{'  ' * list_depth}{marker} ")
+                self.children(item, list_depth + 1)
+            self.out.append('\n\n')
+        elif name == 'pre':
+            self.block(f"```\n{node.get_text().strip(chr(10))}\n```\n\n")
+        elif name == 'blockquote':
+            quoted = _MarkdownWriter(self.__drop_tags)
+            quoted.children(node, 0)
+            lines = _collapse_blank_lines(''.join(quoted.out)).split('\n')
+            self.block('\n'.join(f'> {line}'.rstrip() for line in lines) + '\n\n')
+        elif name == 'table':
+            rows = [[self.inline(cell) for cell in row.find_all(('td', 'th'), recursive=False)] for row in node.find_all('tr')]
+            rows = [row for row in rows if row]
+            if rows:
+                lines = [f"| {' | '.join(rows[0])} |", f"|{' --- |' * len(rows[0])}"]
+                lines += [f"| {' | '.join(row)} |" for row in rows[1:]]
+                self.block('\n'.join(lines) + '\n\n')
+        elif name == 'hr':
+            self.block('---\n\n')
+        elif name == 'br':
+            self.out.append('\n')
+        elif name == 'img':
+            self.out.append(f"![{node.get('alt', '')}]({node.get('src', '')})")
+        elif name in ('strong', 'b'):
+            text = self.inline(node)
+            if text:
+                self.out.append(f'**{text}**')
+        elif name in ('em', 'i'):
+            text = self.inline(node)
+            if text:
+                self.out.append(f'*{text}*')
+        elif name == 'code':
+            self.out.append(f'`{node.get_text()}`')
+        elif name in _BLOCK_TAGS:
+            self.block()
+            self.children(node, list_depth)
+            self.out.append('\n\n')
+        else:
+            self.children(node, list_depth)
+
+def _collapse_blank_lines(text: str) -> str:
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(line.rstrip() for line in text.split('\n'))).strip('\n')
+
+def html_to_markdown(root: Tag, drop_tags: frozenset[str] = DROP_TAGS) -> str:
+    """
+    Markdown of root in one traversal, without the subtrees of drop_tags. Links keep their text only,
+    like the html output which drops href.
+    """
+    writer = _MarkdownWriter(drop_tags)
+    writer.children(root, 0)
+    return _collapse_blank_lines(''.join(writer.out))
+
+def render_content(root: Tag, drop_tags: frozenset[str] = DROP_TAGS, content_format: ContentFormat = ARTICLE_CONTENT_FORMAT) -> str:
+    """
+    Stored content of an article body, minified html or markdown by ARTICLE_CONTENT_FORMAT
+    """
+    if content_format == ContentFormat.MARKDOWN:
+        return html_to_markdown(root, drop_tags)
+    return sanitize_html(root, drop_tags)
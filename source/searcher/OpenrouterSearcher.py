@@ -1,25 +1,32 @@
-import asyncio
 from datetime import datetime
 import json
-from typing import Optional
+from typing import AsyncIterator, Optional
 
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.chat_models import init_chat_model
 
 from . import Searcher
+from .Searcher import get_shared_http_client, SEARCH_HTTP_TIMEOUT
 from ...const import SearchTool
-from ..types import SearchResultDict
-from ...config import OPENROUTER_SEARCHER_MODEL, OPENROUTER_SEARCHER_SYSTEM_PROMPT, OPENROUTER_BASE_URL, OPENROUTER_API_KEY
+from ..types import SearchResultDict, SearchStreamChunk
+from ...config import OPENROUTER_SEARCHER_MODEL, OPENROUTER_SEARCHER_SYSTEM_PROMPT, OPENROUTER_BASE_URL, OPENROUTER_API_KEY, OPENROUTER_MAX_CONCURRENCY
 
 class OpenrouterSearcher(Searcher):
-    def __init__(self):
-        super().__init__(SearchTool.OPENROUTER)
+    def __init__(
+        self,
+        base_url: str = OPENROUTER_BASE_URL,
+        api_key: Optional[str] = OPENROUTER_API_KEY,
+        max_concurrency: int = OPENROUTER_MAX_CONCURRENCY
+    ):
+        super().__init__(SearchTool.OPENROUTER, max_concurrency)
 
         self.model = ChatOpenAI(
             model=OPENROUTER_SEARCHER_MODEL,
-            base_url=OPENROUTER_BASE_URL,
-            api_key=lambda: OPENROUTER_API_KEY,
+            base_url=base_url,
+            api_key=lambda: api_key,
+            timeout=SEARCH_HTTP_TIMEOUT,
+            http_async_client=get_shared_http_client(),
             extra_body={ # extra body seems not working
                 "plugins": [
                     {
@@ -31,13 +38,28 @@ class OpenrouterSearcher(Searcher):
             }
         )
 
-    async def search(self, query: str, from_time: Optional[datetime], to_time: Optional[datetime]) -> list[SearchResultDict]:
-        conversation = [
+    def __conversation(self, query: str) -> list[dict[str, str]]:
+        return [
             {"role": "system", "content": OPENROUTER_SEARCHER_SYSTEM_PROMPT},
             {"role": "user", "content": query}
         ]
-        response = await asyncio.to_thread(self.model.invoke, conversation)
+
+    async def search(self, query: str, from_time: Optional[datetime], to_time: Optional[datetime]) -> list[SearchResultDict]:
+        conversation = self.__conversation(query)
+        async with self._concurrency_limiter:
+            response = await self.model.ainvoke(conversation)
         if type(response.content) == str:
             return [SearchResultDict(content=response.content, url=None)]
         else:
             return [SearchResultDict(content=json.dumps(item), url=None) for item in response.content]
+
+    async def stream(self, query: str, from_time: Optional[datetime], to_time: Optional[datetime]) -> AsyncIterator[SearchStreamChunk]:
+        async with self._concurrency_limiter:
+            async for chunk in self.model.astream(self.__conversation(query)):
+                if not chunk.content:
+                    continue
+                if type(chunk.content) == str:
+                    yield SearchStreamChunk(content=chunk.content, item=False)
+                else:
+                    for item in chunk.content:
+                        yield SearchStreamChunk(content=json.dumps(item), item=True)
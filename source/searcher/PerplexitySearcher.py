@@ -1,51 +1,56 @@
-import asyncio
 from datetime import datetime
 import json
-from typing import Optional
+from typing import Any, AsyncIterator, Optional
 
-import httpx
-from perplexity import Perplexity
+from perplexity import AsyncPerplexity
 
 from . import Searcher
+from .Searcher import get_shared_http_client, SEARCH_HTTP_TIMEOUT
 from ...const import SearchTool
-from ..types import SearchResultDict
-from ...config import PERPLEXITY_SEARCHER_MODEL, PERPLEXITY_SEARCHER_SYSTEM_PROMPT
+from ..types import SearchResultDict, SearchStreamChunk
+from ...config import PERPLEXITY_SEARCHER_MODEL, PERPLEXITY_SEARCHER_SYSTEM_PROMPT, PERPLEXITY_BASE_URL, PERPLEXITY_MAX_CONCURRENCY
 
 
 class PerplexitySearcher(Searcher):
-    def __init__(self):
-        super().__init__(SearchTool.PERPLEXITY)
-        timeout_config = httpx.Timeout(
-            connect=5.0,
-            read=120.0,  # 2 minutes for complex queries
-            write=10.0,
-            pool=10.0
-        )
-        self.client = Perplexity(timeout=timeout_config)
+    def __init__(
+        self,
+        base_url: Optional[str] = PERPLEXITY_BASE_URL,
+        api_key: Optional[str] = None, # None to read PERPLEXITY_API_KEY from environment
+        max_concurrency: int = PERPLEXITY_MAX_CONCURRENCY
+    ):
+        super().__init__(SearchTool.PERPLEXITY, max_concurrency)
+        self.client = AsyncPerplexity(api_key=api_key, base_url=base_url, timeout=SEARCH_HTTP_TIMEOUT, http_client=get_shared_http_client())
+
+    def __messages(self, query: str) -> list[dict[str, Any]]:
+        return [
+            {
+                "role": "system",
+                "content": PERPLEXITY_SEARCHER_SYSTEM_PROMPT
+            },
+            {
+                "role": "user",
+                "content": query,
+            }
+        ]
+
+    def __date_filters(self, from_time: Optional[datetime], to_time: Optional[datetime]) -> dict[str, Optional[str]]:
+        return {
+            'search_after_date_filter': from_time.strftime("%m/%d/%Y") if from_time else None,
+            'search_before_date_filter': to_time.strftime("%m/%d/%Y") if to_time else None,
+        }
 
     async def search(self, query: str, from_time: Optional[datetime], to_time: Optional[datetime]) -> list[SearchResultDict]:
-        def chat_complete():
-            return self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": PERPLEXITY_SEARCHER_SYSTEM_PROMPT
-                    },
-                    {
-                        "role": "user",
-                        "content": query,
-                    }
-                ],
+        async with self._concurrency_limiter:
+            completion = await self.client.chat.completions.create(
+                messages=self.__messages(query),
                 model=PERPLEXITY_SEARCHER_MODEL,
-                search_after_date_filter=from_time.strftime("%m/%d/%Y") if from_time else None,
-                search_before_date_filter=to_time.strftime("%m/%d/%Y") if to_time else None,
+                **self.__date_filters(from_time, to_time),
                 # max_tokens=500,  # Limit response length
                 # temperature=0.7,  # Control creativity
                 # top_p=0.9,       # Control diversity
                 # presence_penalty=0.1,  # Reduce repetition
                 # frequency_penalty=0.1
             )
-        completion = await asyncio.to_thread(chat_complete)
 
         content = completion.choices[0].message.content
         if type(content) == str:
@@ -63,3 +68,24 @@ class PerplexitySearcher(Searcher):
                 )
                 for item in content
             ]
+
+    async def stream(self, query: str, from_time: Optional[datetime], to_time: Optional[datetime]) -> AsyncIterator[SearchStreamChunk]:
+        async with self._concurrency_limiter:
+            chunk_stream = await self.client.chat.completions.create(
+                messages=self.__messages(query),
+                model=PERPLEXITY_SEARCHER_MODEL,
+                stream=True,
+                **self.__date_filters(from_time, to_time),
+            )
+            async with chunk_stream:
+                async for chunk in chunk_stream:
+                    if not chunk.choices:
+                        continue
+                    content = chunk.choices[0].delta.content
+                    if not content:
+                        continue
+                    if type(content) == str:
+                        yield SearchStreamChunk(content=content, item=False)
+                    else:
+                        for item in content:
+                            yield SearchStreamChunk(content=json.dumps(item), item=True)
@@ -1,16 +1,71 @@
+import asyncio
 from abc import ABC
 from datetime import datetime
-from typing import Optional
+from typing import AsyncIterator, Optional
+
+import httpx
 
 from ...const import SearchTool
-from ..types import SearchResultDict
+from ...config import SEARCH_HTTP_MAX_CONNECTIONS, SEARCH_HTTP_MAX_KEEPALIVE_CONNECTIONS
+from ..types import SearchResultDict, SearchStreamChunk
 
 import logging
 logger = logging.getLogger(__name__)
 
+SEARCH_HTTP_TIMEOUT = httpx.Timeout(
+    connect=5.0,
+    read=120.0,  # 2 minutes for complex queries
+    write=10.0,
+    pool=10.0
+)
+
+_shared_http_client: Optional[httpx.AsyncClient] = None
+
+def get_shared_http_client() -> httpx.AsyncClient:
+    """
+    HTTP connection pool shared by every searcher client
+    """
+    global _shared_http_client
+    if _shared_http_client is None:
+        _shared_http_client = httpx.AsyncClient(
+            timeout=SEARCH_HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=SEARCH_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=SEARCH_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+    return _shared_http_client
+
+def stream_results(chunks: list[SearchStreamChunk]) -> list[SearchResultDict]:
+    """
+    Results of a streamed answer like search() returns them: consecutive text fragments joined in one result,
+    every list item a result of its own
+    """
+    results: list[SearchResultDict] = []
+    fragments: list[str] = []
+    for chunk in chunks:
+        if not chunk['item']:
+            fragments.append(chunk['content'])
+            continue
+        if fragments:
+            results.append(SearchResultDict(content=''.join(fragments), url=None))
+            fragments = []
+        results.append(SearchResultDict(content=chunk['content'], url=None))
+    if fragments or not results:
+        results.append(SearchResultDict(content=''.join(fragments), url=None))
+    return results
+
 class Searcher(ABC):
-    def __init__(self, tool: SearchTool):
+    def __init__(self, tool: SearchTool, max_concurrency: int):
         self._tool = tool
+        # requests beyond the cap wait here instead of piling up on the upstream API
+        self._concurrency_limiter = asyncio.Semaphore(max_concurrency)
 
     async def search(self, query: str, from_time: Optional[datetime], to_time: Optional[datetime] ) -> list[SearchResultDict]:
         raise NotImplementedError
+
+    def stream(self, query: str, from_time: Optional[datetime], to_time: Optional[datetime]) -> AsyncIterator[SearchStreamChunk]:
+        """
+        Stream the search answer as chunks in generation order, stream_results of them are the results of search()
+        """
+        raise NotImplementedError
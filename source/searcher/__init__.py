@@ -1,5 +1,5 @@
-from .Searcher import Searcher
+from .Searcher import Searcher, stream_results
 from .PerplexitySearcher import PerplexitySearcher
 from .OpenrouterSearcher import OpenrouterSearcher
 
-__all__ = ['Searcher', 'PerplexitySearcher', 'OpenrouterSearcher']
+__all__ = ['Searcher', 'stream_results', 'PerplexitySearcher', 'OpenrouterSearcher']
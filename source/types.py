@@ -7,3 +7,10 @@ class SearchResultDict(TypedDict):
     """
     content: str
     url: Optional[str]
+
+class SearchStreamChunk(TypedDict):
+    """
+    Part of a streamed search answer, a text fragment of the answer or, when the answer is a list, a whole result item
+    """
+    content: str
+    item: bool
@@ -0,0 +1,11 @@
+-- compressed article bodies, used with ARTICLE_CONTENT_COMPRESSION=zstd
+-- content_zstd: format marker byte 0x01 followed by a zstd frame, content is NULL when it is set
+ALTER TABLE t_article ADD COLUMN IF NOT EXISTS content_zstd BYTEA;
+
+-- zstd dictionaries trained per site, the frame header of content_zstd refers to dict_id
+CREATE TABLE IF NOT EXISTS t_article_zstd_dict (
+    dict_id BIGINT PRIMARY KEY,
+    site VARCHAR(32) NOT NULL,
+    dict BYTEA NOT NULL,
+    create_time TIMESTAMPTZ NOT NULL
+);
@@ -0,0 +1,18 @@
+-- article detail pages to fetch, queued by the listing stage and claimed by detail workers, used with ARTICLE_DETAIL_QUEUE_ENABLED=true
+-- title, publish_time: from the listing, NULL when the listing does not show them
+-- available_time: when the task can be claimed next, pushed ahead while claimed and on retries, NULL once done or given up
+-- done_time: when the article was stored (or the page held none), NULL for tasks given up after too many attempts
+CREATE TABLE IF NOT EXISTS t_article_detail_task (
+    id BIGSERIAL PRIMARY KEY,
+    site VARCHAR(64) NOT NULL,
+    url TEXT NOT NULL,
+    title TEXT,
+    publish_time TIMESTAMPTZ,
+    attempts INT NOT NULL DEFAULT 0,
+    available_time TIMESTAMPTZ DEFAULT now(),
+    done_time TIMESTAMPTZ,
+    last_error TEXT,
+    create_time TIMESTAMPTZ NOT NULL DEFAULT now(),
+    UNIQUE (site, url)
+);
+CREATE INDEX IF NOT EXISTS idx_article_detail_task_available ON t_article_detail_task (available_time) WHERE available_time IS NOT NULL;
@@ -0,0 +1,5 @@
+-- content change detection of stored articles, used with ARTICLE_REVISIT_ENABLED=true
+-- content_fingerprint: 64 bit hash of the content (crawler/hashing.py), update_time: when a revisit stored an edit
+ALTER TABLE t_article ADD COLUMN IF NOT EXISTS content_fingerprint BIGINT;
+ALTER TABLE t_article ADD COLUMN IF NOT EXISTS update_time TIMESTAMPTZ;
+CREATE INDEX IF NOT EXISTS idx_article_site_publish_time ON t_article (site, publish_time);
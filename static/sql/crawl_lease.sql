@@ -0,0 +1,14 @@
+-- crawler replicas splitting the activated sites between them, used with CRAWL_COORDINATION_ENABLED=true
+-- t_crawler_replica: replicas alive when heartbeat_time is within CRAWL_LEASE_TTL_SECONDS
+-- t_crawl_lease: the replica crawling a site, taken over by another replica once expire_time has passed
+CREATE TABLE IF NOT EXISTS t_crawler_replica (
+    replica_id VARCHAR(128) PRIMARY KEY,
+    heartbeat_time TIMESTAMPTZ NOT NULL
+);
+CREATE TABLE IF NOT EXISTS t_crawl_lease (
+    kind VARCHAR(32) NOT NULL,
+    site VARCHAR(64) NOT NULL,
+    owner VARCHAR(128) NOT NULL,
+    expire_time TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (kind, site)
+);
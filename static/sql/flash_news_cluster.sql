@@ -0,0 +1,4 @@
+-- near duplicate flash news, used with FLASH_NEWS_DEDUP_ENABLED=true
+-- cluster_md5: title_md5 of the earliest near duplicate news of the same event, the news' own title_md5 when none
+ALTER TABLE t_flash_news ADD COLUMN IF NOT EXISTS cluster_md5 VARCHAR(32);
+CREATE INDEX IF NOT EXISTS idx_flash_news_cluster_md5 ON t_flash_news (cluster_md5);
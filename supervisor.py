@@ -0,0 +1,90 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .config import API_WORKERS, LOG_NAME, SUPERVISOR_STOP_TIMEOUT_SECONDS, SUPERVISOR_RESTART_DELAY_SECONDS
+from .const import ProcessRole
+
+import logging
+log = logging.getLogger(__name__)
+
+@dataclass
+class _Child:
+    name: str
+    role: ProcessRole
+    # API worker index, the process's share of the API limits and its metrics port (API_METRICS_PORT + index)
+    index: Optional[int] = None
+    process: Optional[subprocess.Popen] = None
+    restart_at: float = field(default=0.0)
+
+class Supervisor:
+    """
+    Runs the crawler (scheduler role) and API_WORKERS API server processes, restarts processes that exit
+    unexpectedly and stops all of them on stop(). Meant to be driven by run.start_wait_stop_runner.
+
+    Children get their own session so that terminal signals reach the supervisor only
+    and shutdown is coordinated from here.
+    """
+    def __init__(self):
+        self.__children = [_Child(name='scheduler', role=ProcessRole.SCHEDULER)] + [
+            _Child(name=f"api-{i}", role=ProcessRole.API, index=i) for i in range(API_WORKERS)
+        ]
+        self.__stopping = threading.Event()
+
+    def __spawn(self, child: _Child):
+        env = dict(os.environ, LOG_NAME=f"{LOG_NAME}-{child.name}")
+        if child.index is not None:
+            env['API_WORKER_INDEX'] = str(child.index)
+        child.process = subprocess.Popen(
+            [sys.executable, '-m', 'crawler.main', '--role', child.role.value],
+            env=env,
+            start_new_session=True,
+        )
+        log.info(f"started {child.name}, pid: {child.process.pid}")
+
+    def __check_children(self):
+        now = time.monotonic()
+        for child in self.__children:
+            if child.process is None:
+                if now >= child.restart_at:
+                    self.__spawn(child)
+                continue
+            return_code = child.process.poll()
+            if return_code is not None:
+                log.error(f"{child.name} pid {child.process.pid} exited with code {return_code}, "
+                          f"restarting in {SUPERVISOR_RESTART_DELAY_SECONDS}s")
+                child.process = None
+                child.restart_at = now + SUPERVISOR_RESTART_DELAY_SECONDS
+
+    def __stop_children(self):
+        running = [child for child in self.__children if child.process is not None and child.process.poll() is None]
+        for child in running:
+            log.info(f"stopping {child.name}, pid: {child.process.pid}") # type: ignore
+            child.process.send_signal(signal.SIGTERM) # type: ignore
+        deadline = time.monotonic() + SUPERVISOR_STOP_TIMEOUT_SECONDS
+        for child in running:
+            try:
+                child.process.wait(timeout=max(0.0, deadline - time.monotonic())) # type: ignore
+                log.info(f"{child.name} stopped with code {child.process.returncode}") # type: ignore
+            except subprocess.TimeoutExpired:
+                log.warning(f"{child.name} did not stop within {SUPERVISOR_STOP_TIMEOUT_SECONDS}s, killing")
+                child.process.kill() # type: ignore
+                child.process.wait() # type: ignore
+
+    def start(self):
+        log.info(f"START supervisor with {API_WORKERS} api workers")
+        try:
+            while not self.__stopping.is_set():
+                self.__check_children()
+                self.__stopping.wait(1.0)
+        finally:
+            self.__stop_children()
+
+    def stop(self):
+        log.info("STOP supervisor")
+        self.__stopping.set()